@@ -0,0 +1,313 @@
+"""
+Compact binary file attribute manifest, an alternative to the CSV written by `list_file_attributes_in_dir.py`.
+
+Layout (little endian):
+
+- Header: `HEADER` (magic, version, column flags, record count, index offset, index entry count, index interval).
+- Records, in walk order (see `dir_walker.get_walk_order_key`). Each record is a fixed-width `RECORD` part followed by a path suffix:
+    - Flags (dir, has size, has SHA256), size (u64), SHA256 (32 raw bytes), shared prefix length (u16), suffix length (u16).
+    - The path is front-coded: it shares `shared prefix length` bytes with the previous record's path, followed by the suffix (UTF-8).
+    - Every `index interval`-th record stores its full path (shared prefix length 0) and is listed in the index.
+- Index: u64 offsets of those records.
+
+Readers `mmap` the file. `BinaryManifestReader.lookup` binary searches the index, then decodes at most `index interval` records.
+Because the size field is fixed-width, dir sizes are patched in place after the dir's contents have been written.
+"""
+
+import argparse
+import bisect
+import csv
+import mmap
+import os
+import struct
+import typing
+
+import dir_walker
+
+
+MAGIC: typing.Final = b"FAMF"
+VERSION: typing.Final = 1
+
+HEADER = struct.Struct("<4sBBxxQQQI")
+RECORD = struct.Struct("<BQ32sHH")
+INDEX_ENTRY = struct.Struct("<Q")
+
+DEFAULT_INDEX_INTERVAL = 64
+
+# Column names. Same as `list_file_attributes_in_dir.AttributeKeys`.
+FILENAME_KEY: typing.Final = "filename"
+SIZE_KEY: typing.Final = "size"
+SHA_256_HASH_KEY: typing.Final = "sha256"
+
+
+class _ColumnFlags:
+    SIZE = 1
+    SHA_256_HASH = 2
+
+
+class _RecordFlags:
+    DIR = 1
+    HAS_SIZE = 2
+    HAS_SHA_256_HASH = 4
+
+
+_SIZE_FIELD_OFFSET = 1  # Offset of the size field in `RECORD`.
+_EMPTY_DIGEST = bytes(32)
+
+
+def _encode_path(filename: str) -> bytes:
+    return filename.encode("utf-8", "surrogateescape")
+
+
+def _decode_path(b: bytes) -> str:
+    return b.decode("utf-8", "surrogateescape")
+
+
+# MARK: - Writer
+class BinaryManifestWriter:
+    """
+    Add rows in walk order with `add_row`. Call `close` (or use `with`) to write the index and header.
+    """
+
+    def __init__(self, filename: str, attribute_keys: typing.List[str], index_interval: int = DEFAULT_INDEX_INTERVAL):
+        self.f = open(filename, "wb")  # Patching (with `seek`) works in write-only mode.
+        self.index_interval = index_interval
+
+        self.column_flags = 0
+        if SIZE_KEY in attribute_keys:
+            self.column_flags |= _ColumnFlags.SIZE
+        if SHA_256_HASH_KEY in attribute_keys:
+            self.column_flags |= _ColumnFlags.SHA_256_HASH
+
+        self.record_count = 0
+        self.index: typing.List[int] = []
+        self._previous_path = b""
+        self._offset = HEADER.size
+
+        self.f.write(bytes(HEADER.size))  # Placeholder.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add_row(self, filename: str, size: int | None = None, sha256: str | None = None) -> int:
+        """
+        :param filename: Dir names end with `os.sep`.
+        :return: Offset of the record, for `patch_size`.
+        """
+        path = _encode_path(filename)
+
+        if self.record_count % self.index_interval == 0:
+            shared_length = 0
+            self.index.append(self._offset)
+        else:
+            shared_length = len(os.path.commonprefix((self._previous_path, path)))
+        suffix = path[shared_length:]
+
+        flags = 0
+        if filename.endswith(os.sep):
+            flags |= _RecordFlags.DIR
+            if self.column_flags & _ColumnFlags.SIZE:
+                flags |= _RecordFlags.HAS_SIZE  # Patched later with `patch_size`, if not given.
+        if size is not None:
+            flags |= _RecordFlags.HAS_SIZE
+        if sha256:
+            flags |= _RecordFlags.HAS_SHA_256_HASH
+
+        record_offset = self._offset
+        self.f.write(RECORD.pack(flags, size or 0, bytes.fromhex(sha256) if sha256 else _EMPTY_DIGEST, shared_length, len(suffix)))
+        self.f.write(suffix)
+
+        self._offset += RECORD.size + len(suffix)
+        self._previous_path = path
+        self.record_count += 1
+
+        return record_offset
+
+    def patch_size(self, record_offset: int, size: int):
+        """
+        Set the size of an already written dir record. Dir sizes are only known after their contents have been written.
+        """
+        self.f.seek(record_offset + _SIZE_FIELD_OFFSET)
+        self.f.write(struct.pack("<Q", size))
+        self.f.seek(self._offset)
+
+    def close(self):
+        if self.f.closed:
+            return
+
+        index_offset = self._offset
+        for offset in self.index:
+            self.f.write(INDEX_ENTRY.pack(offset))
+
+        self.f.seek(0)
+        self.f.write(HEADER.pack(MAGIC, VERSION, self.column_flags, self.record_count, index_offset, len(self.index), self.index_interval))
+        self.f.close()
+
+
+# MARK: - Reader
+class BinaryManifestReader:
+    def __init__(self, filename: str):
+        with open(filename, "rb") as f:
+            self._mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.column_flags, self.record_count, index_offset, index_count, self.index_interval = HEADER.unpack_from(self._mapped, 0)
+        if magic != MAGIC:
+            raise ValueError(f"`{filename}` isn't a binary manifest.")
+        if version != VERSION:
+            raise ValueError(f"`{filename}`: Unsupported version {version}.")
+
+        self._index_offset = index_offset
+        self._index_count = index_count
+
+        self.attribute_keys = []
+        if self.column_flags & _ColumnFlags.SIZE:
+            self.attribute_keys.append(SIZE_KEY)
+        if self.column_flags & _ColumnFlags.SHA_256_HASH:
+            self.attribute_keys.append(SHA_256_HASH_KEY)
+
+        self.root_path = self._read_record(HEADER.size, b"")[0] if self.record_count else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._mapped.close()
+
+    def _get_index_entry(self, i: int) -> int:
+        return INDEX_ENTRY.unpack_from(self._mapped, self._index_offset + i * INDEX_ENTRY.size)[0]
+
+    def _read_record(self, offset: int, previous_path: bytes) -> typing.Tuple[str, bytes, dict, int]:
+        """
+        :return: Filename, encoded path (for decoding the next record), attribute dict and the next record's offset.
+        """
+        flags, size, digest, shared_length, suffix_length = RECORD.unpack_from(self._mapped, offset)
+        suffix_offset = offset + RECORD.size
+        path = previous_path[:shared_length] + self._mapped[suffix_offset:suffix_offset + suffix_length]
+        filename = _decode_path(path)
+
+        d = {FILENAME_KEY: filename}
+        if self.column_flags & _ColumnFlags.SIZE:
+            d[SIZE_KEY] = size if (flags & _RecordFlags.HAS_SIZE) else None
+        if self.column_flags & _ColumnFlags.SHA_256_HASH:
+            d[SHA_256_HASH_KEY] = digest.hex() if (flags & _RecordFlags.HAS_SHA_256_HASH) else None
+
+        return filename, path, d, suffix_offset + suffix_length
+
+    def _iter_from(self, offset: int, count: int) -> typing.Iterator[typing.Tuple[str, dict]]:
+        path = b""
+        for _ in range(count):
+            filename, path, d, offset = self._read_record(offset, path)
+            yield filename, d
+
+    def __iter__(self) -> typing.Iterator[dict]:
+        for _, d in self._iter_from(HEADER.size, self.record_count):
+            yield d
+
+    def _get_key(self, filename: str) -> tuple | None:
+        if not filename.startswith(self.root_path):
+            return None
+        return dir_walker.get_walk_order_key(filename[len(self.root_path):])
+
+    def lookup(self, filename: str) -> dict | None:
+        """
+        Find a row by filename (as written, dir names end with `os.sep`) without decoding the whole manifest.
+        """
+        if not self.record_count:
+            return None
+
+        key = self._get_key(filename)
+        if key is None:
+            return None
+
+        # Last indexed record whose key is <= `key`.
+        index_keys = _IndexKeys(self)
+        i = bisect.bisect_right(index_keys, key) - 1
+        if i < 0:
+            return None
+
+        count = min(self.index_interval, self.record_count - i * self.index_interval)
+        for record_filename, d in self._iter_from(self._get_index_entry(i), count):
+            if record_filename == filename:
+                return d
+
+        return None
+
+
+class _IndexKeys (typing.Sequence):
+    """
+    Lazy sequence of the keys of indexed records, for `bisect`.
+    """
+
+    def __init__(self, reader: BinaryManifestReader):
+        self.reader = reader
+
+    def __len__(self):
+        return self.reader._index_count
+
+    def __getitem__(self, i):
+        filename = self.reader._read_record(self.reader._get_index_entry(i), b"")[0]
+        return self.reader._get_key(filename)
+
+
+# MARK: - Conversion
+def csv_to_binary(csv_filename: str, binary_filename: str, index_interval: int = DEFAULT_INDEX_INTERVAL):
+    with open(csv_filename, newline="") as f:
+        reader = csv.DictReader(f)
+        attribute_keys = [k for k in reader.fieldnames if k != FILENAME_KEY]
+
+        with BinaryManifestWriter(binary_filename, attribute_keys, index_interval) as writer:
+            for row in reader:
+                size = row.get(SIZE_KEY)
+                writer.add_row(row[FILENAME_KEY], int(size) if size else None, row.get(SHA_256_HASH_KEY) or None)
+
+
+def binary_to_csv(binary_filename: str, csv_filename: str):
+    with BinaryManifestReader(binary_filename) as reader:
+        with open(csv_filename, "w") as f:  # Default encoding is UTF-8
+            writer = csv.DictWriter(f, [FILENAME_KEY] + reader.attribute_keys)
+            writer.writeheader()
+            writer.writerows(reader)
+
+
+# MARK: - Main
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert between CSV and binary file attribute manifests, or look up a path in a binary manifest.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    to_binary_parser = subparsers.add_parser("to_binary", help="CSV -> binary.")
+    to_binary_parser.add_argument("csv_filename")
+    to_binary_parser.add_argument("binary_filename")
+    to_binary_parser.add_argument("--index_interval", "-i", type=int, default=DEFAULT_INDEX_INTERVAL, help="Index every N-th record. (default: %(default)s)")
+
+    to_csv_parser = subparsers.add_parser("to_csv", help="Binary -> CSV.")
+    to_csv_parser.add_argument("binary_filename")
+    to_csv_parser.add_argument("csv_filename")
+
+    lookup_parser = subparsers.add_parser("lookup", help="Print the attributes of 1 path.")
+    lookup_parser.add_argument("binary_filename")
+    lookup_parser.add_argument("filename", help="The path as written in the manifest. Dir names end with `os.sep`.")
+
+    args = parser.parse_args()
+
+    if args.command == "lookup":
+        with BinaryManifestReader(args.binary_filename) as manifest_reader:
+            result = manifest_reader.lookup(args.filename)
+        if result is None:
+            print(f"`{args.filename}` not found.")
+            exit(1)
+        print(result)
+    else:
+        output_filename = args.binary_filename if (args.command == "to_binary") else args.csv_filename
+        if os.path.exists(output_filename):
+            raise FileExistsError(f"`{output_filename}` exists!")
+
+        if args.command == "to_binary":
+            csv_to_binary(args.csv_filename, args.binary_filename, args.index_interval)
+        else:
+            binary_to_csv(args.binary_filename, args.csv_filename)
@@ -1,8 +1,11 @@
 import argparse
 import os
 
+import dir_walker
+import rename_planner
 
-def main(work_dir: str, old_ext: str | None, new_ext: str | None):
+
+def main(work_dir: str, old_ext: str | None, new_ext: str | None, recursive: bool = False, workers: int | None = None):
     if (not old_ext) and (not new_ext):
         raise ValueError("Old and new extensions can't both be empty")
 
@@ -14,53 +17,41 @@ def main(work_dir: str, old_ext: str | None, new_ext: str | None):
     if old_ext == new_ext:
         raise ValueError("Old and new extensions must differ")
 
-    print(f"Working directory: {work_dir}")
+    print(f"Working directory: {work_dir}{' (recursive)' if recursive else ''}")
     print(f"Old extension: {old_ext if old_ext else '(empty, add extension to files without an extension)'}")
     print(f"New extension: {new_ext if new_ext else '(empty, remove extension)'}")
 
-    filenames_old = os.listdir(work_dir)
-    filenames_old = [f for f in filenames_old if os.path.isfile(os.path.join(work_dir, f))]  # NOTE: Ignore dirs.
+    def get_new_name(entry: os.DirEntry) -> str | None:
+        # Entries carry their file type from the dir listing, so this doesn't `stat` every file.
+        if not dir_walker.is_file(entry):
+            return None  # NOTE: Ignore dirs.
+
+        # FIXME: Handle filenames that that start with `.`
+        if old_ext:
+            if entry.name.endswith(old_ext):
+                return entry.name[:-len(old_ext)] + (new_ext if new_ext else "")
+        elif "." not in entry.name:
+            return entry.name + (new_ext if new_ext else "")
 
-    # FIXME: Handle filenames that that start with `.`
-    if old_ext:
-        filenames_old = [f for f in filenames_old if f.endswith(old_ext)]
-    else:
-        filenames_old = [f for f in filenames_old if "." not in f]
+        return None
 
-    if not filenames_old:
+    # Check collisions against the listings instead of calling `os.path.exists` on each target.
+    plans = rename_planner.plan_tree(work_dir, get_new_name, recursive, workers)
+    if not plans:
         print("No file matches the old extension. Nothing to do.")
         exit(0)
 
-    filenames_old.sort()
-
-    if old_ext:
-        filenames_new = [f[:-len(old_ext)] + (new_ext if new_ext else "") for f in filenames_old]
-    else:
-        filenames_new = [f + (new_ext if new_ext else "") for f in filenames_old]
+    rename_planner.print_tree_plans(work_dir, plans)
 
-    filenames = [
-        (os.path.join(work_dir, old), os.path.join(work_dir, new))
-        for old, new in zip(filenames_old, filenames_new)
-    ]
-    ignored_filenames = [(old, new) for old, new in filenames if os.path.exists(new)]
-    filenames = [(old, new) for old, new in filenames if not os.path.exists(new)]
-
-    print(f"{len(filenames)} files to rename:")
-    for old, new in filenames:
-        print(f"{old} -> {new}")
-
-    if ignored_filenames:
-        print(f"{len(ignored_filenames)} files ignored due to existing target:")
-        for old, new in ignored_filenames:
-            print(f"{old} -> {new}")
+    if not any(plan.renames for plan in plans.values()):
+        exit(0)
 
     consent = input("Proceed? (y/n) ")
     if consent.lower() != "y":
         print("Aborted.")
         exit(2)
 
-    for old, new in filenames:
-        os.rename(old, new)
+    rename_planner.execute_tree_plans(work_dir, plans, workers)
 
 
 if __name__ == "__main__":
@@ -68,6 +59,8 @@ if __name__ == "__main__":
     parser.add_argument("--work_dir", "-d", type=str, default=os.getcwd(), help="Working directory. Default: Current working directory: %(default)s")
     parser.add_argument("--old_ext", "-o", type=str, default=None, help="Old file extension. Empty: Add extension to files without an extension")
     parser.add_argument("--new_ext", "-n", type=str, default=None, help="New file extension. Empty: Remove extension")
+    parser.add_argument("--recursive", "-r", action="store_true", help="Also rename files in sub-directories")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Dirs listed and renamed concurrently. Default: CPU count: %(default)s")
     args = parser.parse_args()
 
-    main(args.work_dir, args.old_ext, args.new_ext)
+    main(args.work_dir, args.old_ext, args.new_ext, args.recursive, args.workers)
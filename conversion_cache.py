@@ -0,0 +1,176 @@
+"""
+Content-addressed cache of converted images.
+
+Entries are keyed by the source file's SHA256 plus the encoder parameters, so renamed/moved sources still hit.
+Objects live in `<cache dir>/objects/`; an SQLite index tracks their sizes and last use for LRU eviction.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import typing
+
+import sha_hash
+
+
+_INDEX_FILENAME: typing.Final = "index.sqlite3"
+_OBJECTS_DIR_NAME: typing.Final = "objects"
+
+_FICLONE: typing.Final = 0x40049409  # Linux `ioctl` to reflink a whole file (Btrfs, XFS, ...).
+
+
+def get_cache_key(src_filename: str, encoder_parameters: typing.Dict[str, typing.Any]) -> str:
+    src_digest = sha_hash.get_sha_hashes_of_file_adaptive(src_filename, [sha_hash.HashAlgorithm.SHA256])[sha_hash.HashAlgorithm.SHA256]
+    parameters = json.dumps(encoder_parameters, sort_keys=True)
+    return hashlib.sha256(f"{src_digest}\n{parameters}".encode("utf-8")).hexdigest()
+
+
+def copy_or_reflink(src_filename: str, dest_filename: str):
+    """
+    Reflink if the file system supports it (no data is copied), otherwise copy.
+    """
+    with open(src_filename, "rb") as src_file, open(dest_filename, "wb") as dest_file:
+        try:
+            fcntl.ioctl(dest_file.fileno(), _FICLONE, src_file.fileno())
+            return
+        except OSError:
+            pass
+
+        shutil.copyfileobj(src_file, dest_file, 1024 * 1024)
+
+
+class ConversionCache:
+    """
+    Safe to use from multiple processes: objects are written atomically and the index uses WAL with a busy timeout.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, _OBJECTS_DIR_NAME)
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        self.connection = sqlite3.connect(os.path.join(cache_dir, _INDEX_FILENAME), timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def _get_object_filename(self, key: str) -> str:
+        return os.path.join(self.objects_dir, key[:2], key)
+
+    def get(self, key: str, dest_filename: str) -> bool:
+        """
+        Copy the cached object to `dest_filename`.
+
+        :return: Whether there was a hit.
+        """
+        object_filename = self._get_object_filename(key)
+        try:
+            copy_or_reflink(object_filename, dest_filename)
+        except FileNotFoundError:
+            return False
+
+        with self.connection:
+            self.connection.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time_ns(), key))
+        return True
+
+    def put(self, key: str, src_filename: str):
+        """
+        Store a copy of `src_filename` (the encoder output).
+        """
+        object_filename = self._get_object_filename(key)
+        os.makedirs(os.path.dirname(object_filename), exist_ok=True)
+
+        # Copy to a temp file first so that readers never see a partial object.
+        fd, temp_filename = tempfile.mkstemp(dir=os.path.dirname(object_filename), prefix=".tmp_")
+        os.close(fd)
+        try:
+            copy_or_reflink(src_filename, temp_filename)
+            os.replace(temp_filename, object_filename)
+        except BaseException:
+            os.remove(temp_filename)
+            raise
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                (key, os.path.getsize(object_filename), time.time_ns()),
+            )
+
+    def remove(self, key: str):
+        """
+        Delete an entry, e.g. one whose object turned out to be bad.
+        """
+        try:
+            os.remove(self._get_object_filename(key))
+        except FileNotFoundError:
+            pass
+
+        with self.connection:
+            self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def get_total_size(self) -> int:
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self, max_size: int) -> typing.Tuple[int, int]:
+        """
+        Delete least recently used entries until the cache is at most `max_size` bytes.
+
+        :return: Deleted entry count and bytes.
+        """
+        total_size = self.get_total_size()
+        deleted_count = 0
+        deleted_size = 0
+
+        if total_size <= max_size:
+            return deleted_count, deleted_size
+
+        rows = self.connection.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall()
+        with self.connection:
+            for key, size in rows:
+                if total_size <= max_size:
+                    break
+
+                try:
+                    os.remove(self._get_object_filename(key))
+                except FileNotFoundError:
+                    pass
+                self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+                total_size -= size
+                deleted_count += 1
+                deleted_size += size
+
+        return deleted_count, deleted_size
+
+
+# MARK: - Per-thread instances
+_caches = threading.local()  # Cache dir: `ConversionCache`. SQLite connections can't be shared across threads.
+
+
+def get_cache(cache_dir: str) -> ConversionCache:
+    """
+    Get the cache instance of the current thread (and process). Instances are reused across calls.
+    """
+    caches: typing.Dict[str, ConversionCache] = getattr(_caches, "caches", None)
+    if caches is None:
+        caches = {}
+        _caches.caches = caches
+
+    cache = caches.get(cache_dir)
+    if cache is None:
+        cache = ConversionCache(cache_dir)
+        caches[cache_dir] = cache
+
+    return cache
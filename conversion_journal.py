@@ -0,0 +1,60 @@
+"""
+Append-only journal of finished conversions, so that an interrupted batch resumes where it stopped.
+
+One JSON line per finished image. Only the main process writes it; every line is flushed right away.
+A line cut off by a crash is ignored when the journal is loaded.
+"""
+
+import json
+import os
+import typing
+
+
+def _ends_with_newline(filename: str) -> bool:
+    with open(filename, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class ConversionJournal:
+    def __init__(self, filename: str, done_results: typing.Iterable[str]):
+        """
+        :param done_results: `ImageMetrics.result` values that mark an image as finished. Other results are retried on resume.
+        """
+        self.done_results = set(done_results)
+        self.done: typing.Set[typing.Tuple[str, str]] = set()  # (Source filename, destination filename)
+
+        if os.path.exists(filename):
+            with open(filename) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+                    if entry["result"] in self.done_results:
+                        self.done.add((entry["src_filename"], entry["dest_filename"]))
+
+        self.f = open(filename, "a")  # Default encoding is UTF-8
+        if self.f.tell() and not _ends_with_newline(filename):
+            self.f.write("\n")  # Terminate a cut off line so that the next entry starts on its own line.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if not self.f.closed:
+            self.f.close()
+
+    def is_done(self, src_filename: str, dest_filename: str) -> bool:
+        return (src_filename, dest_filename) in self.done
+
+    def record(self, src_filename: str, dest_filename: str, result: str):
+        self.f.write(json.dumps({"src_filename": src_filename, "dest_filename": dest_filename, "result": result}) + "\n")
+        self.f.flush()
+
+        if result in self.done_results:
+            self.done.add((src_filename, dest_filename))
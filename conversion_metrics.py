@@ -0,0 +1,117 @@
+"""
+Per-image metrics for batch image conversion, and a run summary (throughput and latency percentiles).
+
+Workers only take a few `time.perf_counter` readings per image and return an `ImageMetrics`; the main process writes the report.
+"""
+
+import json
+import math
+import threading
+import typing
+
+
+class ImageMetrics(typing.NamedTuple):
+    src_filename: str
+    dest_filename: str
+    result: str  # `convert_image_lossless.ConversionResult` value.
+    worker_id: int  # Native thread ID of the worker. The PID for process workers.
+    decode_seconds: float = 0.0
+    encode_seconds: float = 0.0
+    total_seconds: float = 0.0  # Including cache lookups, renames, etc.
+    input_bytes: int = 0
+    output_bytes: int = 0
+    pixels: int = 0
+    encoder: str = ""  # `image_encoders` encoder name.
+    verify_seconds: float = 0.0
+
+    @property
+    def compression_ratio(self) -> float | None:
+        return (self.output_bytes / self.input_bytes) if self.input_bytes else None
+
+    def to_dict(self) -> dict:
+        d = self._asdict()
+        d["compression_ratio"] = self.compression_ratio
+        return d
+
+
+def percentile(sorted_values: typing.Sequence[float], p: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    :param sorted_values: Must be sorted and not empty.
+    :param p: In [0, 100].
+    """
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class MetricsReport:
+    """
+    Collects `ImageMetrics` and optionally writes them as JSON lines.
+    Only the per-image latencies are kept in memory for the summary.
+
+    Skipped images are counted separately: They don't count towards throughput and latencies, so resumed runs report the images that did work.
+    """
+
+    def __init__(self, report_filename: str | None = None, skipped_results: typing.Collection[str] = ()):
+        """
+        :param skipped_results: `ImageMetrics.result` values of images that were skipped without work.
+        """
+        self.report_file = open(report_filename, "w") if report_filename else None  # Default encoding is UTF-8
+        self.skipped_results = frozenset(skipped_results)
+
+        self.counts: typing.Dict[str, int] = {}  # All results, including skipped ones.
+        self.skipped_count = 0
+        self.latencies: typing.List[float] = []
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.pixels = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.report_file:
+            self.report_file.close()
+            self.report_file = None
+
+    def add(self, metrics: ImageMetrics):
+        self.counts[metrics.result] = self.counts.get(metrics.result, 0) + 1
+        if self.report_file:
+            self.report_file.write(json.dumps(metrics.to_dict()) + "\n")
+
+        if metrics.result in self.skipped_results:
+            self.skipped_count += 1
+            return
+
+        self.latencies.append(metrics.total_seconds)
+        self.input_bytes += metrics.input_bytes
+        self.output_bytes += metrics.output_bytes
+        self.pixels += metrics.pixels
+
+    def get_summary(self, wall_seconds: float) -> str:
+        image_count = len(self.latencies)
+        skipped = f" {self.skipped_count} skipped." if self.skipped_count else ""
+        if not image_count:
+            return f"No images processed.{skipped}"
+
+        wall_seconds = max(wall_seconds, 1e-9)
+        latencies = sorted(self.latencies)
+        counts = ", ".join(f"{count} {result}" for result, count in sorted(self.counts.items()) if result not in self.skipped_results)
+
+        return (
+            f"{image_count} images ({counts}) in {wall_seconds:.2f}s: "
+            f"{image_count / wall_seconds:.2f} images/s, "
+            f"{self.input_bytes / 1e6 / wall_seconds:.2f} MB/s in, "
+            f"{self.pixels / 1e6 / wall_seconds:.2f} MP/s. "
+            f"Latency p50 {percentile(latencies, 50):.3f}s, p95 {percentile(latencies, 95):.3f}s, p99 {percentile(latencies, 99):.3f}s. "
+            f"Output/input bytes: {(self.output_bytes / self.input_bytes) if self.input_bytes else 0:.3f}."
+            f"{skipped}"
+        )
+
+
+def get_worker_id() -> int:
+    return threading.get_native_id()  # Tasks of process pool workers run on their main threads, whose native IDs are the PIDs.
@@ -1,28 +1,58 @@
 import argparse
+import enum
 import os
+import tempfile
+import threading
+import time
 import typing
 import multiprocessing
+import multiprocessing.pool
 
 from PIL import Image
 
+import conversion_cache
+import conversion_journal
+import conversion_metrics
+import dir_walker
+import image_encoders
+import image_pixels
+import memory_admission
+import pixel_dedupe_index
+import webp_effort
+
 
 OLD_EXTENSION: typing.Final = ".old"
 
 
+def _get_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# `tempfile.mkstemp` creates files with mode 0600. Outputs get the mode `open` would give them.
+OUTPUT_FILE_MODE: typing.Final = 0o666 & ~_get_umask()
+
+
 # MARK: Filename/path helpers
 def get_image_filenames_in_dir(
     src_dir: str, image_extensions: typing.List[str]
 ) -> typing.List[str]:
-    return_value = []
+    return list(iter_image_filenames_in_dir(src_dir, image_extensions))
 
-    for current_dir, dir_names, filenames in os.walk(src_dir):
-        for filename in filenames:
-            match = any((filename.endswith(ext) for ext in image_extensions))
-            if match:
-                abs_filename = os.path.join(current_dir, filename)
-                return_value.append(abs_filename)
 
-    return return_value
+def iter_image_filenames_in_dir(
+    src_dir: str, image_extensions: typing.List[str]
+) -> typing.Iterator[str]:
+    """
+    Lazy version of `get_image_filenames_in_dir`, so that conversion can start on the first image found.
+    """
+    image_extensions = tuple(image_extensions)
+
+    for current_dir, _, file_entries in dir_walker.walk(src_dir):
+        for entry in file_entries:
+            if entry.name.endswith(image_extensions):
+                yield os.path.join(current_dir, entry.name)
 
 
 def _get_dest_filename(filename: str, dest_extension: str, dest_dir: str):
@@ -32,26 +62,290 @@ def _get_dest_filename(filename: str, dest_extension: str, dest_dir: str):
     return filename
 
 
+def _iter_source_and_target_filenames(
+    src_dir: str,
+    dest_dir: str | None,
+    input_extensions: typing.List[str],
+    output_extension: str,
+) -> typing.Iterator[typing.Tuple[str, str]]:
+    for filename in iter_image_filenames_in_dir(src_dir, input_extensions):
+        if dest_dir:
+            yield filename, _get_dest_filename(filename, output_extension, dest_dir)
+        else:
+            yield filename, os.path.splitext(filename)[0] + output_extension
+
+
 # MARK: Image conversion helpers
-def convert_image_worker(src_filename: str, dest_filename: str, rename_src: bool):
+WEBP_SAVE_PARAMETERS: typing.Final = image_encoders.ENCODERS["webp"].save_parameters
+
+
+class ConversionResult(enum.Enum):
+    SKIPPED = "skipped"
+    CONVERTED = "converted"
+    CACHE_HIT = "cache_hit"
+    VERIFICATION_FAILED = "verification_failed"
+    DEDUPLICATED = "deduplicated"  # Linked or copied from the output of an image with identical pixels.
+
+
+class VerificationError (Exception):
+    pass
+
+
+class ConversionOptions(typing.NamedTuple):
+    cache_dir: str | None = None  # If not `None`, reuse previous outputs for the same source content from this `conversion_cache` dir.
+    effort_budget: webp_effort.EffortBudget | None = None  # If not `None`, pick the WebP `method` per image with `webp_effort`.
+    decision_log_filename: str | None = None  # If not `None`, append `webp_effort` decisions to this JSON lines file.
+    encoder_names: typing.Tuple[str, ...] | None = None  # `image_encoders` candidates; the smallest output is kept. `None`: The default encoder of the destination extension.
+    candidate_threads: int = 1  # Candidates encoded concurrently per image.
+    verify: bool = False  # If `True`, decode each output and compare its pixels with the source before it's moved into place.
+    dedupe_index_filename: str | None = None  # If not `None`, reuse outputs of images with identical pixels recorded in this `pixel_dedupe_index` file.
+
+    def get_cache_parameters(self, dest_extension: str) -> dict:
+        """
+        Everything that affects the output, for `conversion_cache.get_cache_key`.
+        """
+        encoders = image_encoders.get_encoders(dest_extension, self.encoder_names)
+        return {
+            "encoders": [(e.name, e.format, e.save_parameters) for e in encoders],
+            "auto_method": self.effort_budget.to_dict() if self.effort_budget else None,
+        }
+
+
+class EncodeTimings(typing.NamedTuple):
+    decode_seconds: float
+    encode_seconds: float
+    pixels: int
+    encoder_name: str = ""
+    verify_seconds: float = 0.0
+    pixel_key: str | None = None  # `pixel_dedupe_index` key.
+    duplicate_of: str | None = None  # Output the result was linked or copied from.
+
+
+def convert_image_worker(
+    src_filename: str,
+    dest_filename: str,
+    rename_src: bool,
+    options: ConversionOptions = ConversionOptions(),
+) -> conversion_metrics.ImageMetrics:
+    """
+    :return: Metrics of this image. `result` is a `ConversionResult` value.
+    """
+    start_time = time.perf_counter()
+    worker_id = conversion_metrics.get_worker_id()
+
     if os.path.exists(dest_filename):
         print(f"Destination file `{dest_filename}` exists. Skipping.")
-        return
+        return conversion_metrics.ImageMetrics(
+            src_filename, dest_filename, ConversionResult.SKIPPED.value, worker_id
+        )
+
+    # Write to a temp file in the destination dir and move it into place when it's complete, so that a crash never leaves a truncated `dest_filename`.
+    dest_dir, dest_basename = os.path.split(dest_filename)
+    fd, temp_filename = tempfile.mkstemp(
+        suffix=os.path.splitext(dest_filename)[1],
+        prefix=f".tmp_{dest_basename}_",
+        dir=dest_dir or None,
+    )
+    os.fchmod(fd, OUTPUT_FILE_MODE)  # Kept when the temp file is written to, copied into and moved into place.
+    os.close(fd)
+
+    try:
+        result = ConversionResult.CONVERTED
+        timings = EncodeTimings(0.0, 0.0, 0)
+        if options.cache_dir:
+            cache = conversion_cache.get_cache(options.cache_dir)
+            cache_key = conversion_cache.get_cache_key(
+                src_filename,
+                options.get_cache_parameters(os.path.splitext(dest_filename)[1]),
+            )
+
+            if cache.get(cache_key, temp_filename):
+                print(f"Copied `{dest_filename}` from cache.")
+                result = ConversionResult.CACHE_HIT
 
-    print(f"Converting `{src_filename}` to `{dest_filename}`...")
-    # TODO: Support more output formats.
-    convert_image_to_webp(src_filename, dest_filename)
+                if options.verify:
+                    verify_start_time = time.perf_counter()
+                    with Image.open(src_filename) as src_image:
+                        verified = verify_lossless(src_image, temp_filename)
+                    timings = timings._replace(verify_seconds=time.perf_counter() - verify_start_time)
+                    if not verified:
+                        # Drop the bad object, so that later runs don't hit it again, and encode instead. Only a failed fresh encode is a verification failure.
+                        print(f"Cached output of `{src_filename}` doesn't match it. Removed it from the cache.")
+                        cache.remove(cache_key)
+                        result = ConversionResult.CONVERTED
+
+        if result is ConversionResult.CONVERTED:
+            print(f"Converting `{src_filename}` to `{dest_filename}`...")
+            timings = convert_image(src_filename, dest_filename, options, temp_filename)
+            if timings.duplicate_of:
+                print(f"`{src_filename}` has the same pixels as the source of `{timings.duplicate_of}`. Reusing its output.")
+                result = ConversionResult.DEDUPLICATED
+
+            if options.cache_dir:
+                cache.put(cache_key, temp_filename)
+
+        os.replace(temp_filename, dest_filename)
+
+        if (result is ConversionResult.CONVERTED) and timings.pixel_key:
+            pixel_dedupe_index.get_index(options.dedupe_index_filename).put(timings.pixel_key, dest_filename)
+
+    except VerificationError as e:
+        print(f"Verification failed: {e} Keeping `{src_filename}` unchanged.")
+        os.remove(temp_filename)
+        return conversion_metrics.ImageMetrics(
+            src_filename, dest_filename, ConversionResult.VERIFICATION_FAILED.value, worker_id,
+            total_seconds=time.perf_counter() - start_time,
+        )
+
+    except BaseException:
+        os.remove(temp_filename)
+        raise
+
+    input_bytes = os.path.getsize(src_filename)
+    output_bytes = os.path.getsize(dest_filename)
 
     if rename_src:
         os.rename(src_filename, src_filename + OLD_EXTENSION)
 
+    return conversion_metrics.ImageMetrics(
+        src_filename,
+        dest_filename,
+        result.value,
+        worker_id,
+        timings.decode_seconds,
+        timings.encode_seconds,
+        time.perf_counter() - start_time,
+        input_bytes,
+        output_bytes,
+        timings.pixels,
+        timings.encoder_name,
+        timings.verify_seconds,
+    )
+
 
-def convert_image_to_webp(src_filename: str, dest_filename: str):
+def verify_lossless(src_image: Image.Image, output_filename: str) -> bool:
+    with Image.open(output_filename) as output_image:
+        return image_pixels.images_equal(src_image, output_image)
+
+
+def convert_image(
+    src_filename: str,
+    dest_filename: str,
+    options: ConversionOptions = ConversionOptions(),
+    output_filename: str | None = None,
+) -> EncodeTimings:
+    """
+    Encode with the `image_encoders` encoder(s) for the extension of `dest_filename`.
+
+    :param output_filename: Write here instead of `dest_filename` (e.g. a temp file). Must have the same extension.
+    :return: Decode (including `webp_effort` probing), encode and verification times, and the encoder used.
+    :raise VerificationError: `options.verify` is set and the output doesn't match the source.
+    """
+    output_filename = output_filename or dest_filename
+
+    encoders = image_encoders.get_encoders(
+        os.path.splitext(dest_filename)[1], options.encoder_names
+    )
+
+    start_time = time.perf_counter()
+    src_image: Image.Image = Image.open(src_filename)
+    src_image.load()  # `Image.open` is lazy. Decode here so that decoding and encoding are timed separately.
+
+    pixel_key = None
+    if options.dedupe_index_filename:
+        pixel_key = pixel_dedupe_index.get_key(
+            src_image, options.get_cache_parameters(os.path.splitext(dest_filename)[1])
+        )
+        duplicate_of = pixel_dedupe_index.get_index(options.dedupe_index_filename).get(pixel_key)
+        if duplicate_of:
+            pixel_dedupe_index.link_or_copy(duplicate_of, output_filename)
+            return EncodeTimings(
+                time.perf_counter() - start_time,
+                0.0,
+                src_image.width * src_image.height,
+                duplicate_of=duplicate_of,
+            )
+
+    candidates = [(e, dict(e.save_parameters)) for e in encoders]
+
+    if options.effort_budget:
+        webp_candidates = [c for c in candidates if c[0].format == "WEBP"]
+        if webp_candidates:
+            method, decision = webp_effort.choose_method_for_image(
+                src_image, webp_candidates[0][1], options.effort_budget
+            )
+            for _, save_parameters in webp_candidates:
+                save_parameters["method"] = method
+
+            if options.decision_log_filename:
+                decision["src_filename"] = src_filename
+                decision["dest_filename"] = dest_filename
+                webp_effort.append_decision(options.decision_log_filename, decision)
+
+    encode_start_time = time.perf_counter()
+    if len(candidates) == 1:
+        encoder, save_parameters = candidates[0]
+        src_image.save(output_filename, format=encoder.format, **save_parameters)  # TODO: ICC Profile
+    else:
+        encoder, content = image_encoders.encode_smallest(
+            src_image, candidates, options.candidate_threads
+        )
+        with open(output_filename, "wb") as f:
+            f.write(content)
+    end_time = time.perf_counter()
+
+    if options.verify:
+        if not verify_lossless(src_image, output_filename):
+            raise VerificationError(f"Output of `{src_filename}` ({encoder.name}) doesn't match it.")
+
+    return EncodeTimings(
+        encode_start_time - start_time,
+        end_time - encode_start_time,
+        src_image.width * src_image.height,
+        encoder.name,
+        time.perf_counter() - end_time,
+        pixel_key,
+    )
+
+
+def convert_image_to_webp(
+    src_filename: str,
+    dest_filename: str,
+    effort_budget: webp_effort.EffortBudget | None = None,
+    decision_log_filename: str | None = None,
+) -> EncodeTimings:
+    """
+    :param effort_budget: If not `None`, pick `method` for this image with `webp_effort` instead of always using the slowest one.
+    :param decision_log_filename: If not `None`, append the `webp_effort` decision to this JSON lines file.
+    :return: Decode (including `webp_effort` probing) and encode times.
+    """
     if not dest_filename.endswith(".webp"):
         raise NotImplementedError("Extension must be webp.")
 
-    src_image: Image.Image = Image.open(src_filename)
-    src_image.save(dest_filename, lossless=True, quality=100, method=6)  # TODO: ICC Profile
+    return convert_image(
+        src_filename,
+        dest_filename,
+        ConversionOptions(
+            effort_budget=effort_budget, decision_log_filename=decision_log_filename
+        ),
+    )
+
+
+class Executor(enum.Enum):
+    PROCESS = "process"
+    THREAD = "thread"  # Pillow releases the GIL while decoding and encoding.
+    SERIAL = "serial"
+
+
+MAX_PENDING_IMAGES_PER_PROCESS = 4
+
+
+def _init_worker(max_image_pixels: int | None):
+    Image.MAX_IMAGE_PIXELS = max_image_pixels
+
+
+def _convert_image_task(args: tuple) -> conversion_metrics.ImageMetrics:
+    return convert_image_worker(*args)
 
 
 def main(
@@ -62,7 +356,24 @@ def main(
     assume_yes: bool,
     rename_src: bool,
     processes: int | None,
-):
+    cache_dir: str | None = None,
+    cache_max_size: int | None = None,
+    effort_budget: webp_effort.EffortBudget | None = None,
+    decision_log_filename: str | None = None,
+    metrics_filename: str | None = None,
+    dry_run: bool = False,
+    encoder_names: typing.List[str] | None = None,
+    cpu_budget: int | None = None,
+    memory_budget: int | None = None,
+    verify: bool = False,
+    journal_filename: str | None = None,
+    executor: Executor = Executor.PROCESS,
+    dedupe_index_filename: str | None = None,
+) -> conversion_metrics.MetricsReport:
+    """
+    :param processes: Worker processes (or threads). Uses `os.cpu_count()` if `None`; serial if 0.
+    :return: The (closed) metrics report of the run.
+    """
     # Check directories.
     print(f"Using source dir `{src_dir}`.")
     if not os.path.isdir(src_dir):
@@ -85,28 +396,77 @@ def main(
     if not output_extension.startswith("."):
         output_extension = "." + output_extension
 
-    # Get source and target files.
-    image_filenames = get_image_filenames_in_dir(src_dir, input_extensions)
-    if not image_filenames:
-        print("No file to convert.")
-        exit(0)
+    # Fail early on unsupported extensions/encoders.
+    encoders = image_encoders.get_encoders(output_extension, encoder_names)
+    if len(encoders) > 1:
+        print(f"Keeping the smallest output of encoders: {', '.join(e.name for e in encoders)}.")
 
-    if dest_dir:
-        source_and_target_filenames = tuple(
-            (filename, _get_dest_filename(filename, output_extension, dest_dir))
-            for filename in image_filenames
+    # Candidate encoders of an image run concurrently, but processes * candidate threads stays within `cpu_budget`.
+    if processes == 0:
+        executor = Executor.SERIAL
+    worker_count = 1 if (executor is Executor.SERIAL) else (processes or os.cpu_count())
+    candidate_threads = max((cpu_budget or os.cpu_count()) // worker_count, 1)
+
+    # With a memory budget, images are admitted only while their estimated decode + encode memory fits. Images over the whole budget run alone.
+    concurrent_encodes = min(candidate_threads, len(encoders))
+    admission = None
+    if memory_budget is not None:
+        admission = memory_admission.MemoryAdmission(memory_budget)
+        print(f"Memory budget: {memory_budget / 1024 ** 3:.2f} GiB.")
+
+        # Big scans over Pillow's default limit run alone, so the decompression bomb check only rejects images that can't fit into the physical memory (or the budget, if it's bigger).
+        Image.MAX_IMAGE_PIXELS = memory_admission.get_max_image_pixels(
+            max(memory_budget, memory_admission.get_physical_memory() or 0), concurrent_encodes
         )
-    else:
-        source_and_target_filenames = tuple(
-            (filename, os.path.splitext(filename)[0] + output_extension)
-            for filename in image_filenames
+
+    def get_memory_cost(src_filename: str, dest_filename: str) -> int:
+        if (admission is None) or os.path.exists(dest_filename):
+            return 0
+        return memory_admission.estimate_conversion_memory(src_filename, concurrent_encodes)
+
+    options = ConversionOptions(
+        cache_dir,
+        effort_budget,
+        decision_log_filename,
+        tuple(encoder_names) if encoder_names else None,
+        candidate_threads,
+        verify,
+        dedupe_index_filename,
+    )
+
+    journal = None
+    if journal_filename:
+        # Verification failures are retried on resume.
+        journal = conversion_journal.ConversionJournal(
+            journal_filename,
+            (ConversionResult.SKIPPED.value, ConversionResult.CONVERTED.value, ConversionResult.CACHE_HIT.value, ConversionResult.DEDUPLICATED.value),
         )
+        print(f"Journal `{journal_filename}`: {len(journal.done)} images already done.")
+
+    # Source and target files are discovered lazily. Walking the tree again is cheap compared with encoding.
+    def iter_source_and_target_filenames():
+        for src_filename, dest_filename in _iter_source_and_target_filenames(
+            src_dir, dest_dir, input_extensions, output_extension
+        ):
+            if journal and journal.is_done(src_filename, dest_filename):
+                continue
+
+            yield src_filename, dest_filename
 
-    # List source and target files.
-    if not assume_yes:
-        print(f"{len(source_and_target_filenames)} files to convert:")
-        for src_filename, dest_filename in source_and_target_filenames:
+    # List source and target files in a separate dry-run pass.
+    if dry_run or (not assume_yes):
+        file_count = 0
+        for src_filename, dest_filename in iter_source_and_target_filenames():
             print(f"`{src_filename}` -> `{dest_filename}`")
+            file_count += 1
+
+        if not file_count:
+            print("No file to convert.")
+            exit(0)
+
+        print(f"{file_count} files to convert.")
+        if dry_run:
+            exit(0)
 
         consent = input("Convert? (y/n) ")
         if consent.lower() != "y":
@@ -114,19 +474,109 @@ def main(
             exit(2)
 
     # Convert.
-    if processes == 0:
-        for src_filename, dest_filename in source_and_target_filenames:
-            convert_image_worker(src_filename, dest_filename, rename_src)
+    start_time = time.perf_counter()
+    report = conversion_metrics.MetricsReport(
+        metrics_filename,
+        (ConversionResult.SKIPPED.value,),  # Images that did no work.
+    )
+
+    worker_args = (
+        (src_filename, dest_filename, rename_src, options)
+        for src_filename, dest_filename in iter_source_and_target_filenames()
+    )
+
+    if executor is Executor.SERIAL:
+        for args in worker_args:
+            cost = get_memory_cost(*args[:2])
+            if admission:
+                admission.acquire(cost)  # Never blocks, as images run 1 at a time. Keeps the accounting of both paths the same.
+            try:
+                metrics = convert_image_worker(*args)
+            finally:
+                if admission:
+                    admission.release(cost)
+
+            if journal:
+                journal.record(metrics.src_filename, metrics.dest_filename, metrics.result)
+
+            report.add(metrics)
 
     else:
-        with multiprocessing.Pool(processes) as pool:
-            pool.starmap(
-                convert_image_worker,
-                (
-                    (src_filename, dest_filename, rename_src)
-                    for src_filename, dest_filename in source_and_target_filenames
-                )
-            )
+        processes = processes or os.cpu_count()
+
+        # `imap_unordered` pulls tasks from its input as fast as it can. Limit the number of discovered-but-unfinished images instead.
+        pending_semaphore = threading.Semaphore(processes * MAX_PENDING_IMAGES_PER_PROCESS)
+
+        # Queued images count towards the memory budget too.
+        reserved_memory: typing.Dict[str, int] = {}  # Source filename: Reserved bytes
+
+        # Set when the result loop stops early (e.g. a worker raised), so that the pool's task handler thread stops feeding instead of waiting for a release forever.
+        aborted = threading.Event()
+
+        def bounded(iterable):
+            for args in iterable:
+                pending_semaphore.acquire()
+                if aborted.is_set():
+                    return
+
+                if admission:
+                    src_filename, dest_filename = args[:2]
+                    cost = get_memory_cost(src_filename, dest_filename)
+                    if not admission.acquire(cost):
+                        return
+
+                    reserved_memory[src_filename] = cost
+
+                yield args
+
+        if executor is Executor.THREAD:
+            pool = multiprocessing.pool.ThreadPool(processes)
+        else:
+            pool = multiprocessing.Pool(processes, _init_worker, (Image.MAX_IMAGE_PIXELS,))
+
+        with pool:
+            try:
+                for metrics in pool.imap_unordered(_convert_image_task, bounded(worker_args)):
+                    pending_semaphore.release()
+                    if admission:
+                        admission.release(reserved_memory.pop(metrics.src_filename))
+                    if journal:
+                        journal.record(metrics.src_filename, metrics.dest_filename, metrics.result)
+
+                    report.add(metrics)
+
+            except BaseException:
+                # Exiting `pool` joins the task handler thread, which may be blocked in `bounded`.
+                aborted.set()
+                pending_semaphore.release()
+                if admission:
+                    admission.abort()
+                raise
+
+    if not report.counts:
+        print("No file to convert.")
+
+    report.close()
+    if journal:
+        journal.close()
+    print(report.get_summary(time.perf_counter() - start_time))
+
+    if dedupe_index_filename:
+        print(f"Pixel dedupe: {report.counts.get(ConversionResult.DEDUPLICATED.value, 0)} encodes avoided.")
+
+    # Cache stats and eviction.
+    if cache_dir:
+        hits = report.counts.get(ConversionResult.CACHE_HIT.value, 0)
+        misses = report.counts.get(ConversionResult.CONVERTED.value, 0)
+        print(f"Conversion cache: {hits} hits, {misses} misses.")
+
+        if cache_max_size is not None:
+            cache = conversion_cache.ConversionCache(cache_dir)
+            deleted_count, deleted_size = cache.evict(cache_max_size)
+            cache.close()
+            print(f"Conversion cache: Evicted {deleted_count} entries ({deleted_size} bytes).")
+
+    return report
 
 
 if __name__ == "__main__":
@@ -173,6 +623,96 @@ if __name__ == "__main__":
              f"Doesn't use `multiprocessing` if 0. "
              f"Default: %(default)s",
     )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="Content-addressed cache of converted images. Sources whose content was converted before are copied (or reflinked) from it instead of encoded. Default: No cache",
+    )
+    parser.add_argument(
+        "--cache_max_size",
+        type=int,
+        default=10 * 1024 ** 3,
+        help="Evict least recently used cache entries after the run until the cache is at most this many bytes. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--auto_method",
+        action="store_true",
+        help=f"If set, pick the WebP `method` per image from a budget by encoding a probe crop with methods {webp_effort.METHOD_CANDIDATES}, instead of always using {WEBP_SAVE_PARAMETERS['method']}.",
+    )
+    parser.add_argument(
+        "--max_seconds_per_megapixel",
+        type=float,
+        default=None,
+        help="`--auto_method` time budget, extrapolated from the probe. Default: No limit",
+    )
+    parser.add_argument(
+        "--min_size_gain",
+        type=float,
+        default=0.01,
+        help="`--auto_method`: Only use a higher method if its output is at least this fraction smaller. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--decision_log",
+        type=str,
+        default=None,
+        help="`--auto_method`: Append per-image decisions to this JSON lines file. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        help="Write per-image metrics (decode/encode time, bytes, pixels, compression ratio, worker id) to this JSON lines file. A summary is always printed. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--dry_run",
+        "-n",
+        action="store_true",
+        help="If set, only list source and target files.",
+    )
+    parser.add_argument(
+        "--encoders",
+        "-e",
+        nargs="+",
+        default=None,
+        help=f"Candidate encoders for `--output_extension`; the smallest output is kept. Available: {', '.join(image_encoders.ENCODERS)}. Default: The default encoder of the extension ({image_encoders.DEFAULT_ENCODER_NAMES})",
+    )
+    parser.add_argument(
+        "--cpu_budget",
+        type=int,
+        default=None,
+        help="Max concurrent encodes over all processes. Candidate encoders of an image use the cores left over by `--processes`. Default: `os.cpu_count()`",
+    )
+    parser.add_argument(
+        "--memory_budget",
+        type=int,
+        default=memory_admission.get_default_memory_budget(),
+        help="Only start images while their total estimated decode + encode memory (from the image headers) stays within this many bytes. An image over the whole budget runs alone. Pillow's decompression bomb limit is raised to what fits into the physical memory. 0: No budget (Pillow's default limit). Default: Half of the physical memory (%(default)s)",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="If set, decode each output and compare its pixels with the source before moving it into place (and before `--rename_src`).",
+    )
+    parser.add_argument(
+        "--journal",
+        type=str,
+        default=None,
+        help="Record finished images in this file, and skip images already recorded there, so that an interrupted run can be resumed. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--executor",
+        type=str,
+        choices=[e.value for e in Executor],
+        default=Executor.PROCESS.value,
+        help="Run images in worker processes or threads. `--processes 0` always runs serially. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--dedupe_index",
+        type=str,
+        default=None,
+        help="Pixel dedupe index (SQLite) file. Images whose decoded pixels match an earlier output's source are hard-linked (or copied) from that output instead of encoded. Default: %(default)s",
+    )
     args = parser.parse_args()
 
     main(
@@ -183,4 +723,21 @@ if __name__ == "__main__":
         args.assume_yes,
         args.rename_src,
         args.processes,
+        args.cache_dir,
+        args.cache_max_size,
+        (
+            webp_effort.EffortBudget(args.max_seconds_per_megapixel, args.min_size_gain)
+            if args.auto_method
+            else None
+        ),
+        args.decision_log,
+        args.metrics,
+        args.dry_run,
+        args.encoders,
+        args.cpu_budget,
+        args.memory_budget or None,
+        args.verify,
+        args.journal,
+        Executor(args.executor),
+        args.dedupe_index,
     )
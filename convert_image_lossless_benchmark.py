@@ -0,0 +1,217 @@
+"""
+Measure `convert_image_lossless.py` end-to-end throughput on synthetic image corpora.
+
+Corpora are generated with Pillow from a seed, so runs on different versions convert the same images:
+
+- `photo`: Smooth random color fields with grain, similar to photos. Hard to compress.
+- `ui`: Flat panels, buttons and text, similar to screenshots. Easy to compress.
+
+Every combination of executor, process count and encoder setting converts the whole corpus.
+Results (with environment details) are written as JSON so that regressions can be tracked between versions.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+
+import PIL
+from PIL import Image, ImageChops, ImageDraw
+
+import conversion_metrics
+import convert_image_lossless
+import image_encoders
+import memory_admission
+import webp_effort
+
+
+CORPUS_KINDS = ("photo", "ui")
+AUTO_METHOD_SETTING = "auto"  # `webp_effort` picks the method per image.
+
+
+# MARK: - Corpus
+def _generate_photo(rng: random.Random, side_length: int) -> Image.Image:
+    # Smooth color field: A small random image scaled up.
+    base_side_length = max(side_length // 32, 2)
+    base = Image.frombytes("RGB", (base_side_length, base_side_length), rng.randbytes(base_side_length * base_side_length * 3))
+    base = base.resize((side_length, side_length), Image.Resampling.BICUBIC)
+
+    # Grain: ±8 per channel.
+    channels = []
+    for channel in base.split():
+        grain = Image.frombytes("L", base.size, rng.randbytes(side_length * side_length))
+        grain = grain.point(lambda v: 120 + v // 16)
+        channels.append(ImageChops.add(channel, grain, 1.0, -128))
+
+    return Image.merge("RGB", channels)
+
+
+def _generate_ui(rng: random.Random, side_length: int) -> Image.Image:
+    def random_color():
+        return tuple(rng.choice((32, 64, 128, 200, 230, 245, 255)) for _ in range(3))
+
+    image = Image.new("RGB", (side_length, side_length), random_color())
+    draw = ImageDraw.Draw(image)
+
+    element_count = min(max(side_length * side_length // 20000, 4), 20000)
+    for _ in range(element_count):
+        left = rng.randrange(side_length)
+        top = rng.randrange(side_length)
+        width = rng.randrange(8, max(side_length // 4, 9))
+        height = rng.randrange(8, max(side_length // 8, 9))
+
+        if rng.random() < 0.7:
+            draw.rectangle((left, top, left + width, top + height), fill=random_color(), outline=random_color())
+        else:
+            draw.text((left, top), f"Label {rng.randrange(10000)}", fill=random_color())
+
+    return image
+
+
+def generate_corpus(dir_name: str, kinds: list[str], sizes: list[int], images_per_case: int, seed: int) -> dict:
+    """
+    Write `images_per_case` PNGs per (kind, size) to `dir_name`.
+
+    :return: Description of the corpus, for the results.
+    """
+    generators = {"photo": _generate_photo, "ui": _generate_ui}
+    total_bytes = 0
+
+    for kind in kinds:
+        for side_length in sizes:
+            for i in range(images_per_case):
+                rng = random.Random(f"{seed}_{kind}_{side_length}_{i}")  # Independent of which other cases are generated.
+                filename = os.path.join(dir_name, f"{kind}_{side_length}_{i}.png")
+                generators[kind](rng, side_length).save(filename, compress_level=1)
+                total_bytes += os.path.getsize(filename)
+
+    return {
+        "kinds": kinds,
+        "sizes": sizes,
+        "images_per_case": images_per_case,
+        "seed": seed,
+        "image_count": len(kinds) * len(sizes) * images_per_case,
+        "total_bytes": total_bytes,
+    }
+
+
+# MARK: - Benchmark
+def _get_run_arguments(setting: str) -> dict:
+    if setting == AUTO_METHOD_SETTING:
+        return {"effort_budget": webp_effort.EffortBudget(None, 0.01)}
+    else:
+        return {"encoder_names": [setting]}
+
+
+def benchmark(corpus_dir: str, work_dir: str, executor: convert_image_lossless.Executor, processes: int, setting: str, repeat: int, memory_budget: int | None = None) -> dict:
+    """
+    :param memory_budget: `convert_image_lossless` memory budget, which also raises Pillow's pixel limit. `None`: Pillow's default limit.
+    :return: Results of the fastest run.
+    """
+    best = None
+
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(dir=work_dir) as dest_dir:
+            start_time = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):  # Per-image messages.
+                report = convert_image_lossless.main(
+                    corpus_dir, dest_dir, ["png"], "webp", True, False, processes,
+                    executor=executor,
+                    memory_budget=memory_budget,
+                    **_get_run_arguments(setting),
+                )
+            wall_seconds = time.perf_counter() - start_time
+
+        if (best is None) or (wall_seconds < best[0]):
+            best = (wall_seconds, report)
+
+    wall_seconds, report = best
+    latencies = sorted(report.latencies)
+    return {
+        "executor": executor.value,
+        "processes": processes,
+        "setting": setting,
+        "wall_seconds": wall_seconds,
+        "images_per_second": len(latencies) / wall_seconds,
+        "megapixels_per_second": report.pixels / 1e6 / wall_seconds,
+        "input_megabytes_per_second": report.input_bytes / 1e6 / wall_seconds,
+        "latency_p50": conversion_metrics.percentile(latencies, 50),
+        "latency_p95": conversion_metrics.percentile(latencies, 95),
+        "output_input_ratio": report.output_bytes / report.input_bytes,
+        "counts": report.counts,
+    }
+
+
+def _get_environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main(kinds: list[str], sizes: list[int], images_per_case: int, seed: int, executors: list[convert_image_lossless.Executor], processes_list: list[int], settings: list[str], repeat: int, work_dir: str | None, output_filename: str | None, memory_budget: int | None = None):
+    results = {"environment": _get_environment(), "memory_budget": memory_budget, "runs": []}
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as dir_name:
+        corpus_dir = os.path.join(dir_name, "corpus")
+        os.mkdir(corpus_dir)
+        results["corpus"] = generate_corpus(corpus_dir, kinds, sizes, images_per_case, seed)
+        print(f"Corpus: {results['corpus']}")
+
+        print(f"{'executor':>10} {'processes':>10} {'setting':>12} {'seconds':>10} {'images/s':>10} {'MP/s':>10} {'p95 s':>10} {'out/in':>8}")
+        for executor in executors:
+            for processes in processes_list:
+                if (executor is convert_image_lossless.Executor.SERIAL) and (processes != processes_list[0]):
+                    continue  # Process count doesn't matter.
+
+                for setting in settings:
+                    run = benchmark(corpus_dir, dir_name, executor, processes, setting, repeat, memory_budget)
+                    results["runs"].append(run)
+                    print(f"{run['executor']:>10} {run['processes']:>10} {run['setting']:>12} {run['wall_seconds']:>10.2f} {run['images_per_second']:>10.2f} {run['megapixels_per_second']:>10.2f} {run['latency_p95']:>10.3f} {run['output_input_ratio']:>8.3f}")
+
+    if output_filename:
+        with open(output_filename, "w") as f:  # Default encoding is UTF-8
+            json.dump(results, f, indent=2)
+        print(f"Results written to `{output_filename}`.")
+
+
+if __name__ == "__main__":
+    webp_encoder_names = [name for name, encoder in image_encoders.ENCODERS.items() if encoder.extension == ".webp"]
+
+    parser = argparse.ArgumentParser(description="Benchmark `convert_image_lossless.py` on synthetic corpora.")
+    parser.add_argument("--kinds", "-k", nargs="+", choices=CORPUS_KINDS, default=list(CORPUS_KINDS), help="Corpus image kinds. (default: %(default)s)")
+    parser.add_argument("--sizes", "-s", nargs="+", type=int, default=[64, 512, 4096], help="Image side lengths in pixels. Sizes over about 13377 (twice Pillow's default pixel limit) need a `--memory_budget`, which raises the limit to what fits into the physical memory. (default: %(default)s)")
+    parser.add_argument("--images_per_case", "-i", type=int, default=2, help="Images per (kind, size). (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed. (default: %(default)s)")
+    parser.add_argument("--executors", "-e", nargs="+", choices=[e.value for e in convert_image_lossless.Executor], default=[e.value for e in convert_image_lossless.Executor], help="(default: %(default)s)")
+    parser.add_argument("--processes", "-p", nargs="+", type=int, default=sorted({1, os.cpu_count()}), help="Worker counts. (default: %(default)s)")
+    parser.add_argument("--settings", "-m", nargs="+", choices=webp_encoder_names + [AUTO_METHOD_SETTING], default=["webp", "webp_fast", AUTO_METHOD_SETTING], help=f"WebP encoders (`image_encoders`) or `{AUTO_METHOD_SETTING}` (`webp_effort` picks the method). (default: %(default)s)")
+    parser.add_argument("--repeat", "-r", type=int, default=1, help="Runs per case; the fastest one is reported. (default: %(default)s)")
+    parser.add_argument("--work_dir", "-d", type=str, default=None, help="Where to create the corpus and outputs. Default: System temp dir")
+    parser.add_argument("--memory_budget", type=int, default=memory_admission.get_default_memory_budget(), help="`convert_image_lossless` memory budget in bytes. Images over it run alone. 0: No budget (Pillow's default pixel limit). Default: Half of the physical memory (%(default)s)")
+    parser.add_argument("--output", "-o", type=str, default=None, help="Write results to this JSON file. Default: Only print them")
+    args = parser.parse_args()
+
+    if args.output and os.path.exists(args.output):
+        raise FileExistsError(f"`{args.output}` exists!")
+
+    main(
+        args.kinds,
+        args.sizes,
+        args.images_per_case,
+        args.seed,
+        [convert_image_lossless.Executor(e) for e in args.executors],
+        args.processes,
+        args.settings,
+        args.repeat,
+        args.work_dir,
+        args.output,
+        args.memory_budget or None,
+    )
@@ -0,0 +1,232 @@
+"""
+Find duplicate files with as little I/O as possible.
+
+1. Bucket files by size. Files with a unique size can't have duplicates and are never read.
+2. In colliding buckets, hash only the first and last `PARTIAL_HASH_SIZE` bytes of each file.
+3. Fully hash only the files whose partial hashes still collide.
+"""
+
+import csv
+import hashlib
+import os
+import typing
+from collections import defaultdict
+
+import dir_walker
+import file_hash_cache
+import sha_hash
+
+
+PARTIAL_HASH_SIZE = 4096
+
+SHA_256_HASH_KEY: typing.Final = "sha256"  # Same as `list_file_attributes_in_dir.AttributeKeys.SHA_256_HASH`, so that cache entries are shared.
+
+
+class FileInfo(typing.NamedTuple):
+    filename: str
+    stat_key: file_hash_cache.StatKey
+
+    @property
+    def size(self) -> int:
+        return self.stat_key[2]
+
+
+class DuplicateGroup(typing.NamedTuple):
+    size: int
+    sha256: str
+    filenames: typing.List[str]
+
+    @property
+    def wasted_bytes(self) -> int:
+        return self.size * (len(self.filenames) - 1)
+
+
+# MARK: - Stages
+def _collect_files(start_path: str) -> typing.Iterator[FileInfo]:
+    """
+    Stage 0: 1 `stat` per regular file (from the cached `os.DirEntry`). Symlinks are skipped.
+    """
+    for root_path, _, file_entries in dir_walker.walk(start_path):
+        for entry in file_entries:
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat_result = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+
+            yield FileInfo(os.path.join(root_path, entry.name), file_hash_cache.get_stat_key(stat_result))
+
+
+def _group_by_size(files: typing.Iterable[FileInfo]) -> typing.List[typing.List[FileInfo]]:
+    """
+    Stage 1. Hard links to the same inode are kept only once, since they don't waste space. Empty files are ignored.
+    """
+    buckets = defaultdict(dict)
+    for info in files:
+        if info.size == 0:
+            continue
+
+        dev, ino = info.stat_key[:2]
+        buckets[info.size].setdefault((dev, ino), info)
+
+    return [list(bucket.values()) for bucket in buckets.values() if len(bucket) > 1]
+
+
+def get_partial_hash(filename: str, size: int) -> str:
+    """
+    Hash the first and last `PARTIAL_HASH_SIZE` bytes.
+    Small files are hashed completely; the result is then their full SHA256 (see `_is_partial_hash_complete`).
+    """
+    with open(filename, "rb", buffering=0) as f:
+        if _is_partial_hash_complete(size):
+            return hashlib.sha256(f.read()).hexdigest()
+
+        hasher = hashlib.sha256(f.read(PARTIAL_HASH_SIZE))
+        f.seek(-PARTIAL_HASH_SIZE, os.SEEK_END)
+        hasher.update(f.read(PARTIAL_HASH_SIZE))
+        return hasher.hexdigest()
+
+
+def _is_partial_hash_complete(size: int) -> bool:
+    return size <= 2 * PARTIAL_HASH_SIZE
+
+
+def _get_partial_hash_task(info: FileInfo) -> str | None:
+    try:
+        return get_partial_hash(info.filename, info.size)
+    except OSError:
+        return None
+
+
+def _get_full_hash_task(info: FileInfo) -> str | None:
+    try:
+        return sha_hash.get_sha_hashes_of_file_adaptive(info.filename, [sha_hash.HashAlgorithm.SHA256])[sha_hash.HashAlgorithm.SHA256]
+    except OSError:
+        return None
+
+
+def _map(function: typing.Callable, items: typing.List, pool) -> typing.Iterable:
+    if pool is None:
+        return map(function, items)
+    else:
+        return pool.imap(function, items, chunksize=16)
+
+
+def _split_by_hash(groups: typing.List[typing.List[FileInfo]], hashes: typing.Iterator[str | None]) -> typing.List[typing.Tuple[str, typing.List[FileInfo]]]:
+    """
+    :param hashes: One hash per file in `groups`, in order. Unreadable files have `None` and are dropped.
+    :return: `(hash, files)` for each hash with more than 1 file.
+    """
+    return_value = []
+
+    for group in groups:
+        by_hash = defaultdict(list)
+        for info in group:
+            digest = next(hashes)
+            if digest is not None:
+                by_hash[digest].append(info)
+
+        return_value += [(digest, files) for digest, files in by_hash.items() if len(files) > 1]
+
+    return return_value
+
+
+# MARK: - Main function
+class DuplicateStats:
+    def __init__(self):
+        self.file_count = 0
+        self.size_candidate_count = 0
+        self.partial_candidate_count = 0
+        self.bytes_read = 0
+
+    def get_description(self) -> str:
+        return (
+            f"{self.file_count} files scanned; "
+            f"{self.size_candidate_count} share a size; "
+            f"{self.partial_candidate_count} share a partial hash; "
+            f"{self.bytes_read} bytes read."
+        )
+
+
+def find_duplicates(start_path: str, pool=None, cache: file_hash_cache.FileHashCache | None = None, stats: DuplicateStats | None = None) -> typing.List[DuplicateGroup]:
+    """
+    :param pool: A `multiprocessing` pool (process or thread) to hash files with. `None`: Hash in this thread.
+    :param cache: Full hashes are looked up in and recorded to this cache.
+    :return: Duplicate groups, most wasted bytes first.
+    """
+    stats = stats or DuplicateStats()
+
+    # 1. Size.
+    files = list(_collect_files(start_path))
+    stats.file_count = len(files)
+
+    size_groups = _group_by_size(files)
+    del files
+    stats.size_candidate_count = sum(len(g) for g in size_groups)
+
+    # 2. Partial hash.
+    partial_candidates = [info for group in size_groups for info in group]
+    partial_hashes = _map(_get_partial_hash_task, partial_candidates, pool)
+    partial_groups = _split_by_hash(size_groups, iter(partial_hashes))
+    stats.bytes_read += sum(min(info.size, 2 * PARTIAL_HASH_SIZE) for info in partial_candidates)
+    stats.partial_candidate_count = sum(len(files) for _, files in partial_groups)
+
+    # 3. Full hash.
+    duplicate_groups = []
+    full_hash_groups = []
+    for partial_hash, group in partial_groups:
+        if _is_partial_hash_complete(group[0].size):
+            # The partial hash already covered the whole file.
+            duplicate_groups.append(DuplicateGroup(group[0].size, partial_hash, [info.filename for info in group]))
+        else:
+            full_hash_groups.append(group)
+
+    full_hash_candidates = [info for group in full_hash_groups for info in group]
+    full_hashes = {}
+    if cache:
+        for info in full_hash_candidates:
+            digest = cache.get(info.stat_key, SHA_256_HASH_KEY)
+            if digest is not None:
+                full_hashes[info] = digest
+                cache.record(info.stat_key, SHA_256_HASH_KEY, digest, hit=True)
+
+    misses = [info for info in full_hash_candidates if info not in full_hashes]
+    for info, digest in zip(misses, _map(_get_full_hash_task, misses, pool)):
+        stats.bytes_read += info.size
+        full_hashes[info] = digest
+        if cache and (digest is not None):
+            cache.record(info.stat_key, SHA_256_HASH_KEY, digest, hit=False)
+
+    for digest, group in _split_by_hash(full_hash_groups, (full_hashes[info] for info in full_hash_candidates)):
+        duplicate_groups.append(DuplicateGroup(group[0].size, digest, [info.filename for info in group]))
+
+    duplicate_groups.sort(key=lambda g: (-g.wasted_bytes, g.filenames[0]))
+    for group in duplicate_groups:
+        group.filenames.sort()
+
+    return duplicate_groups
+
+
+# MARK: - CSV
+class DuplicateKeys:
+    GROUP = "group"
+    SIZE = "size"
+    SHA_256_HASH = SHA_256_HASH_KEY
+    WASTED_BYTES = "wasted_bytes"
+    FILENAME = "filename"
+
+    ALL_KEYS = [GROUP, SIZE, SHA_256_HASH, WASTED_BYTES, FILENAME]
+
+
+def write_duplicate_groups_to_csv(groups: typing.Iterable[DuplicateGroup], csv_filename: str):
+    """
+    One row per file. Files in the same group share the `group` number.
+    """
+    with open(csv_filename, "w") as f:  # Default encoding is UTF-8
+        writer = csv.writer(f)
+        writer.writerow(DuplicateKeys.ALL_KEYS)
+
+        for i, group in enumerate(groups):
+            for filename in group.filenames:
+                writer.writerow((i, group.size, group.sha256, group.wasted_bytes, filename))
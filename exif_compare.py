@@ -1,23 +1,38 @@
 """
 - Get EXIF info from `exiftool`
 - Extract the related fields, and compare them among files
+
+`exiftool` is started once per worker (`-stay_open True -@ -`) and given chunks of filenames, because Perl startup dominates per-file calls.
+Only the compared fields are requested. Common fields are read in-process by `exif_fast_path` when it can give the same result as `exiftool`.
 """
 
 import argparse
+import concurrent.futures
+import itertools
 import os
+import queue
 import subprocess
 import json
+import typing
 from collections import defaultdict
 
+import dir_walker
+import exif_fast_path
+import metadata_cache
+
 
 EXIFTOOL_FILENAME_KEY = "SourceFile"  # Get keys from `exiftool -j filename`
 
 METADATA_ABSENT_KEY = "(Absent)"
 
+DEFAULT_CHUNK_SIZE = 64  # Files per `exiftool` request.
+
 
 def run_exiftool(filename: str) -> dict:
+    """
+    1 `exiftool` process for 1 file. Use `ExiftoolPool` for many files.
+    """
     cmd = ["exiftool", "-j", filename]
-    # FIXME: 1 call per file might be slow; Can I call `exiftool` once on all files?
     result = subprocess.run(cmd, capture_output=True, text=True)
     if result.returncode:
         raise RuntimeError(f"exiftool failed on `{filename}` with code {result.returncode}")
@@ -26,39 +41,385 @@ def run_exiftool(filename: str) -> dict:
     return ret[0]
 
 
-def main(filenames: list[str] | None, metadata_fields: list[str]):
-    if not filenames:
-        print(f"Will scan all files in current dir `{os.getcwd()}`\n")
-        filenames = [filename for filename in os.listdir(os.getcwd()) if os.path.isfile(filename)]
-        if not filenames:
-            raise ValueError("Empty dir")
-    filenames.sort()
+# MARK: - Persistent `exiftool` processes
+class ExiftoolProcess:
+    """
+    A long-running `exiftool -stay_open True -@ -`. Arguments are sent over stdin, 1 per line.
+
+    Not thread safe. Filenames must not contain line breaks.
+    """
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            ["exiftool", "-stay_open", "True", "-@", "-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,  # Per-file errors are detected from missing results.
+            encoding="utf-8",
+        )
+        self._request_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.write("-stay_open\nFalse\n")
+            self.process.stdin.close()
+            self.process.wait()
+
+    def execute(self, args: typing.List[str]) -> str:
+        """
+        :return: stdout of this request.
+        """
+        self._request_count += 1
+        self.process.stdin.write("\n".join(args) + f"\n-execute{self._request_count}\n")
+        self.process.stdin.flush()
+
+        ready_line = f"{{ready{self._request_count}}}\n"
+        lines = []
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"exiftool exited with code {self.process.wait()}")
+            if line == ready_line:
+                return "".join(lines)
+            lines.append(line)
+
+    def get_metadata(self, filenames: typing.List[str], tags: typing.List[str] | None = None) -> typing.List[dict]:
+        """
+        :param tags: Only get these tags (and `EXIFTOOL_FILENAME_KEY`). `None`: All tags.
+        :return: 1 dict per file, in the order of `filenames`.
+        """
+        # In the argfile, lines starting with "-" are options and lines starting with "#" are comments. Relative paths get "./", so no filename starts with either.
+        arg_filenames = [f if os.path.isabs(f) else os.path.join(os.curdir, f) for f in filenames]
+
+        output = self.execute(["-j"] + [f"-{tag}" for tag in (tags or [])] + arg_filenames)
+        results = {d[EXIFTOOL_FILENAME_KEY]: d for d in json.loads(output)} if output.strip() else {}
+
+        ret = []
+        for filename, arg_filename in zip(filenames, arg_filenames):
+            if arg_filename not in results:
+                raise RuntimeError(f"exiftool failed on `{filename}`")
+
+            d = results[arg_filename]
+            d[EXIFTOOL_FILENAME_KEY] = filename
+            ret.append(d)
+
+        return ret
+
+
+class ExiftoolPool:
+    """
+    `workers` `ExiftoolProcess`es. Threads only wait on pipes, so they don't contend for the GIL.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._processes: queue.SimpleQueue[ExiftoolProcess] = queue.SimpleQueue()
+        self._all_processes: typing.List[ExiftoolProcess] = []
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        for process in self._all_processes:
+            process.close()
+        self._all_processes = []
+
+    def _get_metadata_of_chunk(self, filenames: typing.List[str], tags: typing.List[str] | None) -> typing.List[dict]:
+        try:
+            process = self._processes.get_nowait()
+        except queue.Empty:
+            process = ExiftoolProcess()  # Started lazily: At most 1 per thread.
+            self._all_processes.append(process)
+
+        try:
+            return process.get_metadata(filenames, tags)
+        finally:
+            self._processes.put(process)
+
+    def get_metadata(self, filenames: typing.List[str], tags: typing.List[str] | None = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> typing.Iterator[dict]:
+        """
+        :param tags: Only get these tags (and `EXIFTOOL_FILENAME_KEY`). `None`: All tags.
+        :return: 1 dict per file, in the order of `filenames`.
+        """
+        chunks = [filenames[i:i + chunk_size] for i in range(0, len(filenames), chunk_size)]
+        with concurrent.futures.ThreadPoolExecutor(max(min(self.workers, len(chunks)), 1)) as executor:
+            for chunk_metadata in executor.map(self._get_metadata_of_chunk, chunks, [tags] * len(chunks)):
+                yield from chunk_metadata
+
+
+def get_metadata(filenames: typing.List[str], fields: typing.List[str], pool: ExiftoolPool, chunk_size: int = DEFAULT_CHUNK_SIZE, fast_path: bool = True, cache: metadata_cache.MetadataCache | None = None) -> typing.List[dict]:
+    """
+    :param fast_path: If `True`, read what `exif_fast_path` can in-process, and ask `exiftool` only for the rest.
+    :param cache: If not `None`, only extract fields that aren't cached for unchanged files, and cache what's extracted.
+    :return: 1 dict per file (with `fields` that are present), in the order of `filenames`.
+    """
     metadata_arr = []
+    stat_keys = []
+    fields_to_extract_arr = []
+    pending: typing.Dict[typing.Tuple[str, ...], typing.List[int]] = defaultdict(list)  # Fields left to `exiftool`: File indices
+    for i, filename in enumerate(filenames):
+        if cache:
+            stat_key = metadata_cache.get_stat_key(os.stat(filename))  # Before extracting, so that a file changed meanwhile is extracted again next time.
+            metadata, fields_to_extract = cache.get(filename, stat_key, fields)
+            stat_keys.append(stat_key)
+        else:
+            metadata, fields_to_extract = {EXIFTOOL_FILENAME_KEY: filename}, fields
+
+        metadata_arr.append(metadata)
+        fields_to_extract_arr.append(fields_to_extract)
+
+    # The fast path mostly waits on file reads (cold libraries), so it runs on threads too.
+    if fast_path:
+        with concurrent.futures.ThreadPoolExecutor(pool.workers) as executor:
+            fast_path_results = executor.map(exif_fast_path.read_metadata, filenames, fields_to_extract_arr)
+            unresolved_fields_arr = []
+            for metadata, (resolved_metadata, unresolved_fields) in zip(metadata_arr, fast_path_results):
+                metadata.update(resolved_metadata)
+                unresolved_fields_arr.append(unresolved_fields)
+    else:
+        unresolved_fields_arr = fields_to_extract_arr
+
+    for i, (filename, fields_to_extract, unresolved_fields) in enumerate(zip(filenames, fields_to_extract_arr, unresolved_fields_arr)):
+        if unresolved_fields:
+            pending[tuple(unresolved_fields)].append(i)
+        elif cache and fields_to_extract:
+            cache.put(filename, stat_keys[i], metadata_arr[i], fields_to_extract)
+
+    for unresolved_fields, indices in pending.items():
+        exiftool_metadata = pool.get_metadata([filenames[i] for i in indices], list(unresolved_fields), chunk_size)
+        for i, metadata in zip(indices, exiftool_metadata):
+            metadata_arr[i].update(metadata)
+            if cache:
+                cache.put(filenames[i], stat_keys[i], metadata_arr[i], fields_to_extract_arr[i])
+
+    if cache:
+        cache.commit()
+
+    return metadata_arr
+
+
+def warm_cache(filenames: typing.List[str], pool: ExiftoolPool, cache: metadata_cache.MetadataCache, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Cache all tags of files that aren't cached with all tags yet, so that later runs with any fields don't extract anything.
+
+    :return: Number of files extracted.
+    """
+    todo_filenames = []
+    stat_keys = []
     for filename in filenames:
-        metadata_arr.append(run_exiftool(filename))
-
-    for field in metadata_fields:
-        values = defaultdict(list)
-        for file_metadata in metadata_arr:
-            if field not in file_metadata:
-                values[METADATA_ABSENT_KEY].append(file_metadata[EXIFTOOL_FILENAME_KEY])
-            else:
-                value = file_metadata[field]
-                if isinstance(value, list):  # Some metadata fields are lists (unhashable).
-                    value = str(value)
-                values[value].append(file_metadata[EXIFTOOL_FILENAME_KEY])
-
-        if len(values) != 1:
-            print(f"`{field}` differs among files: {len(values)} values:")
-            for value, f in values.items():
-                print(f"- {value}: {f}")
+        stat_key = metadata_cache.get_stat_key(os.stat(filename))
+        if not cache.is_warm(filename, stat_key):
+            todo_filenames.append(filename)
+            stat_keys.append(stat_key)
+
+    for filename, stat_key, metadata in zip(todo_filenames, stat_keys, pool.get_metadata(todo_filenames, None, chunk_size)):
+        cache.put(filename, stat_key, metadata)
+
+    cache.commit()
+    return len(todo_filenames)
+
+
+# MARK: - Aggregation
+DEFAULT_SAMPLE_SIZE = 10
+DEFAULT_MAX_VALUES = 1000
+OTHER_VALUES_KEY = "(Other values)"
+
+
+class _ValueStats:
+    __slots__ = ("count", "sample")
+
+    def __init__(self):
+        self.count = 0
+        self.sample: typing.List[str] = []
+
+
+class FieldAggregator:
+    """
+    Counts of each value of 1 field, with a bounded sample of filenames per value, optionally per group (e.g. dir).
+
+    Memory is bounded by `max_values` per group (later new values are counted together as `OTHER_VALUES_KEY`) and `sample_size`.
+    """
+
+    def __init__(self, field: str, sample_size: int = DEFAULT_SAMPLE_SIZE, max_values: int = DEFAULT_MAX_VALUES):
+        self.field = field
+        self.sample_size = sample_size
+        self.max_values = max_values
+        self.groups: typing.Dict[str, typing.Dict[typing.Any, _ValueStats]] = defaultdict(dict)  # Group: {Value: Stats}
+
+    def add(self, file_metadata: dict, group: str = ""):
+        if self.field not in file_metadata:
+            value = METADATA_ABSENT_KEY
+        else:
+            value = file_metadata[self.field]
+            if isinstance(value, (list, dict)):  # Some metadata fields are lists (unhashable).
+                value = str(value)
+
+        values = self.groups[group]
+        stats = values.get(value)
+        if stats is None:
+            if len(values) >= self.max_values:
+                value = OTHER_VALUES_KEY
+                stats = values.get(value)
+
+            if stats is None:
+                stats = _ValueStats()
+                values[value] = stats
+
+        stats.count += 1
+        if len(stats.sample) < self.sample_size:
+            stats.sample.append(file_metadata[EXIFTOOL_FILENAME_KEY])
+
+    def print_differences(self):
+        for group, values in self.groups.items():
+            if len(values) == 1:
+                continue
+
+            group_description = f" in `{group}`" if group else ""
+            print(f"`{self.field}` differs among files{group_description}: {len(values)} values:")
+            for value, stats in values.items():
+                more = stats.count - len(stats.sample)
+                more_description = f" and {more} more" if more else ""
+                print(f"- {value} ({stats.count} files): {stats.sample}{more_description}")
             print()
 
 
+def _iter_filenames_in_dir(recursive: bool) -> typing.Iterator[str]:
+    if not recursive:
+        yield from sorted(filename for filename in os.listdir(os.getcwd()) if os.path.isfile(filename))
+        return
+
+    for current_dir, _, file_entries in dir_walker.walk(os.curdir):
+        for entry in file_entries:
+            yield os.path.normpath(os.path.join(current_dir, entry.name))
+
+
+def _iter_batches(iterable: typing.Iterable[str], batch_size: int) -> typing.Iterator[typing.List[str]]:
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+BATCH_CHUNKS_PER_WORKER = 4  # Files are extracted and aggregated in batches of `chunk_size * workers * BATCH_CHUNKS_PER_WORKER`.
+
+
+def main(
+    filenames: list[str] | None,
+    metadata_fields: list[str],
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    fast_path: bool = True,
+    cache_filename: str | None = None,
+    cache_max_size: int | None = None,
+    warm: bool = False,
+    prune_cache: bool = False,
+    recursive: bool = False,
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+    dump_filename: str | None = None,
+    group_by_dir: bool = False,
+):
+    """
+    :param cache_filename: `metadata_cache` file. `None`: No cache.
+    :param warm: If `True`, cache all tags of the files before comparing.
+    :param prune_cache: If `True`, delete cache entries of files that no longer exist.
+    :param recursive: If `True` and `filenames` is empty, scan the working dir recursively.
+    :param sample_size: Filenames listed per value.
+    :param dump_filename: If not `None`, write the compared fields of every file to this NDJSON file.
+    :param group_by_dir: If `True`, compare files within each dir instead of all files.
+    """
+    if filenames:
+        filenames = sorted(filenames)
+    else:
+        print(f"Will scan all files in current dir `{os.getcwd()}`{' recursively' if recursive else ''}\n")
+        filenames = _iter_filenames_in_dir(recursive)
+
+    cache = metadata_cache.MetadataCache(cache_filename) if cache_filename else None
+    aggregators = [FieldAggregator(field, sample_size) for field in metadata_fields]
+    dump_file = open(dump_filename, "w") if dump_filename else None  # Default encoding is UTF-8
+
+    file_count = 0
+    warmed_count = 0
+    with ExiftoolPool(workers) as pool:
+        for batch in _iter_batches(filenames, chunk_size * workers * BATCH_CHUNKS_PER_WORKER):
+            file_count += len(batch)
+
+            # Chunks are spread over the workers, but each worker gets at least 1 full chunk.
+            batch_chunk_size = min(chunk_size, max(-(-len(batch) // workers), 1))
+
+            if warm and cache:
+                warmed_count += warm_cache(batch, pool, cache, batch_chunk_size)
+            if not metadata_fields:
+                continue
+
+            for file_metadata in get_metadata(batch, metadata_fields, pool, batch_chunk_size, fast_path, cache):
+                group = os.path.dirname(file_metadata[EXIFTOOL_FILENAME_KEY]) if group_by_dir else ""
+                for aggregator in aggregators:
+                    aggregator.add(file_metadata, group)
+
+                if dump_file:
+                    dump_file.write(json.dumps({k: file_metadata[k] for k in [EXIFTOOL_FILENAME_KEY] + metadata_fields if k in file_metadata}) + "\n")
+
+    if not file_count:
+        raise ValueError("Empty dir")
+    if warm and cache:
+        print(f"Warmed metadata cache with {warmed_count} files.\n")
+
+    if dump_file:
+        dump_file.close()
+
+    for aggregator in aggregators:
+        aggregator.print_differences()
+
+    if cache:
+        print(cache.get_stats_description())
+        if prune_cache:
+            print(f"Metadata cache: Pruned {cache.prune_missing()} missing files.")
+        if cache_max_size is not None:
+            print(f"Metadata cache: Evicted {cache.evict(cache_max_size)} files.")
+        cache.close()
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-f", "--filenames", nargs="*", help="Files to compare; Empty (default): All files in working dir")
-    parser.add_argument("-m", "--metadata-fields", nargs="+", required=True, help="Metadata fields to compare; List field names with `exiftool -j`")
+    parser.add_argument("-m", "--metadata-fields", nargs="+", default=[], help="Metadata fields to compare; List field names with `exiftool -j`. Required unless `--warm-cache`")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="Persistent `exiftool` processes. Default: `os.cpu_count()` (%(default)s)")
+    parser.add_argument("-c", "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Max files per `exiftool` request. Default: %(default)s")
+    parser.add_argument("--no-fast-path", action="store_true", help="If set, get all fields from `exiftool` instead of reading common ones in-process")
+    parser.add_argument("--cache-file", default=metadata_cache.DEFAULT_CACHE_FILENAME, help="Metadata cache, keyed by path, size, mtime and inode. Default: %(default)s")
+    parser.add_argument("--no-cache", action="store_true", help="If set, don't use the metadata cache")
+    parser.add_argument("--cache-max-size", type=int, default=metadata_cache.DEFAULT_MAX_SIZE, help="Evict least recently used files after the run until the cache holds at most this many bytes of metadata. Default: %(default)s")
+    parser.add_argument("--warm-cache", action="store_true", help="Cache all tags of the files (1 `exiftool` pass), so that later runs with any fields are answered from the cache")
+    parser.add_argument("--prune-cache", action="store_true", help="Delete cache entries of files that no longer exist")
+    parser.add_argument("-r", "--recursive", action="store_true", help="If set and `--filenames` is empty, scan the working dir recursively")
+    parser.add_argument("-s", "--sample-size", type=int, default=DEFAULT_SAMPLE_SIZE, help="Filenames listed per value. Default: %(default)s")
+    parser.add_argument("-d", "--dump", default=None, help="Write the compared fields of every file to this NDJSON file")
+    parser.add_argument("-g", "--group-by-dir", action="store_true", help="If set, compare files within each dir instead of all files")
     args = parser.parse_args()
-    main(args.filenames, args.metadata_fields)
+
+    if (not args.metadata_fields) and (not args.warm_cache):
+        parser.error("`--metadata-fields` is required unless `--warm-cache` is set")
+
+    main(
+        args.filenames,
+        args.metadata_fields,
+        args.workers,
+        args.chunk_size,
+        not args.no_fast_path,
+        None if args.no_cache else args.cache_file,
+        args.cache_max_size,
+        args.warm_cache,
+        args.prune_cache,
+        args.recursive,
+        args.sample_size,
+        args.dump,
+        args.group_by_dir,
+    )
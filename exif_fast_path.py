@@ -0,0 +1,158 @@
+"""
+Read common metadata fields in-process with Pillow, with the same names and values as `exiftool -j`.
+
+Only the EXIF container is read, so a field is resolved here only when `exiftool` can't report a different value:
+
+- Files with other metadata containers that define the same tag names (XMP, IPTC, PNG text chunks, unknown JPEG segments) are left to `exiftool` entirely.
+- Fields absent from EXIF are left to `exiftool` when the file has maker notes (which `exiftool` reads with lower priority than EXIF).
+- Values that `exiftool` may print differently (not plain ASCII, padded, empty or number-like) are left to `exiftool`.
+"""
+
+import os
+import re
+import typing
+
+from PIL import Image
+
+
+SUPPORTED_FORMATS: typing.Final = {"JPEG", "MPO", "PNG", "WEBP", "TIFF"}
+
+_EXIF_IFD_TAG: typing.Final = 0x8769
+_MAKER_NOTE_TAG: typing.Final = 0x927C
+
+# `exiftool` field: (Exif IFD?, tag)
+_STRING_TAGS: typing.Final = {
+    "ImageDescription": (False, 0x010E),
+    "Make": (False, 0x010F),
+    "Model": (False, 0x0110),
+    "Software": (False, 0x0131),
+    "ModifyDate": (False, 0x0132),
+    "Artist": (False, 0x013B),
+    "Copyright": (False, 0x8298),
+    "DateTimeOriginal": (True, 0x9003),
+    "CreateDate": (True, 0x9004),
+}
+
+_SIZE_TAGS: typing.Final = {"ImageWidth": 0x0100, "ImageHeight": 0x0101}
+_ORIENTATION_TAG: typing.Final = 0x0112
+_ORIENTATION_DESCRIPTIONS: typing.Final = {  # `exiftool` print conversion.
+    1: "Horizontal (normal)",
+    2: "Mirror horizontal",
+    3: "Rotate 180",
+    4: "Mirror vertical",
+    5: "Mirror horizontal and rotate 270 CW",
+    6: "Rotate 90 CW",
+    7: "Mirror horizontal and rotate 90 CW",
+    8: "Rotate 270 CW",
+}
+
+SUPPORTED_FIELDS: typing.Final = {"FileName", "ImageWidth", "ImageHeight", "Orientation"} | _STRING_TAGS.keys()
+
+_JPEG_SEGMENT_PREFIXES: typing.Final = {  # JPEG segments without tags named like `SUPPORTED_FIELDS`.
+    "APP0": (b"JFIF\x00", b"JFXX\x00"),
+    "APP1": (b"Exif\x00",),
+    "APP2": (b"ICC_PROFILE\x00", b"MPF\x00"),
+    "APP14": (b"Adobe",),
+}
+_TIFF_OTHER_METADATA_TAGS: typing.Final = {700, 33723, 34377}  # XMP, IPTC, Photoshop.
+
+_NUMBER_PATTERN: typing.Final = re.compile(r"-?(\d|[1-9]\d{1,14})(\.\d{1,16})?(e[-+]?\d{1,3})?", re.IGNORECASE)  # `exiftool -j` prints these unquoted.
+
+
+def _has_other_metadata(image: Image.Image) -> bool:
+    if "xmp" in image.info:
+        return True
+
+    if image.format in ("JPEG", "MPO"):
+        for marker, content in image.applist:
+            prefixes = _JPEG_SEGMENT_PREFIXES.get(marker)
+            if (prefixes is None) or not content.startswith(prefixes):
+                return True
+    elif image.format == "PNG":
+        if image.text:
+            return True
+    elif image.format == "TIFF":
+        if _TIFF_OTHER_METADATA_TAGS & image.tag_v2.keys():
+            return True
+
+    return False
+
+
+def _get_string_value(value) -> str | None:
+    """
+    :return: `None` if `exiftool` may print `value` differently.
+    """
+    if (not isinstance(value, str)) or (not value) or (value != value.strip()):
+        return None
+    if (not value.isascii()) or (not value.isprintable()):
+        return None
+    if _NUMBER_PATTERN.fullmatch(value):
+        return None
+
+    return value
+
+
+def read_metadata(filename: str, fields: typing.Iterable[str]) -> typing.Tuple[dict, typing.List[str]]:
+    """
+    :return: Resolved fields (like an `exiftool -j` dict, with `SourceFile`; resolved absent fields are left out), and fields left to `exiftool`.
+    """
+    fields = list(fields)
+    metadata = {"SourceFile": filename}
+    if not fields:
+        return metadata, fields
+
+    # Any error leaves all fields to `exiftool`: Not an image, over Pillow's pixel limit (`DecompressionBombError`), or malformed EXIF (`ValueError`, `struct.error`, `SyntaxError`, ...).
+    try:
+        image = Image.open(filename)
+    except Exception:
+        return metadata, fields
+
+    with image:
+        try:
+            if (image.format not in SUPPORTED_FORMATS) or _has_other_metadata(image):
+                return metadata, fields
+
+            exif = image.getexif()
+            exif_ifd = exif.get_ifd(_EXIF_IFD_TAG)
+        except Exception:
+            return metadata, fields
+
+        has_maker_notes = _MAKER_NOTE_TAG in exif_ifd
+
+        unresolved = []
+        for field in fields:
+            value = None
+            if field not in SUPPORTED_FIELDS:
+                unresolved.append(field)
+                continue
+            elif field == "FileName":
+                value = os.path.basename(filename)
+            elif field in ("ImageWidth", "ImageHeight"):
+                value = image.width if (field == "ImageWidth") else image.height
+                if exif.get(_SIZE_TAGS[field], value) != value:
+                    unresolved.append(field)  # Which one `exiftool` prints is unclear.
+                    continue
+            elif (field == "ModifyDate") and (image.format == "PNG"):
+                unresolved.append(field)  # `exiftool` also reads it from the `tIME` chunk, which Pillow skips.
+                continue
+            elif field == "Orientation":
+                if _ORIENTATION_TAG in exif:
+                    value = _ORIENTATION_DESCRIPTIONS.get(exif[_ORIENTATION_TAG])
+                    if value is None:
+                        unresolved.append(field)
+                        continue
+            else:
+                in_exif_ifd, tag = _STRING_TAGS[field]
+                ifd = exif_ifd if in_exif_ifd else exif
+                if tag in ifd:
+                    value = _get_string_value(ifd[tag])
+                    if value is None:
+                        unresolved.append(field)
+                        continue
+
+            if value is not None:
+                metadata[field] = value
+            elif has_maker_notes:
+                unresolved.append(field)  # May be in the maker notes.
+
+    return metadata, unresolved
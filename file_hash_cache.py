@@ -0,0 +1,147 @@
+"""
+Persistent file hash cache backed by SQLite.
+
+Digests are keyed by `(st_dev, st_ino, size, mtime_ns)` so that unchanged files are not hashed again.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+
+DEFAULT_CACHE_FILENAME: typing.Final = os.path.join(os.path.expanduser("~"), ".cache", "file_hash_cache.sqlite3")
+
+StatKey = typing.Tuple[int, int, int, int]  # (st_dev, st_ino, size, mtime_ns)
+
+# Recorded digests are committed after this many records or seconds, so that an interrupted run keeps most of its work.
+COMMIT_INTERVAL_RECORDS: typing.Final = 1000
+COMMIT_INTERVAL_SECONDS: typing.Final = 10
+
+
+def get_stat_key(stat_result: os.stat_result) -> StatKey:
+    return (stat_result.st_dev, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+
+
+class FileHashCache:
+    """
+    Only the main process writes to the cache.
+    Workers open their own read-only connections with `open_reader`.
+
+    Use as a context manager (or call `close`), so that the last records are committed even if the run fails.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+        dir_name = os.path.dirname(os.path.abspath(filename))
+        os.makedirs(dir_name, exist_ok=True)
+
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS file_hashes ("
+            "dev INTEGER NOT NULL, ino INTEGER NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "algorithm TEXT NOT NULL, digest TEXT NOT NULL, last_seen INTEGER NOT NULL, "
+            "PRIMARY KEY (dev, ino, size, mtime_ns, algorithm))"
+        )
+        self.connection.commit()
+
+        # Entries recorded in this run get this timestamp. Everything older is stale when pruning.
+        self.run_started = time.time_ns()
+
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+
+        self._uncommitted_count = 0
+        self._last_commit_time = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def commit(self):
+        self.connection.commit()
+        self._uncommitted_count = 0
+        self._last_commit_time = time.monotonic()
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def get(self, key: StatKey, algorithm: str) -> str | None:
+        return _lookup(self.connection, key, algorithm)
+
+    def record(self, key: StatKey, algorithm: str, digest: str, hit: bool):
+        """
+        Store `digest` and mark the entry as seen in this run.
+
+        :param hit: Whether `digest` was read from the cache (only used for stats).
+        """
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (*key, algorithm, digest, self.run_started),
+        )
+
+        self._uncommitted_count += 1
+        if (self._uncommitted_count >= COMMIT_INTERVAL_RECORDS) or (time.monotonic() - self._last_commit_time >= COMMIT_INTERVAL_SECONDS):
+            self.commit()
+
+    def prune(self) -> int:
+        """
+        Delete entries that were not seen in this run.
+
+        Only call this if this run covered every tree that uses this cache file.
+
+        :return: Number of deleted entries.
+        """
+        cursor = self.connection.execute("DELETE FROM file_hashes WHERE last_seen < ?", (self.run_started,))
+        self.commit()
+        self.pruned += cursor.rowcount
+        return cursor.rowcount
+
+    def get_stats_description(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total else 0
+        return f"Hash cache `{self.filename}`: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), {self.pruned} stale entries pruned."
+
+
+# MARK: - Readers
+_thread_local = threading.local()  # SQLite connections can't be shared between threads.
+
+
+def open_reader(filename: str) -> sqlite3.Connection:
+    """
+    Get a read-only connection for the current thread.
+    Connections are reused across calls.
+    """
+    if not hasattr(_thread_local, "connections"):
+        _thread_local.connections = {}
+
+    connection = _thread_local.connections.get(filename)
+    if connection is None:
+        connection = sqlite3.connect(f"file:{filename}?mode=ro", uri=True)
+        _thread_local.connections[filename] = connection
+
+    return connection
+
+
+def _lookup(connection: sqlite3.Connection, key: StatKey, algorithm: str) -> str | None:
+    row = connection.execute(
+        "SELECT digest FROM file_hashes WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ? AND algorithm = ?",
+        (*key, algorithm),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def lookup(filename: str, key: StatKey, algorithm: str) -> str | None:
+    return _lookup(open_reader(filename), key, algorithm)
@@ -0,0 +1,90 @@
+"""
+Registry of lossless Pillow encoders, and "smallest of N" encoding.
+"""
+
+import concurrent.futures
+import io
+import typing
+
+from PIL import Image
+
+
+class Encoder(typing.NamedTuple):
+    name: str
+    extension: str
+    format: str  # Pillow format name.
+    save_parameters: typing.Dict[str, typing.Any]
+
+    def encode(self, image: Image.Image, save_parameters: typing.Dict[str, typing.Any] | None = None) -> bytes:
+        buffer = io.BytesIO()
+        image.save(buffer, format=self.format, **(save_parameters or self.save_parameters))
+        return buffer.getvalue()
+
+
+ENCODERS: typing.Final = {e.name: e for e in (
+    Encoder("webp", ".webp", "WEBP", {"lossless": True, "quality": 100, "method": 6}),
+    Encoder("webp_fast", ".webp", "WEBP", {"lossless": True, "quality": 100, "method": 4}),
+    Encoder("webp_exact", ".webp", "WEBP", {"lossless": True, "quality": 100, "method": 6, "exact": True}),  # Keeps RGB values under transparent pixels.
+    Encoder("png", ".png", "PNG", {"optimize": True}),
+    Encoder("png_max", ".png", "PNG", {"compress_level": 9}),
+    Encoder("tiff_deflate", ".tiff", "TIFF", {"compression": "tiff_adobe_deflate"}),
+    Encoder("tiff_lzw", ".tiff", "TIFF", {"compression": "tiff_lzw"}),
+)}
+
+DEFAULT_ENCODER_NAMES: typing.Final = {
+    ".webp": "webp",
+    ".png": "png",
+    ".tiff": "tiff_deflate",
+    ".tif": "tiff_deflate",
+}
+
+
+def get_encoders(dest_extension: str, encoder_names: typing.Iterable[str] | None = None) -> typing.List[Encoder]:
+    """
+    :param encoder_names: Candidate encoders. `None`: The default encoder of `dest_extension`.
+    :raise ValueError: No encoder for `dest_extension`, unknown encoder name, or an encoder that doesn't produce `dest_extension`.
+    """
+    dest_extension = dest_extension.lower()
+    if dest_extension == ".tif":
+        dest_extension = ".tiff"
+
+    if encoder_names is None:
+        if dest_extension not in DEFAULT_ENCODER_NAMES:
+            raise ValueError(f"Unsupported extension `{dest_extension}`. Supported: {', '.join(DEFAULT_ENCODER_NAMES)}.")
+        encoder_names = [DEFAULT_ENCODER_NAMES[dest_extension]]
+
+    encoders = []
+    for name in encoder_names:
+        if name not in ENCODERS:
+            raise ValueError(f"Unknown encoder `{name}`. Available: {', '.join(ENCODERS)}.")
+
+        encoder = ENCODERS[name]
+        if encoder.extension != dest_extension:
+            raise ValueError(f"Encoder `{name}` writes `{encoder.extension}`, not `{dest_extension}`.")
+        encoders.append(encoder)
+
+    return encoders
+
+
+def encode_smallest(image: Image.Image, candidates: typing.List[typing.Tuple[Encoder, typing.Dict[str, typing.Any]]], threads: int = 1) -> typing.Tuple[Encoder, bytes]:
+    """
+    Encode with every candidate and keep the smallest output. Ties go to the earlier candidate.
+
+    :param candidates: `(encoder, save parameters)` pairs.
+    :param threads: Candidates encoded concurrently. Pillow releases the GIL while encoding.
+    """
+    if (threads <= 1) or (len(candidates) == 1):
+        outputs = [encoder.encode(image, parameters) for encoder, parameters in candidates]
+    else:
+        image.load()
+
+        def encode(candidate):
+            # `Image.save` stores per-call state on the image object, so every thread encodes its own copy.
+            encoder, parameters = candidate
+            return encoder.encode(image.copy(), parameters)
+
+        with concurrent.futures.ThreadPoolExecutor(min(threads, len(candidates))) as executor:
+            outputs = list(executor.map(encode, candidates))
+
+    best_index = min(range(len(outputs)), key=lambda i: len(outputs[i]))
+    return candidates[best_index][0], outputs[best_index]
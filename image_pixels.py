@@ -0,0 +1,95 @@
+"""
+Pixel-level helpers for lossless conversion: fast equality and content hashes of decoded images.
+"""
+
+import hashlib
+import typing
+
+from PIL import Image
+
+
+STRIP_HEIGHT = 256  # Rows compared at a time. Bounds the extra memory of mode conversion and `tobytes`.
+
+# Modes that convert to RGB(A) without loss, so images in 2 of these modes can still be compared.
+_RGBA_EXACT_MODES: typing.Final = {"1", "L", "LA", "P", "PA", "RGB", "RGBA"}
+
+
+def _has_alpha(image: Image.Image) -> bool:
+    return ("A" in image.getbands()) or ("transparency" in image.info)
+
+
+def _get_comparison_mode(a: Image.Image, b: Image.Image) -> str | None:
+    """
+    :return: `None` if the images can't be compared without loss.
+    """
+    if (a.mode == b.mode) and (a.mode not in ("P", "PA")):  # Palette indices are only comparable with the same palette.
+        return a.mode
+
+    if (a.mode not in _RGBA_EXACT_MODES) or (b.mode not in _RGBA_EXACT_MODES):
+        return None
+
+    return "RGBA" if (_has_alpha(a) or _has_alpha(b)) else "RGB"
+
+
+def _strips_equal_ignoring_transparent_color(a: Image.Image, b: Image.Image) -> bool:
+    """
+    :param a: RGBA.
+    :param b: RGBA.
+    """
+    alpha = a.getchannel("A")
+    if alpha.tobytes() != b.getchannel("A").tobytes():
+        return False
+
+    mask = alpha.point(lambda v: 255 if v else 0)
+    transparent = Image.new("RGBA", a.size, 0)
+    return Image.composite(a, transparent, mask).tobytes() == Image.composite(b, transparent, mask).tobytes()
+
+
+def images_equal(a: Image.Image, b: Image.Image, ignore_transparent_color: bool = True) -> bool:
+    """
+    Compare decoded pixels strip by strip and stop at the first differing strip.
+
+    :param ignore_transparent_color: Fully transparent pixels are equal regardless of their color. libwebp (without `exact`) doesn't keep those colors.
+    """
+    if a.size != b.size:
+        return False
+
+    mode = _get_comparison_mode(a, b)
+    if mode is None:
+        return False
+
+    width, height = a.size
+    for top in range(0, height, STRIP_HEIGHT):
+        box = (0, top, width, min(top + STRIP_HEIGHT, height))
+        strip_a = a.crop(box)
+        strip_b = b.crop(box)
+        if strip_a.mode != mode:
+            strip_a = strip_a.convert(mode)
+        if strip_b.mode != mode:
+            strip_b = strip_b.convert(mode)
+
+        if strip_a.tobytes() == strip_b.tobytes():
+            continue
+
+        if ignore_transparent_color and (mode == "RGBA") and _strips_equal_ignoring_transparent_color(strip_a, strip_b):
+            continue
+
+        return False
+
+    return True
+
+
+def get_pixel_hash(image: Image.Image) -> str:
+    """
+    SHA256 of the decoded pixels, mode and size (and palette). Independent of the container and metadata.
+    """
+    hasher = hashlib.sha256(f"{image.mode}\n{image.width}x{image.height}\n".encode("utf-8"))
+    if image.mode in ("P", "PA"):
+        hasher.update(bytes(image.getpalette() or []))
+        hasher.update(repr(image.info.get("transparency")).encode("utf-8"))
+
+    width, height = image.size
+    for top in range(0, height, STRIP_HEIGHT):
+        hasher.update(image.crop((0, top, width, min(top + STRIP_HEIGHT, height))).tobytes())
+
+    return hasher.hexdigest()
@@ -5,21 +5,19 @@ https://docs.python.org/3/library/os.html#os.walk
 import argparse
 import os
 
+import dir_walker
+
 
 def list_files(start_path: str):
-    for root_path, dir_names, filenames in os.walk(start_path):
+    # `dir_walker.walk` yields dir and file entries in sorted order, like `os.walk` with sorted `dir_names` and `filenames`.
+    for root_path, _, file_entries in dir_walker.walk(start_path):
         level = root_path.replace(start_path, "").count(os.sep)
         indent = ' ' * 2 * (level)
         print(f"{indent}{os.path.basename(root_path)}/")
 
-        # Sort the dir names here to modify sub-directory walking order.
-        # This feature is documented.
-        dir_names.sort()
-
-        filenames.sort()
         sub_indent = " " * 2 * (level + 1)
-        for f in filenames:
-            print(f"{sub_indent}{f}")
+        for entry in file_entries:
+            print(f"{sub_indent}{entry.name}")
 
 
 # MARK: Main
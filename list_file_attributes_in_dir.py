@@ -1,11 +1,21 @@
 import argparse
+import contextlib
 import csv
 import enum
+import itertools
 import multiprocessing
+import multiprocessing.pool
 import os
+import stat
+import struct
+import tempfile
 import typing
-from collections import defaultdict
+from collections import deque
 
+import binary_manifest
+import dir_walker
+import duplicate_finder
+import file_hash_cache
 import sha_hash
 
 # def _calculate_file_sizes_recursively(start_path: str) -> int:
@@ -54,27 +64,44 @@ def get_all_file_and_dir_names(
     :param path_format:
     :return:
     """
+    return list(iter_all_file_and_dir_names(start_path, path_format=path_format))
+
+
+def iter_all_file_and_dir_names(
+    start_path: str, path_format=PathFormat.UNMODIFIED
+) -> typing.Iterator[str]:
+    """
+    Lazy version of `get_all_file_and_dir_names`. Yields names in the same order.
+
+    `path_format` is applied (and the working directory changed) immediately, not on the first `next`.
+    """
+    start_path = _apply_path_format(start_path, path_format)
+    return _walk_file_and_dir_names(start_path)
+
+
+def _apply_path_format(start_path: str, path_format: PathFormat) -> str:
+    """
+    :return: `start_path` in `path_format`. May change the working directory if `path_format` is `RELATIVE`.
+    """
     if path_format == PathFormat.ABSOLUTE:
         start_path = os.path.abspath(start_path)
     elif path_format == PathFormat.RELATIVE:
         os.chdir(os.path.dirname(os.path.abspath(start_path)))
         start_path = os.path.basename(start_path)
 
-    return_value = []
+    return start_path
+
 
-    for root_path, dir_names, filenames in os.walk(start_path):
+def _walk_file_and_dir_names(start_path: str) -> typing.Iterator[str]:
+    # `dir_walker` gets dir/file types from the dir listing, so walking doesn't `stat` anything.
+    for root_path, _, file_entries in dir_walker.walk(start_path):
         if not root_path.endswith(os.sep):
             root_path += os.sep
 
-        return_value.append(root_path)
-
-        dir_names.sort()
-        filenames.sort()
+        yield root_path
 
-        abs_filenames = [os.path.join(root_path, f) for f in filenames]
-        return_value += abs_filenames
-
-    return return_value
+        for entry in file_entries:
+            yield os.path.join(root_path, entry.name)
 
 
 # MARK: - Attributes
@@ -87,12 +114,12 @@ class AttributeKeys:
     ALL_KEYS = {SIZE, SHA_256_HASH}
 
 
-HASH_FILE_SIZE_THRESHOLD = 65536
-
-
 def _calculate_file_attributes_worker(
-    filename: str, attribute_keys: typing.List[str]
-) -> typing.Dict[str, typing.Any]:
+    filename: str, attribute_keys: typing.List[str], cache_filename: str | None = None
+) -> typing.Tuple[
+    typing.Dict[str, typing.Any],
+    typing.Optional[typing.Tuple[file_hash_cache.StatKey, str, bool]],
+]:
     """
     Calculate file attributes.
 
@@ -100,86 +127,193 @@ def _calculate_file_attributes_worker(
 
     :param filename:
     :param attribute_keys: A list of `AttributeKeys` constants specifying the attributes to calculate.
-    :return:
+    :param cache_filename: If not `None`, reuse digests from this `file_hash_cache` file.
+    :return: The attribute dict, and a `(stat key, digest, cache hit)` tuple for the main process to record in the cache (`None` if there is nothing to record).
     """
     return_value = {AttributeKeys.FILENAME: filename}
+    cache_entry = None
 
-    if not os.path.isfile(filename):
+    if filename.endswith(os.sep):
         # This is a folder.
         # Return an empty dict because we can only calculate its info after calculating its files.
         # raise ValueError(f"`{filename}` is not a file!")
-        return return_value
+        return return_value, cache_entry
 
-    # Calculate size.
-    # This is also the prerequisite for has functions.
-    if (AttributeKeys.SIZE in attribute_keys) or (
-        AttributeKeys.SHA_256_HASH in attribute_keys
-    ):
-        file_size = os.path.getsize(filename)
+    # The only `stat` call on this file. Type, size and cache key all come from it.
+    try:
+        stat_result = os.stat(filename)
+    except OSError:
+        # Broken symlinks, files removed since they were listed, etc.
+        return return_value, cache_entry
+
+    if not stat.S_ISREG(stat_result.st_mode):
+        # Sockets, FIFOs, etc.
+        return return_value, cache_entry
 
     # Size.
     if AttributeKeys.SIZE in attribute_keys:
-        return_value[AttributeKeys.SIZE] = file_size
+        return_value[AttributeKeys.SIZE] = stat_result.st_size
 
     # Hash.
     if AttributeKeys.SHA_256_HASH in attribute_keys:
-        if file_size > HASH_FILE_SIZE_THRESHOLD:
-            return_value[
-                AttributeKeys.SHA_256_HASH
-            ] = sha_hash.get_sha_hash_of_big_file(
-                filename, sha_hash.HashAlgorithm.SHA256
-            )
-        else:
-            return_value[AttributeKeys.SHA_256_HASH] = sha_hash.get_sha_hash_of_file(
-                filename, sha_hash.HashAlgorithm.SHA256
+        digest = None
+        if cache_filename:
+            stat_key = file_hash_cache.get_stat_key(stat_result)
+            digest = file_hash_cache.lookup(
+                cache_filename, stat_key, AttributeKeys.SHA_256_HASH
             )
+            cache_hit = digest is not None
 
-    return return_value
+        if digest is None:
+            # `sha_hash` picks whole-file/`readinto`/`mmap` reads from the file size.
+            digest = sha_hash.get_sha_hashes_of_file_adaptive(
+                filename, [sha_hash.HashAlgorithm.SHA256]
+            )[sha_hash.HashAlgorithm.SHA256]
 
+        return_value[AttributeKeys.SHA_256_HASH] = digest
+        if cache_filename:
+            cache_entry = (stat_key, digest, cache_hit)
 
-def _calculate_dir_attributes(
-    attribute_dicts: typing.List[typing.Dict[str, typing.Any]],
-    attribute_keys: typing.List[str],
-):
+    return return_value, cache_entry
+
+
+class _DirSizeRollup:
+    """
+    Add up the size of files in directories while rows stream by in `iter_all_file_and_dir_names` order.
+
+    Only the chain of ancestor dirs of the current row is kept in memory, so memory scales with tree depth.
+    A dir's size is final once a row outside of it arrives; it's then passed to `on_dir_finished`.
     """
-    Select directories from `attribute_dicts` and update their attributes according to the files they contain.
 
-    Currently, this function simply adds up the size of files in directories.
+    def __init__(self, on_dir_finished: typing.Callable[[int, int], None]):
+        """
+        :param on_dir_finished: Called with `(dir index, dir size)`. Dir indices count dirs in the order they appeared.
+        """
+        self.on_dir_finished = on_dir_finished
+
+        self._stack: typing.List[typing.List[typing.Any]] = []  # [dir name, dir index, size]
+        self._dir_count = 0
+
+    def _pop_until_ancestor_of(self, filename: str):
+        while self._stack and not filename.startswith(self._stack[-1][0]):
+            self._pop()
+
+    def _pop(self):
+        _, dir_index, size = self._stack.pop()
+        self.on_dir_finished(dir_index, size)
+        if self._stack:
+            self._stack[-1][2] += size
+
+    def add_dir(self, dir_name: str) -> int:
+        """
+        :param dir_name: Must end with `os.sep`.
+        :return: Index of this dir.
+        """
+        self._pop_until_ancestor_of(dir_name)
+
+        dir_index = self._dir_count
+        self._dir_count += 1
+        self._stack.append([dir_name, dir_index, 0])
+        return dir_index
+
+    def add_file(self, filename: str, size: int):
+        self._pop_until_ancestor_of(filename)
+        if self._stack:
+            self._stack[-1][2] += size
+
+    def finish(self):
+        while self._stack:
+            self._pop()
+
+
+# MARK: - Executors
+class Executor(enum.Enum):
+    THREAD = "thread"  # `hashlib` releases the GIL while hashing large buffers.
+    PROCESS = "process"
+    SERIAL = "serial"
 
-    :param attribute_dicts:
-    :param attribute_keys:
-    :return: None
+
+_worker_attribute_keys: typing.List[str] = []
+_worker_cache_filename: str | None = None
+
+
+def _init_worker(attribute_keys: typing.List[str], cache_filename: str | None):
     """
-    if AttributeKeys.SIZE in attribute_keys:
-        size_cache = defaultdict(int)
+    Pool initializer. Shared arguments are sent once per worker instead of once per file.
+    """
+    global _worker_attribute_keys, _worker_cache_filename
+    _worker_attribute_keys = attribute_keys
+    _worker_cache_filename = cache_filename
 
-        # Iterate in reversed order because sub-directories/files always appear after parents.
-        for d in reversed(attribute_dicts):
-            filename: str = d[AttributeKeys.FILENAME]
-            if filename.endswith(os.sep):
-                # This is a dir.
-                if filename[:-1] in size_cache:
-                    # `size_cache` entries don't have the ending `os.sep`.
-                    d[AttributeKeys.SIZE] = size_cache[filename[:-1]]
-                    del size_cache[filename[:-1]]
-                elif filename in size_cache:
-                    # Just in case. Should never get executed.
-                    d[AttributeKeys.SIZE] = size_cache[filename]
-                    del size_cache[filename]
-                else:
-                    # Empty dir.
-                    d[AttributeKeys.SIZE] = 0
-
-                parent_dir = os.path.dirname(
-                    filename[:-1]
-                )  # We must remove the final `os.sep`. Otherwise, `parent_dir` will be the dir as `filename`.
 
-            else:
-                # This is a file.
-                parent_dir = os.path.dirname(filename)
+def _calculate_file_attributes_task(filename: str):
+    return _calculate_file_attributes_worker(
+        filename, _worker_attribute_keys, _worker_cache_filename
+    )
+
+
+def _open_pool(executor: Executor, processes: int, **kwargs):
+    """
+    :return: A thread or process pool, or `contextlib.nullcontext()` (which gives `None`) for serial execution.
+    """
+    if (executor is Executor.SERIAL) or (processes <= 1):
+        return contextlib.nullcontext()
+    elif executor is Executor.THREAD:
+        return multiprocessing.pool.ThreadPool(processes=processes, **kwargs)
+    else:
+        return multiprocessing.Pool(processes=processes, **kwargs)
+
+
+IMAP_CHUNKSIZE = 64
+MAX_PENDING_CHUNKS_PER_WORKER = 4
+
 
-            # Add current size to parent's size in `size_cache`.
-            size_cache[parent_dir] += d[AttributeKeys.SIZE]
+def _calculate_file_attributes_chunk(filenames: typing.List[str]):
+    return [_calculate_file_attributes_task(filename) for filename in filenames]
+
+
+def _map_file_attributes(
+    filenames: typing.Iterable[str],
+    attribute_keys: typing.List[str],
+    cache_filename: str | None,
+    executor: Executor,
+    processes: int,
+) -> typing.Iterator[typing.Tuple[typing.Dict[str, typing.Any], typing.Any]]:
+    """
+    Yield `_calculate_file_attributes_worker` results in the order of `filenames`, as soon as they are available.
+
+    Unlike `Pool.imap`, at most `MAX_PENDING_CHUNKS_PER_WORKER` chunks per worker are in flight, so neither `filenames` nor the results pile up in memory.
+    """
+    if (executor is Executor.SERIAL) or (processes <= 1):
+        for filename in filenames:
+            yield _calculate_file_attributes_worker(
+                filename, attribute_keys, cache_filename
+            )
+        return
+
+    with _open_pool(
+        executor,
+        processes,
+        initializer=_init_worker,
+        initargs=(attribute_keys, cache_filename),
+    ) as pool:
+        pending = deque()
+        filenames = iter(filenames)
+
+        while True:
+            chunk = list(itertools.islice(filenames, IMAP_CHUNKSIZE))
+            if chunk:
+                pending.append(
+                    pool.apply_async(_calculate_file_attributes_chunk, (chunk,))
+                )
+
+            if pending and (
+                (not chunk)
+                or (len(pending) >= processes * MAX_PENDING_CHUNKS_PER_WORKER)
+            ):
+                yield from pending.popleft().get()
+            elif not chunk:
+                break
 
 
 # MARK: - CSV
@@ -196,14 +330,137 @@ def write_attribute_dicts_to_csv(
         writer.writerows(attribute_dicts)
 
 
+def write_attribute_dicts_to_csv_streaming(
+    attribute_dicts: typing.Iterable[typing.Dict[str, typing.Any]],
+    attribute_keys: typing.List[str],
+    csv_filename: str,
+):
+    """
+    Write `attribute_dicts` as they arrive and fill in dir sizes on the fly.
+
+    `attribute_dicts` must be in `iter_all_file_and_dir_names` order.
+    Dir rows come before their contents, so their sizes aren't known when they are written.
+    Rows are first written to a spool file, and finished dir sizes to a fixed-width side file indexed by dir index.
+    Then the spool is copied to `csv_filename` with the dir sizes filled in.
+    Memory scales with tree depth instead of file count.
+    """
+    if AttributeKeys.SIZE not in attribute_keys:
+        write_attribute_dicts_to_csv(attribute_dicts, attribute_keys, csv_filename)
+        return
+
+    fieldnames = [AttributeKeys.FILENAME] + attribute_keys
+    size_column = fieldnames.index(AttributeKeys.SIZE)
+    size_record = struct.Struct("<q")
+
+    with tempfile.TemporaryFile("w+", newline="") as spool_file, tempfile.TemporaryFile() as dir_sizes_file:
+        # 1. Spool rows and record dir sizes.
+        def on_dir_finished(dir_index: int, size: int):
+            dir_sizes_file.seek(dir_index * size_record.size)
+            dir_sizes_file.write(size_record.pack(size))
+
+        rollup = _DirSizeRollup(on_dir_finished)
+        spool_writer = csv.DictWriter(spool_file, fieldnames)
+
+        for d in attribute_dicts:
+            filename: str = d[AttributeKeys.FILENAME]
+            if filename.endswith(os.sep):
+                rollup.add_dir(filename)
+            else:
+                rollup.add_file(filename, d.get(AttributeKeys.SIZE, 0))
+
+            spool_writer.writerow(d)
+
+        rollup.finish()
+
+        # 2. Copy the spool with dir sizes. Dirs are read back in index order, so both files are read sequentially.
+        spool_file.seek(0)
+        dir_sizes_file.seek(0)
+
+        with open(csv_filename, "w") as f:  # Default encoding is UTF-8
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+
+            for row in csv.reader(spool_file):
+                if row[0].endswith(os.sep):
+                    (row[size_column],) = size_record.unpack(
+                        dir_sizes_file.read(size_record.size)
+                    )
+                writer.writerow(row)
+
+
+# MARK: - Binary
+def write_attribute_dicts_to_binary_streaming(
+    attribute_dicts: typing.Iterable[typing.Dict[str, typing.Any]],
+    attribute_keys: typing.List[str],
+    binary_filename: str,
+):
+    """
+    Like `write_attribute_dicts_to_csv_streaming`, but writes a `binary_manifest` file.
+    Dir sizes are patched in place once known, so no spool file is needed.
+    """
+    with binary_manifest.BinaryManifestWriter(
+        binary_filename, attribute_keys
+    ) as writer:
+        open_dir_offsets = {}  # Dir index -> record offset. Only ancestors of the current row.
+
+        def on_dir_finished(dir_index: int, size: int):
+            writer.patch_size(open_dir_offsets.pop(dir_index), size)
+
+        rollup = _DirSizeRollup(on_dir_finished)
+
+        for d in attribute_dicts:
+            filename: str = d[AttributeKeys.FILENAME]
+            size = d.get(AttributeKeys.SIZE)
+            if filename.endswith(os.sep):
+                dir_index = rollup.add_dir(filename)
+                open_dir_offsets[dir_index] = writer.add_row(filename)
+            else:
+                rollup.add_file(filename, size or 0)
+                writer.add_row(filename, size, d.get(AttributeKeys.SHA_256_HASH))
+
+        rollup.finish()
+
+
+class OutputFormat(enum.Enum):
+    CSV = "csv"
+    BINARY = "binary"  # See `binary_manifest`.
+
+
 # MARK: - Main
+def _open_cache(cache_filename: str | None) -> typing.ContextManager[file_hash_cache.FileHashCache | None]:
+    """
+    The cache is closed (and committed) even if the run fails, so that digests computed so far are kept.
+    """
+    if cache_filename:
+        return file_hash_cache.FileHashCache(cache_filename)
+    else:
+        return contextlib.nullcontext()
+
+
 def main(
     start_path: str,
     attribute_keys: typing.List[str],
     csv_filename: str,
     processes: int,
     path_format: PathFormat,
+    cache_filename: str | None = None,
+    prune_cache: bool = False,
+    executor: Executor = Executor.THREAD,
+    find_duplicates: bool = False,
+    output_format: OutputFormat = OutputFormat.CSV,
 ):
+    if find_duplicates:
+        main_find_duplicates(
+            start_path,
+            csv_filename,
+            processes,
+            path_format,
+            cache_filename,
+            prune_cache,
+            executor,
+        )
+        return
+
     # 1. Verify parameters.
     if not attribute_keys:
         print(f"No designated attribute keys. Nothing to do.")
@@ -221,38 +478,86 @@ def main(
     csv_filename = os.path.abspath(
         csv_filename
     )  # The `get_all_file_and_dir_names` may change the working directory if `path_format` is `RELATIVE`.
+    if cache_filename:
+        cache_filename = os.path.abspath(cache_filename)
     if os.path.exists(csv_filename):
         raise FileExistsError(f"CSV file `{csv_filename}` exists!")
 
-    # 2. Get file and dir names.
-    file_and_dir_names = get_all_file_and_dir_names(start_path, path_format=path_format)
-    # for f in file_and_dir_names:
-    #     print(f)
+    # 2. Get file and dir names lazily.
+    file_and_dir_names = iter_all_file_and_dir_names(start_path, path_format=path_format)
 
     # 3. Calculate file attributes.
-    if processes > 1:
-        with multiprocessing.Pool(processes=processes) as pool:
-            attribute_dicts = pool.starmap(
-                _calculate_file_attributes_worker,
-                [(filename, attribute_keys) for filename in file_and_dir_names],
+    use_cache = bool(cache_filename) and (AttributeKeys.SHA_256_HASH in attribute_keys)
+    with _open_cache(cache_filename if use_cache else None) as cache:
+        results = _map_file_attributes(
+            file_and_dir_names,
+            attribute_keys,
+            cache_filename if cache else None,
+            executor,
+            processes,
+        )
+
+        def record_cache_entries():
+            for attribute_dict, cache_entry in results:  # Results stream in (in order) as workers finish them.
+                if cache_entry:
+                    stat_key, digest, cache_hit = cache_entry
+                    cache.record(stat_key, AttributeKeys.SHA_256_HASH, digest, cache_hit)
+
+                yield attribute_dict
+
+        # 4. Calculate dir attributes and save to csv, while file attributes stream in.
+        if output_format is OutputFormat.BINARY:
+            write_attribute_dicts_to_binary_streaming(
+                record_cache_entries(), attribute_keys, csv_filename
             )
-    else:
-        attribute_dicts = [
-            _calculate_file_attributes_worker(filename, attribute_keys)
-            for filename in file_and_dir_names
-        ]
+        else:
+            write_attribute_dicts_to_csv_streaming(
+                record_cache_entries(), attribute_keys, csv_filename
+            )
+
+        if cache:
+            if prune_cache:
+                cache.prune()
+            print(cache.get_stats_description())
+
+
+def main_find_duplicates(
+    start_path: str,
+    csv_filename: str,
+    processes: int,
+    path_format: PathFormat,
+    cache_filename: str | None = None,
+    prune_cache: bool = False,
+    executor: Executor = Executor.THREAD,
+):
+    """
+    Write duplicate file groups to `csv_filename` instead of per-file attributes. See `duplicate_finder`.
+    """
+    csv_filename = os.path.abspath(csv_filename)
+    if cache_filename:
+        cache_filename = os.path.abspath(cache_filename)
+    if os.path.exists(csv_filename):
+        raise FileExistsError(f"CSV file `{csv_filename}` exists!")
 
-    # for d in attribute_dicts:
-    #     print(d)
+    start_path = _apply_path_format(start_path, path_format)
 
-    # 4. Calculate dir attributes.
-    _calculate_dir_attributes(attribute_dicts, attribute_keys)
+    stats = duplicate_finder.DuplicateStats()
 
-    # for d in attribute_dicts:
-    #     print(d)
+    with _open_cache(cache_filename) as cache:
+        with _open_pool(executor, processes) as pool:
+            groups = duplicate_finder.find_duplicates(start_path, pool, cache, stats)
 
-    # 5. Save to csv.
-    write_attribute_dicts_to_csv(attribute_dicts, attribute_keys, csv_filename)
+        duplicate_finder.write_duplicate_groups_to_csv(groups, csv_filename)
+
+        print(stats.get_description())
+        print(
+            f"{len(groups)} duplicate groups; {sum(g.wasted_bytes for g in groups)} bytes wasted."
+        )
+
+        if cache:
+            if prune_cache:
+                cache.prune()
+            print(cache.get_stats_description())
 
 
 if __name__ == "__main__":
@@ -284,7 +589,15 @@ if __name__ == "__main__":
         "-p",
         type=int,
         default=1,
-        help="`multiprocessing` process count. By default this script does not use multiple processes, which is sufficient for most cases.",
+        help="Worker count. By default this script does not use multiple workers, which is sufficient for most cases.",
+    )
+    parser.add_argument(
+        "--executor",
+        "-e",
+        type=str,
+        choices=[e.value for e in Executor],
+        default=Executor.THREAD.value,
+        help="How to run workers when `--processes` > 1. Threads have the lowest overhead because `hashlib` releases the GIL. (default: %(default)s)",
     )
     parser.add_argument(
         "--path_format",
@@ -293,6 +606,36 @@ if __name__ == "__main__":
         default=PathFormat.UNMODIFIED.value,
         help=f"File/dir name format in the output file. Possible values: {PathFormat.UNMODIFIED.value}, {PathFormat.ABSOLUTE.value}, {PathFormat.RELATIVE.value}. (default: %(default)s)",
     )
+    parser.add_argument(
+        "--cache_filename",
+        type=str,
+        default=file_hash_cache.DEFAULT_CACHE_FILENAME,
+        help="SQLite file caching SHA256 digests by (device, inode, size, mtime). Unchanged files are not hashed again. (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="If set, don't read or write the hash cache.",
+    )
+    parser.add_argument(
+        "--prune_cache",
+        action="store_true",
+        help="If set, delete cache entries that were not seen in this run. Only use this if the cache file isn't shared with other trees.",
+    )
+    parser.add_argument(
+        "--find_duplicates",
+        "-D",
+        action="store_true",
+        help="If set, write groups of duplicate files (with wasted bytes) instead of per-file attributes. Only files that share a size and a partial hash are fully hashed. `--attributes` is ignored.",
+    )
+    parser.add_argument(
+        "--output_format",
+        "-F",
+        type=str,
+        choices=[f.value for f in OutputFormat],
+        default=OutputFormat.CSV.value,
+        help="Output file format. `binary` is much smaller and supports indexed lookups; convert with `binary_manifest.py`. (default: %(default)s)",
+    )
     args = parser.parse_args()
 
     main(
@@ -301,4 +644,9 @@ if __name__ == "__main__":
         args.csv_filename,
         args.processes,
         PathFormat(args.path_format),
+        None if args.no_cache else args.cache_filename,
+        args.prune_cache,
+        Executor(args.executor),
+        args.find_duplicates,
+        OutputFormat(args.output_format),
     )
@@ -1,6 +1,8 @@
 import argparse
 import os
 
+import dir_walker
+
 
 # TODO: Also list files in sub-directories.
 
@@ -9,9 +11,7 @@ def main(working_dir: str, extensions_filter: list[str] | None, drop_extension:
     if not os.path.isdir(working_dir):
         raise NotADirectoryError(f"`{working_dir}` isn't a dir.")
 
-    filenames = os.listdir(working_dir)
-
-    filenames = [f for f in filenames if os.path.isfile(os.path.join(working_dir, f))]
+    filenames = [entry.name for entry in dir_walker.scan_files(working_dir)]  # No `stat` per file.
     if extensions_filter:
         old_filenames = filenames
         filenames = []
@@ -0,0 +1,165 @@
+"""
+Diff two `list_file_attributes_in_dir.py` manifests (CSV files): added, removed, modified and moved files.
+
+Both manifests are read once, in step, with a sorted merge-join over their rows, which are already in walk order.
+Only unmatched added/removed files are kept in memory (for move detection), so memory scales with the amount of changes instead of the manifest size.
+"""
+
+import argparse
+import csv
+import enum
+import os
+import typing
+from collections import defaultdict, deque
+
+import dir_walker
+from list_file_attributes_in_dir import AttributeKeys
+
+
+class ChangeType (enum.Enum):
+    ADDED = "added"
+    REMOVED = "removed"
+    MODIFIED = "modified"
+    MOVED = "moved"
+
+
+class ManifestChange (typing.NamedTuple):
+    change_type: ChangeType
+    filename: str  # Relative to the manifest root. For `MOVED`, the new filename.
+    old_filename: str | None  # Only for `MOVED`.
+    size: str | None
+    sha256: str | None
+
+
+class _ManifestRow (typing.NamedTuple):
+    sort_key: tuple
+    filename: str
+    size: str | None
+    sha256: str | None
+
+
+def _read_file_rows(csv_filename: str) -> typing.Iterator[_ManifestRow]:
+    """
+    Yield file rows (dirs are skipped) with paths relative to the manifest root, which is the first row.
+    """
+    with open(csv_filename, newline="") as f:
+        reader = csv.DictReader(f)
+
+        root_path = None
+        previous_key = None
+        for row in reader:
+            filename: str = row[AttributeKeys.FILENAME]
+            if root_path is None:
+                if not filename.endswith(os.sep):
+                    raise ValueError(f"`{csv_filename}`: First row `{filename}` isn't the root dir.")
+                root_path = filename
+
+            if not filename.startswith(root_path):
+                raise ValueError(f"`{csv_filename}`: `{filename}` isn't in root dir `{root_path}`.")
+            relative_filename = filename[len(root_path):]
+
+            sort_key = dir_walker.get_walk_order_key(relative_filename)
+            if (previous_key is not None) and (sort_key <= previous_key):
+                raise ValueError(f"`{csv_filename}`: `{filename}` is out of order. Manifests must be written by `list_file_attributes_in_dir.py`.")
+            previous_key = sort_key
+
+            if filename.endswith(os.sep):
+                continue
+
+            yield _ManifestRow(sort_key, relative_filename, row.get(AttributeKeys.SIZE), row.get(AttributeKeys.SHA_256_HASH) or None)
+
+
+def _merge_join(old_rows: typing.Iterator[_ManifestRow], new_rows: typing.Iterator[_ManifestRow]) -> typing.Iterator[typing.Tuple[_ManifestRow | None, _ManifestRow | None]]:
+    """
+    :return: `(old, new)` pairs. One of them is `None` if the path only exists in 1 manifest.
+    """
+    old = next(old_rows, None)
+    new = next(new_rows, None)
+
+    while (old is not None) or (new is not None):
+        if (new is None) or ((old is not None) and (old.sort_key < new.sort_key)):
+            yield old, None
+            old = next(old_rows, None)
+        elif (old is None) or (new.sort_key < old.sort_key):
+            yield None, new
+            new = next(new_rows, None)
+        else:
+            yield old, new
+            old = next(old_rows, None)
+            new = next(new_rows, None)
+
+
+def diff_manifests(old_csv_filename: str, new_csv_filename: str, detect_moves: bool = True) -> typing.Iterator[ManifestChange]:
+    """
+    `MODIFIED` changes are yielded while reading.
+    If `detect_moves`, `ADDED`/`REMOVED` changes are held back until the end, and pairs with the same `sha256` become `MOVED`.
+    Otherwise, everything is yielded while reading.
+    """
+    removed_by_hash = defaultdict(deque)
+    added = []
+
+    for old, new in _merge_join(_read_file_rows(old_csv_filename), _read_file_rows(new_csv_filename)):
+        if (old is not None) and (new is not None):
+            if (old.size != new.size) or (old.sha256 != new.sha256):
+                yield ManifestChange(ChangeType.MODIFIED, new.filename, None, new.size, new.sha256)
+        elif new is None:
+            if detect_moves and old.sha256:
+                removed_by_hash[old.sha256].append(old)
+            else:
+                yield ManifestChange(ChangeType.REMOVED, old.filename, None, old.size, old.sha256)
+        else:
+            if detect_moves and new.sha256:
+                added.append(new)
+            else:
+                yield ManifestChange(ChangeType.ADDED, new.filename, None, new.size, new.sha256)
+
+    for new in added:
+        candidates = removed_by_hash.get(new.sha256)
+        if candidates:
+            old = candidates.popleft()
+            yield ManifestChange(ChangeType.MOVED, new.filename, old.filename, new.size, new.sha256)
+        else:
+            yield ManifestChange(ChangeType.ADDED, new.filename, None, new.size, new.sha256)
+
+    for candidates in removed_by_hash.values():
+        for old in candidates:
+            yield ManifestChange(ChangeType.REMOVED, old.filename, None, old.size, old.sha256)
+
+
+# MARK: - Main
+def main(old_csv_filename: str, new_csv_filename: str, output_filename: str | None, detect_moves: bool):
+    if output_filename:
+        output_filename = os.path.abspath(output_filename)
+        if os.path.exists(output_filename):
+            raise FileExistsError(f"Output file `{output_filename}` exists!")
+
+    counts = defaultdict(int)
+    changes = diff_manifests(old_csv_filename, new_csv_filename, detect_moves)
+
+    if output_filename:
+        with open(output_filename, "w") as f:  # Default encoding is UTF-8
+            writer = csv.writer(f)
+            writer.writerow(["change", AttributeKeys.FILENAME, "old_filename", AttributeKeys.SIZE, AttributeKeys.SHA_256_HASH])
+            for change in changes:
+                counts[change.change_type] += 1
+                writer.writerow((change.change_type.value, change.filename, change.old_filename, change.size, change.sha256))
+    else:
+        for change in changes:
+            counts[change.change_type] += 1
+            if change.change_type is ChangeType.MOVED:
+                print(f"{change.change_type.value}: {change.old_filename} -> {change.filename}")
+            else:
+                print(f"{change.change_type.value}: {change.filename}")
+
+    print(", ".join(f"{counts[t]} {t.value}" for t in ChangeType))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diff two `list_file_attributes_in_dir.py` CSV manifests.")
+    parser.add_argument("old_csv_filename", help="The older manifest.")
+    parser.add_argument("new_csv_filename", help="The newer manifest.")
+    parser.add_argument("--output_filename", "-o", type=str, default=None, help="Write changes to this CSV file. Default: Print them.")
+    parser.add_argument("--no_moves", action="store_true", help="If set, don't match removed and added files by `sha256`. Nothing is held in memory then.")
+    args = parser.parse_args()
+
+    main(args.old_csv_filename, args.new_csv_filename, args.output_filename, not args.no_moves)
@@ -0,0 +1,121 @@
+"""
+Memory-aware admission of image conversion jobs.
+
+The memory a job needs is estimated from the image header (`Image.open` doesn't decode pixels).
+Jobs are admitted in order while the total estimate of admitted jobs stays within a budget; a job bigger than the whole budget is admitted only when nothing else is running, and runs alone.
+"""
+
+import os
+import threading
+
+from PIL import Image
+
+
+# Working memory of the lossless encoders per pixel, on top of the decoded image. libwebp keeps an ARGB copy plus hash chains and backward references.
+ENCODER_BYTES_PER_PIXEL = 16
+
+
+def get_bytes_per_pixel(mode: str) -> int:
+    """
+    Bytes per pixel of a decoded Pillow image. Pillow stores 2 and 3 band images in 4 bytes per pixel.
+    """
+    if mode in ("1", "L", "P"):
+        return 1
+    elif mode.startswith("I;16"):
+        return 2
+    else:
+        return 4
+
+
+def _get_conversion_bytes_per_pixel(mode: str, concurrent_encodes: int) -> int:
+    # Concurrent encodes each work on their own copy of the decoded image.
+    image_copies = concurrent_encodes if (concurrent_encodes > 1) else 0
+    return get_bytes_per_pixel(mode) * (1 + image_copies) + ENCODER_BYTES_PER_PIXEL * concurrent_encodes
+
+
+def estimate_conversion_memory(filename: str, concurrent_encodes: int = 1) -> int:
+    """
+    :param concurrent_encodes: Candidate encoders run at the same time on this image (see `image_encoders.encode_smallest`).
+    :return: Estimated peak bytes to decode and encode `filename`. 0 if it can't be opened (the job itself reports the error).
+    """
+    try:
+        with Image.open(filename) as image:
+            pixels = image.width * image.height
+            mode = image.mode
+    except Image.DecompressionBombError:
+        # Pillow refuses images over twice `Image.MAX_IMAGE_PIXELS` before reporting their size. This is a lower bound.
+        pixels = 2 * Image.MAX_IMAGE_PIXELS + 1
+        mode = "L"
+    except OSError:
+        return 0
+
+    return pixels * _get_conversion_bytes_per_pixel(mode, concurrent_encodes)
+
+
+def get_max_image_pixels(budget: int, concurrent_encodes: int = 1) -> int:
+    """
+    Pillow's decompression bomb limit (`Image.MAX_IMAGE_PIXELS`) for an amount of memory.
+    Pillow raises for images over twice the limit, which are exactly the images that don't fit into `budget` bytes in any mode.
+    """
+    return max(budget // _get_conversion_bytes_per_pixel("L", concurrent_encodes) // 2, 1)
+
+
+def get_physical_memory() -> int | None:
+    """
+    :return: Bytes, or `None` if unknown.
+    """
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def get_default_memory_budget() -> int | None:
+    """
+    :return: Half of the physical memory, or `None` if unknown.
+    """
+    physical_memory = get_physical_memory()
+    return (physical_memory // 2) if physical_memory else None
+
+
+class MemoryAdmission:
+    """
+    Thread safe. `acquire` blocks until the job fits in the budget.
+
+    Jobs are admitted strictly in the order `acquire` is called from a single feeder thread, so a big job can't be starved by smaller ones behind it.
+    """
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.in_use = 0
+        self.aborted = False
+        self._condition = threading.Condition()
+
+    def _fits(self, cost: int) -> bool:
+        # An oversized job fits only into an empty budget. While it runs, `in_use` exceeds the budget and nothing else fits.
+        return (self.in_use == 0) or (self.in_use + cost <= self.budget)
+
+    def acquire(self, cost: int) -> bool:
+        """
+        :return: `False` if `abort` was called; nothing was acquired then.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.aborted or self._fits(cost))
+            if self.aborted:
+                return False
+
+            self.in_use += cost
+            return True
+
+    def release(self, cost: int):
+        with self._condition:
+            self.in_use -= cost
+            self._condition.notify_all()
+
+    def abort(self):
+        """
+        Wake up a blocked `acquire` (e.g. when the results it waits for will never be released).
+        """
+        with self._condition:
+            self.aborted = True
+            self._condition.notify_all()
@@ -0,0 +1,213 @@
+"""
+Persistent cache of extracted metadata (`exif_compare`) backed by SQLite.
+
+Entries are keyed by path and are valid while the file's `(size, mtime_ns, inode)` is unchanged; changed files are invalidated on lookup.
+Fields are cached individually (including absent ones), so runs with different fields reuse what earlier runs extracted.
+A file warmed with all of its tags (`all_fields`) answers any field.
+"""
+
+import json
+import os
+import sqlite3
+import time
+import typing
+
+
+DEFAULT_CACHE_FILENAME: typing.Final = os.path.join(os.path.expanduser("~"), ".cache", "exif_compare_cache.sqlite3")
+DEFAULT_MAX_SIZE: typing.Final = 256 * 1024 ** 2
+
+StatKey = typing.Tuple[int, int, int]  # (size, mtime_ns, st_ino)
+
+_FILENAME_KEY: typing.Final = "SourceFile"  # Same as `exif_compare.EXIFTOOL_FILENAME_KEY`.
+
+
+def get_stat_key(stat_result: os.stat_result) -> StatKey:
+    return (stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino)
+
+
+class MetadataCache:
+    """
+    Not thread safe. Call `commit` (or `close`) to persist changes.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+        dir_name = os.path.dirname(os.path.abspath(filename))
+        os.makedirs(dir_name, exist_ok=True)
+
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, "
+            "size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, ino INTEGER NOT NULL, "
+            "all_fields INTEGER NOT NULL, stored_size INTEGER NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS fields ("
+            "file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE, "
+            "field TEXT NOT NULL, value TEXT, "  # `value` is JSON. NULL: Absent.
+            "PRIMARY KEY (file_id, field))"
+        )
+        self.connection.commit()
+
+        self.hits = 0  # Files that needed no extraction.
+        self.misses = 0
+        self.invalidated = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def _get_file(self, path: str, key: StatKey) -> typing.Tuple[int, bool] | None:
+        """
+        :return: File ID and `all_fields` of a valid entry. Invalid entries are deleted.
+        """
+        row = self.connection.execute("SELECT id, size, mtime_ns, ino, all_fields FROM files WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+
+        file_id, *stored_key, all_fields = row
+        if tuple(stored_key) != key:
+            self.connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+            self.invalidated += 1
+            return None
+
+        return file_id, bool(all_fields)
+
+    def get(self, filename: str, key: StatKey, fields: typing.Iterable[str]) -> typing.Tuple[dict, typing.List[str]]:
+        """
+        :return: Cached fields (with `SourceFile`; absent fields are left out), and fields that aren't cached.
+        """
+        fields = list(fields)
+        metadata = {_FILENAME_KEY: filename}
+
+        file = self._get_file(os.path.abspath(filename), key)
+        if file is None:
+            self.misses += 1
+            return metadata, fields
+
+        file_id, all_fields = file
+        placeholders = ", ".join("?" * len(fields))
+        cached = dict(self.connection.execute(
+            f"SELECT field, value FROM fields WHERE file_id = ? AND field IN ({placeholders})",
+            (file_id, *fields),
+        ))
+
+        missing_fields = []
+        for field in fields:
+            if field in cached:
+                if cached[field] is not None:
+                    metadata[field] = json.loads(cached[field])
+            elif not all_fields:
+                missing_fields.append(field)
+
+        if missing_fields:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self.connection.execute("UPDATE files SET last_used = ? WHERE id = ?", (time.time_ns(), file_id))
+
+        return metadata, missing_fields
+
+    def put(self, filename: str, key: StatKey, metadata: dict, fields: typing.Iterable[str] | None = None):
+        """
+        :param metadata: Extracted fields, like an `exiftool -j` dict. Absent fields are left out.
+        :param fields: Fields that were extracted (those not in `metadata` are cached as absent). `None`: All of the file's fields were extracted.
+        """
+        path = os.path.abspath(filename)
+        now = time.time_ns()
+
+        file = self._get_file(path, key)
+        if file is None:
+            file_id = self.connection.execute(
+                "INSERT INTO files (path, size, mtime_ns, ino, all_fields, stored_size, last_used) VALUES (?, ?, ?, ?, 0, 0, ?)",
+                (path, *key, now),
+            ).lastrowid
+        else:
+            file_id = file[0]
+
+        if fields is None:
+            fields = [field for field in metadata if field != _FILENAME_KEY]
+            self.connection.execute("DELETE FROM fields WHERE file_id = ?", (file_id,))
+            self.connection.execute("UPDATE files SET all_fields = 1 WHERE id = ?", (file_id,))
+
+        rows = []
+        for field in fields:
+            value = json.dumps(metadata[field]) if (field in metadata) else None
+            rows.append((file_id, field, value))
+        self.connection.executemany("INSERT OR REPLACE INTO fields VALUES (?, ?, ?)", rows)
+
+        self.connection.execute(
+            "UPDATE files SET last_used = ?, stored_size = "
+            "(SELECT COALESCE(SUM(LENGTH(field) + COALESCE(LENGTH(value), 0)), 0) FROM fields WHERE file_id = ?) "
+            "WHERE id = ?",
+            (now, file_id, file_id),
+        )
+
+    def is_warm(self, filename: str, key: StatKey) -> bool:
+        file = self._get_file(os.path.abspath(filename), key)
+        return (file is not None) and file[1]
+
+    # MARK: Maintenance
+    def get_total_size(self) -> int:
+        """
+        :return: Approximate bytes of cached metadata.
+        """
+        return self.connection.execute("SELECT COALESCE(SUM(stored_size), 0) FROM files").fetchone()[0]
+
+    def evict(self, max_size: int) -> int:
+        """
+        Delete least recently used files until the cache holds at most `max_size` bytes of metadata.
+
+        :return: Number of deleted files.
+        """
+        total_size = self.get_total_size()
+        deleted_count = 0
+
+        if total_size <= max_size:
+            return deleted_count
+
+        rows = self.connection.execute("SELECT id, stored_size FROM files ORDER BY last_used").fetchall()
+        for file_id, size in rows:
+            if total_size <= max_size:
+                break
+
+            self.connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+            total_size -= size
+            deleted_count += 1
+
+        self.connection.commit()
+        return deleted_count
+
+    def prune_missing(self) -> int:
+        """
+        Delete entries of files that no longer exist.
+
+        :return: Number of deleted files.
+        """
+        rows = self.connection.execute("SELECT id, path FROM files").fetchall()
+        missing_ids = [(file_id,) for file_id, path in rows if not os.path.exists(path)]
+        self.connection.executemany("DELETE FROM files WHERE id = ?", missing_ids)
+        self.connection.commit()
+        return len(missing_ids)
+
+    def clear(self):
+        self.connection.execute("DELETE FROM files")
+        self.connection.commit()
+
+    def get_stats_description(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total else 0
+        return f"Metadata cache `{self.filename}`: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), {self.invalidated} changed files invalidated."
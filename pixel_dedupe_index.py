@@ -0,0 +1,109 @@
+"""
+Index of converted outputs keyed by decoded pixel content, so that images with identical pixels (in different containers, or with different metadata) are encoded once.
+
+Keys are a hash of the decoded pixel buffer, mode and size (`image_pixels.get_pixel_hash`) plus the encoder parameters.
+Later identical images are hard-linked (or copied) from the first output. The index is an SQLite file shared by workers and runs; entries whose output is gone or changed are ignored.
+
+Images with identical pixels that are converted at the same time may both be encoded.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import typing
+
+from PIL import Image
+
+import conversion_cache
+import image_pixels
+
+
+def get_key(image: Image.Image, encoder_parameters: typing.Dict[str, typing.Any]) -> str:
+    parameters = json.dumps(encoder_parameters, sort_keys=True)
+    return hashlib.sha256(f"{image_pixels.get_pixel_hash(image)}\n{parameters}".encode("utf-8")).hexdigest()
+
+
+def link_or_copy(src_filename: str, dest_filename: str) -> bool:
+    """
+    Replace `dest_filename` with a hard link to `src_filename`, or a copy if hard links aren't possible (e.g. across file systems).
+
+    :return: Whether it's a hard link.
+    """
+    link_filename = dest_filename + ".link"
+    try:
+        os.link(src_filename, link_filename)
+    except OSError:
+        conversion_cache.copy_or_reflink(src_filename, dest_filename)
+        return False
+
+    os.replace(link_filename, dest_filename)
+    return True
+
+
+class PixelDedupeIndex:
+    """
+    Safe to use from multiple processes: The index uses WAL with a busy timeout.
+    """
+
+    def __init__(self, filename: str):
+        self.connection = sqlite3.connect(filename, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS outputs ("
+            "key TEXT PRIMARY KEY, filename TEXT NOT NULL, size INTEGER NOT NULL)"
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, key: str) -> str | None:
+        """
+        :return: The first output with this key, if it still exists unchanged.
+        """
+        row = self.connection.execute("SELECT filename, size FROM outputs WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        filename, size = row
+        try:
+            if os.path.getsize(filename) == size:
+                return filename
+        except FileNotFoundError:
+            pass
+
+        return None
+
+    def put(self, key: str, output_filename: str):
+        """
+        Record an output. Replaces a stale entry.
+        """
+        output_filename = os.path.abspath(output_filename)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?)",
+                (key, output_filename, os.path.getsize(output_filename)),
+            )
+
+
+# MARK: - Per-thread instances
+_indexes = threading.local()  # Index filename: `PixelDedupeIndex`. SQLite connections can't be shared across threads.
+
+
+def get_index(filename: str) -> PixelDedupeIndex:
+    """
+    Get the index instance of the current thread (and process). Instances are reused across calls.
+    """
+    indexes: typing.Dict[str, PixelDedupeIndex] = getattr(_indexes, "indexes", None)
+    if indexes is None:
+        indexes = {}
+        _indexes.indexes = indexes
+
+    index = indexes.get(filename)
+    if index is None:
+        index = PixelDedupeIndex(filename)
+        indexes[filename] = index
+
+    return index
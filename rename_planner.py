@@ -0,0 +1,237 @@
+"""
+Plan batch renames within a dir: reject collisions, then order the rest so that no rename overwrites a file.
+
+Collisions are checked against the names from 1 dir listing (a set), so planning doesn't `stat` any file.
+Chains (a -> b, b -> c) run from their free end. Cycles (a -> b, b -> a) are broken by moving 1 file to a temp name first.
+
+Trees are planned per dir, then executed depth by depth on a thread pool.
+Each dir with renames is opened once, and its renames are relative to that dir's fd (no path lookups per file).
+Dirs are executed after their parent dirs, at their paths after the parent renames, so renaming dirs is fine.
+"""
+
+import concurrent.futures
+import os
+import typing
+from collections import deque
+
+import dir_walker
+
+
+Rename = typing.Tuple[str, str]  # (Old name, new name)
+
+TEMP_NAME_PREFIX: typing.Final = ".rename_tmp_"
+
+
+class RenamePlan(typing.NamedTuple):
+    renames: typing.List[Rename]  # Accepted renames, in input order.
+    steps: typing.List[Rename]  # `os.rename` calls in execution order, including temp names.
+    existing_target_conflicts: typing.List[Rename]  # Target is taken by a file that stays.
+    duplicate_target_conflicts: typing.List[Rename]  # Several files would get the same name.
+    cycle_count: int
+
+
+def _get_temp_name(name: str, taken_names: typing.Set[str]) -> str:
+    i = 0
+    while True:
+        temp_name = f"{TEMP_NAME_PREFIX}{i}_{name}"
+        if temp_name not in taken_names:
+            taken_names.add(temp_name)
+            return temp_name
+        i += 1
+
+
+def plan_renames(renames: typing.Iterable[Rename], existing_names: typing.Set[str]) -> RenamePlan:
+    """
+    :param renames: Sources must be unique and in `existing_names`.
+    :param existing_names: All names in the dir (files and dirs).
+    """
+    renames = [(old, new) for old, new in renames if old != new]
+
+    # Duplicate targets: Reject all of them, as there's no right one to keep.
+    target_counts: typing.Dict[str, int] = {}
+    for _, new in renames:
+        target_counts[new] = target_counts.get(new, 0) + 1
+    duplicate_target_conflicts = [(old, new) for old, new in renames if target_counts[new] > 1]
+
+    targets = {old: new for old, new in renames if target_counts[new] == 1}  # Old: new
+    sources_by_target = {new: old for old, new in targets.items()}
+
+    # Existing targets: A target is free only if it doesn't exist, or if its file is renamed away.
+    # Rejecting a rename keeps its file in place, which may in turn block the rename into its name.
+    existing_target_conflicts = []
+    blocked = deque(old for old, new in targets.items() if (new in existing_names) and (new not in targets))
+    while blocked:
+        old = blocked.popleft()
+        if old not in targets:
+            continue
+
+        existing_target_conflicts.append((old, targets.pop(old)))
+        blocking_source = sources_by_target.get(old)
+        if blocking_source is not None:
+            blocked.append(blocking_source)  # Its target `old` now stays.
+
+    accepted_renames = [(old, new) for old, new in renames if targets.get(old) == new]
+    sources_by_target = {new: old for old, new in targets.items()}
+
+    # Order: A rename can run once its target is free. Running it frees its source.
+    steps = []
+    pending = dict(targets)
+    ready = deque(old for old, new in pending.items() if new not in pending)
+    while ready:
+        old = ready.popleft()
+        steps.append((old, pending.pop(old)))
+
+        next_source = sources_by_target.get(old)
+        if next_source is not None:
+            ready.append(next_source)
+
+    # What's left are cycles. Move 1 file of each out of the way, run the cycle as a chain, then move it to its target.
+    cycle_count = 0
+    taken_names = existing_names | targets.keys() | sources_by_target.keys()
+    while pending:
+        start = next(iter(pending))
+        start_target = pending.pop(start)
+        temp_name = _get_temp_name(start, taken_names)
+        steps.append((start, temp_name))
+
+        old = sources_by_target[start]
+        while old != start:
+            steps.append((old, pending.pop(old)))
+            old = sources_by_target[old]
+
+        steps.append((temp_name, start_target))
+        cycle_count += 1
+
+    return RenamePlan(accepted_renames, steps, existing_target_conflicts, duplicate_target_conflicts, cycle_count)
+
+
+def print_plan(plan: RenamePlan, dir_name: str = ""):
+    print(f"{len(plan.renames)} files to rename:")
+    for old, new in plan.renames:
+        print(f"{os.path.join(dir_name, old)} -> {os.path.join(dir_name, new)}")
+
+    if plan.cycle_count:
+        print(f"{plan.cycle_count} rename cycles (e.g. swaps) will go through temp names.")
+
+    if plan.existing_target_conflicts:
+        print(f"{len(plan.existing_target_conflicts)} files ignored due to existing target:")
+        for old, new in plan.existing_target_conflicts:
+            print(f"{os.path.join(dir_name, old)} -> {os.path.join(dir_name, new)}")
+
+    if plan.duplicate_target_conflicts:
+        print(f"{len(plan.duplicate_target_conflicts)} files ignored due to duplicate targets:")
+        for old, new in plan.duplicate_target_conflicts:
+            print(f"{os.path.join(dir_name, old)} -> {os.path.join(dir_name, new)}")
+
+
+def execute_plan(dir_name: str, plan: RenamePlan):
+    if not plan.steps:
+        return
+
+    if os.rename not in os.supports_dir_fd:
+        for old, new in plan.steps:
+            os.rename(os.path.join(dir_name, old), os.path.join(dir_name, new))
+        return
+
+    dir_fd = os.open(dir_name, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        for old, new in plan.steps:
+            os.rename(old, new, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+# MARK: - Trees
+GetNewName = typing.Callable[[os.DirEntry], typing.Optional[str]]  # New name of an entry, or `None` to keep it.
+
+
+def _plan_dir(dir_name: str, get_new_name: GetNewName) -> typing.Tuple[RenamePlan, typing.List[str]] | None:
+    """
+    :return: The plan, and the (old) names of sub-dirs to descend into (symlinks excluded). `None` if the dir is unreadable.
+    """
+    try:
+        dir_entries, file_entries = dir_walker.scan_dir(dir_name)
+    except OSError:
+        return None
+
+    existing_names = {entry.name for entry in dir_entries + file_entries}
+
+    renames = []
+    for entry in dir_entries + file_entries:
+        new_name = get_new_name(entry)
+        if (new_name is not None) and (new_name != entry.name):
+            renames.append((entry.name, new_name))
+    renames.sort()
+
+    sub_dir_names = []
+    for entry in dir_entries:
+        try:
+            if not entry.is_symlink():
+                sub_dir_names.append(entry.name)
+        except OSError:
+            pass
+
+    return plan_renames(renames, existing_names), sub_dir_names
+
+
+def plan_tree(start_path: str, get_new_name: GetNewName, recursive: bool = False, workers: int | None = None) -> typing.Dict[str, RenamePlan]:
+    """
+    :return: Relative dir path (`""` for `start_path`, no trailing separator): Plan, for dirs with renames or conflicts, in walk order.
+    """
+    plans: typing.Dict[str, RenamePlan] = {}
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        level = [""]  # Dirs are listed level by level, each level in parallel.
+        while level:
+            next_level = []
+            results = executor.map(lambda rel_dir: _plan_dir(os.path.join(start_path, rel_dir), get_new_name), level)
+            for rel_dir, result in zip(level, results):
+                if result is None:
+                    continue
+
+                plan, sub_dir_names = result
+                if plan.renames or plan.existing_target_conflicts or plan.duplicate_target_conflicts:
+                    plans[rel_dir] = plan
+                if recursive:
+                    next_level += [os.path.join(rel_dir, name) for name in sub_dir_names]
+
+            level = next_level
+
+    return dict(sorted(plans.items(), key=lambda item: dir_walker.get_walk_order_key(os.path.join(item[0], ""))))
+
+
+def print_tree_plans(start_path: str, plans: typing.Dict[str, RenamePlan]):
+    for rel_dir, plan in plans.items():
+        print_plan(plan, os.path.join(start_path, rel_dir))
+
+
+def _get_current_dir_path(start_path: str, rel_dir: str, renamed_names: typing.Dict[str, typing.Dict[str, str]]) -> str:
+    """
+    :return: Path of `rel_dir` (an old path) after its parent dirs' renames.
+    """
+    path = start_path
+    parent_rel_dir = ""
+    for name in rel_dir.split(os.sep) if rel_dir else []:
+        path = os.path.join(path, renamed_names.get(parent_rel_dir, {}).get(name, name))
+        parent_rel_dir = os.path.join(parent_rel_dir, name)
+
+    return path
+
+
+def execute_tree_plans(start_path: str, plans: typing.Dict[str, RenamePlan], workers: int | None = None):
+    """
+    Dirs of the same depth run concurrently. A depth starts after the previous one finished, so that parent dirs have their final names.
+    """
+    renamed_names = {rel_dir: dict(plan.renames) for rel_dir, plan in plans.items()}
+
+    levels: typing.Dict[int, typing.List[str]] = {}
+    for rel_dir in plans:
+        depth = rel_dir.count(os.sep) + 1 if rel_dir else 0
+        levels.setdefault(depth, []).append(rel_dir)
+
+    def execute(rel_dir: str):
+        execute_plan(_get_current_dir_path(start_path, rel_dir, renamed_names), plans[rel_dir])
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        for depth in sorted(levels):
+            list(executor.map(execute, levels[depth]))  # Re-raises errors.
@@ -3,6 +3,11 @@
 import argparse
 import enum
 import hashlib
+import mmap
+import multiprocessing.pool
+import os
+import struct
+import typing
 
 
 # MARK: - Hash Types
@@ -12,6 +17,7 @@ class HashAlgorithm (enum.Enum):
     SHA256 = "256"
     SHA384 = "384"
     SHA512 = "512"
+    BLAKE2B = "b2b"
 
     def get_hasher(self):
         if (self is HashAlgorithm.SHA1):
@@ -24,8 +30,12 @@ class HashAlgorithm (enum.Enum):
             return hashlib.sha384()
         elif (self is HashAlgorithm.SHA512):
             return hashlib.sha512()
+        elif (self is HashAlgorithm.BLAKE2B):
+            return hashlib.blake2b()
 
     def get_description(self):
+        if (self is HashAlgorithm.BLAKE2B):
+            return "BLAKE2b"
         return f"SHA{self.value}"
 
 
@@ -44,16 +54,189 @@ def get_sha_hash_of_file(filename: str, hash_algorithm: HashAlgorithm) -> str:
 
 
 def get_sha_hash_of_big_file(filename: str, hash_algorithm: HashAlgorithm) -> str:
-    hasher = hash_algorithm.get_hasher()
+    return get_sha_hashes_of_file(filename, [hash_algorithm])[hash_algorithm]
 
-    block_size = 65536
-    
-    with open(filename, "rb") as f:
-        partial_content = f.read(block_size)
-        while len(partial_content) > 0:
-            hasher.update(partial_content)
-            partial_content = f.read(block_size)
 
+def get_sha_hashes_of_file(filename: str, hash_algorithms: typing.Iterable[HashAlgorithm], block_size: int = 65536) -> typing.Dict[HashAlgorithm, str]:
+    """
+    Compute multiple hashes in a single pass over the file.
+
+    Blocks are read with `readinto` into one reused buffer, so no memory is allocated per block.
+    """
+    hashers = {algorithm: algorithm.get_hasher() for algorithm in hash_algorithms}
+
+    with open(filename, "rb", buffering=0) as f:
+        _update_hashers_with_readinto(f, hashers.values(), block_size)
+
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
+
+
+# MARK: - Adaptive reading
+class ReadStrategy (enum.Enum):
+    WHOLE = "whole"
+    READINTO = "readinto"
+    MMAP = "mmap"
+
+
+# Starting values, not measured: Tune them with `sha_hash_benchmark.py` on the target machine.
+WHOLE_READ_SIZE_THRESHOLD = 65536
+MMAP_SIZE_THRESHOLD = 256 * 1024 * 1024
+READINTO_BLOCK_SIZE = 1024 * 1024
+MMAP_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def choose_read_strategy(file_size: int, fs_block_size: int) -> typing.Tuple[ReadStrategy, int]:
+    """
+    Pick an I/O strategy from the file size and the file system's preferred I/O size (`st_blksize`).
+
+    :return: The strategy and its block size (a multiple of `fs_block_size`).
+    """
+    fs_block_size = max(fs_block_size, 4096)
+
+    if file_size <= WHOLE_READ_SIZE_THRESHOLD:
+        return ReadStrategy.WHOLE, file_size
+    elif file_size >= MMAP_SIZE_THRESHOLD:
+        return ReadStrategy.MMAP, MMAP_CHUNK_SIZE
+    else:
+        block_size = max(READINTO_BLOCK_SIZE // fs_block_size, 1) * fs_block_size
+        # Don't allocate a buffer much bigger than the file. The extra block lets the last `readinto` hit EOF.
+        block_size = min(block_size, (file_size // fs_block_size + 1) * fs_block_size)
+        return ReadStrategy.READINTO, block_size
+
+
+def get_sha_hashes_of_file_adaptive(filename: str, hash_algorithms: typing.Iterable[HashAlgorithm], strategy: ReadStrategy | None = None, block_size: int | None = None) -> typing.Dict[HashAlgorithm, str]:
+    """
+    Like `get_sha_hashes_of_file`, but picks the I/O strategy with `choose_read_strategy`.
+
+    :param strategy: Force a strategy (used by the benchmark). `None`: Choose automatically.
+    :param block_size: Force a block size. `None`: Use the one from `choose_read_strategy`.
+    """
+    hashers = {algorithm: algorithm.get_hasher() for algorithm in hash_algorithms}
+
+    with open(filename, "rb", buffering=0) as f:
+        stat_result = os.fstat(f.fileno())
+        chosen_strategy, chosen_block_size = choose_read_strategy(stat_result.st_size, stat_result.st_blksize)
+        strategy = strategy or chosen_strategy
+        block_size = block_size or chosen_block_size
+
+        if (strategy is ReadStrategy.MMAP) and (stat_result.st_size == 0):
+            strategy = ReadStrategy.WHOLE  # Empty files can't be mapped.
+
+        if (strategy is not ReadStrategy.WHOLE) and hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        if strategy is ReadStrategy.WHOLE:
+            content = f.read()
+            for hasher in hashers.values():
+                hasher.update(content)
+        elif strategy is ReadStrategy.READINTO:
+            _update_hashers_with_readinto(f, hashers.values(), block_size)
+        elif strategy is ReadStrategy.MMAP:
+            _update_hashers_with_mmap(f, hashers.values(), block_size)
+
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
+
+
+def _update_hashers_with_readinto(f: typing.BinaryIO, hashers: typing.Iterable, block_size: int):
+    update_functions = [hasher.update for hasher in hashers]
+
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+
+    while True:
+        length = f.readinto(buffer)
+        if not length:
+            break
+
+        block = view[:length] if (length < block_size) else view
+        for update in update_functions:
+            update(block)
+
+
+def _update_hashers_with_mmap(f: typing.BinaryIO, hashers: typing.Iterable, chunk_size: int):
+    update_functions = [hasher.update for hasher in hashers]
+
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+
+        # Feed every hasher chunk by chunk so that each chunk is only paged in once.
+        with memoryview(mapped) as view:
+            for offset in range(0, len(view), chunk_size):
+                with view[offset:offset + chunk_size] as chunk:
+                    for update in update_functions:
+                        update(chunk)
+
+
+# MARK: - Tree hash
+TREE_HASH_DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+
+_TREE_LEAF_PREFIX = b"\x00"
+_TREE_NODE_PREFIX = b"\x01"
+_TREE_ROOT_PREFIX = b"\x02"
+
+_MAX_READ_SIZE = 0x7FFFF000  # Max bytes a single `read` returns on Linux.
+
+
+def get_tree_hash_of_file(filename: str, leaf_algorithm: HashAlgorithm = HashAlgorithm.SHA256, chunk_size: int = TREE_HASH_DEFAULT_CHUNK_SIZE, threads: int | None = None) -> str:
+    """
+    Merkle tree digest. Chunks are read with `os.pread` and hashed in parallel, so a single big file can use all cores.
+
+    The digest only depends on the file content, `leaf_algorithm` and `chunk_size`. It's NOT equal to the plain hash of the file.
+
+    - Leaf `i`: `H(0x00 || chunk i)`, where chunk `i` is bytes `[i * chunk_size, (i + 1) * chunk_size)`. An empty file has 1 empty chunk.
+    - Each level pairs adjacent nodes into `H(0x01 || left || right)`. An odd last node moves up unchanged.
+    - Digest: `H(0x02 || chunk_size || file_size || root)`, with sizes as unsigned 64-bit big endian integers.
+
+    `H` is `leaf_algorithm` everywhere.
+
+    :param threads: Thread count. `None`: `os.cpu_count()`.
+    """
+    if chunk_size <= 0:
+        raise ValueError(f"Invalid chunk size {chunk_size}.")
+
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        file_size = os.fstat(fd).st_size
+        chunk_count = max((file_size + chunk_size - 1) // chunk_size, 1)
+
+        def hash_leaf(chunk_index: int) -> bytes:
+            hasher = leaf_algorithm.get_hasher()
+            hasher.update(_TREE_LEAF_PREFIX)
+
+            # A single `pread` may return less than asked for (Linux returns at most `_MAX_READ_SIZE` bytes), so read until the chunk is complete or EOF.
+            offset = chunk_index * chunk_size
+            end = offset + chunk_size
+            while offset < end:
+                data = os.pread(fd, min(end - offset, _MAX_READ_SIZE), offset)
+                if not data:
+                    break
+
+                hasher.update(data)  # `hashlib` releases the GIL on big buffers.
+                offset += len(data)
+
+            return hasher.digest()
+
+        if chunk_count == 1:
+            nodes = [hash_leaf(0)]
+        else:
+            with multiprocessing.pool.ThreadPool(threads) as pool:
+                nodes = pool.map(hash_leaf, range(chunk_count), chunksize=1)
+    finally:
+        os.close(fd)
+
+    while len(nodes) > 1:
+        next_nodes = []
+        for i in range(0, len(nodes) - 1, 2):
+            hasher = leaf_algorithm.get_hasher()
+            hasher.update(_TREE_NODE_PREFIX + nodes[i] + nodes[i + 1])
+            next_nodes.append(hasher.digest())
+        if len(nodes) % 2:
+            next_nodes.append(nodes[-1])
+        nodes = next_nodes
+
+    hasher = leaf_algorithm.get_hasher()
+    hasher.update(_TREE_ROOT_PREFIX + struct.pack(">QQ", chunk_size, file_size) + nodes[0])
     return hasher.hexdigest()
 
 
@@ -62,15 +245,19 @@ if (__name__ == "__main__"):
     # MARK: Parse args
     parser = argparse.ArgumentParser()
     parser.add_argument("--file", "-f", type=str, default=None, help="Filename of the file to hash.")
-    parser.add_argument("--algorithm", "-a", type=str, default=HashAlgorithm.SHA256.value, help=f"Algorithm: {HashAlgorithm.SHA1.value}, {HashAlgorithm.SHA224.value}, {HashAlgorithm.SHA256.value}, {HashAlgorithm.SHA384.value}, {HashAlgorithm.SHA512.value}. (default: %(default)s)")
+    parser.add_argument("--algorithm", "-a", type=str, nargs="+", default=[HashAlgorithm.SHA256.value], help=f"One or more algorithms, computed in a single read: {', '.join(a.value for a in HashAlgorithm)}. (default: %(default)s)")
+    parser.add_argument("--tree", "-t", action="store_true", help="If set, compute parallel tree hashes (see `get_tree_hash_of_file`) instead of plain hashes. Only comparable with tree hashes of the same chunk size.")
+    parser.add_argument("--chunk_size", "-c", type=int, default=TREE_HASH_DEFAULT_CHUNK_SIZE, help="Tree hash chunk size in bytes. (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=None, help="Tree hash thread count. Default: `os.cpu_count()`")
     args = parser.parse_args()
     
     filename = args.file
-    algorithm = HashAlgorithm(args.algorithm)
-    
-    algorithm_description = algorithm.get_description()
+    algorithms = [HashAlgorithm(a) for a in dict.fromkeys(args.algorithm)]  # Drop duplicates but keep order.
 
-    print(f"{algorithm_description} hash for {filename}")
-    # TODO: Use the "big file" function only if the file is big.
-    print(f"Whole file {algorithm_description} hash: {get_sha_hash_of_file(filename, algorithm)}")
-    print(f"Fragmented file {algorithm_description} hash: {get_sha_hash_of_big_file(filename, algorithm)}")
+    print(f"Hashes for {filename}")
+    if args.tree:
+        for algorithm in algorithms:
+            print(f"Tree {algorithm.get_description()} (chunk size {args.chunk_size}): {get_tree_hash_of_file(filename, algorithm, args.chunk_size, args.threads)}")
+    else:
+        for algorithm, digest in get_sha_hashes_of_file_adaptive(filename, algorithms).items():
+            print(f"{algorithm.get_description()}: {digest}")
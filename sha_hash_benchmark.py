@@ -0,0 +1,103 @@
+"""
+Measure `sha_hash` read strategy throughput (MB/s) on synthetic files.
+
+Use the results to tune `WHOLE_READ_SIZE_THRESHOLD`, `MMAP_SIZE_THRESHOLD` and `READINTO_BLOCK_SIZE` in `sha_hash.py`.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import sha_hash
+
+
+def _parse_size(s: str) -> int:
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if s[-1].upper() in units:
+        return int(float(s[:-1]) * units[s[-1].upper()])
+    return int(s)
+
+
+def _write_synthetic_file(filename: str, size: int):
+    chunk = os.urandom(min(size, 16 * 1024 * 1024))
+
+    with open(filename, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            f.write(chunk[:remaining])
+            remaining -= len(chunk)
+
+
+def _drop_page_cache(filename: str):
+    """
+    Ask the kernel to evict the file from the page cache (best effort, no root required).
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def benchmark(filename: str, strategy: sha_hash.ReadStrategy, block_size: int | None, repeat: int, cold: bool) -> float:
+    """
+    :return: Best throughput in MB/s.
+    """
+    size = os.path.getsize(filename)
+    best_seconds = float("inf")
+
+    for _ in range(repeat):
+        if cold:
+            _drop_page_cache(filename)
+
+        start_time = time.perf_counter()
+        sha_hash.get_sha_hashes_of_file_adaptive(filename, [sha_hash.HashAlgorithm.SHA256], strategy=strategy, block_size=block_size)
+        best_seconds = min(best_seconds, time.perf_counter() - start_time)
+
+    return size / (1024 * 1024) / best_seconds
+
+
+def main(sizes: list[int], block_sizes: list[int], repeat: int, cold: bool, work_dir: str | None):
+    print(f"{'file size':>12} {'strategy':>10} {'block size':>12} {'MB/s':>10}")
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as dir_name:
+        for size in sizes:
+            filename = os.path.join(dir_name, f"{size}.bin")
+            _write_synthetic_file(filename, size)
+
+            cases = [(sha_hash.ReadStrategy.WHOLE, None)]
+            cases += [(sha_hash.ReadStrategy.READINTO, block_size) for block_size in block_sizes]
+            if size > 0:
+                cases.append((sha_hash.ReadStrategy.MMAP, sha_hash.MMAP_CHUNK_SIZE))
+            cases.append((None, None))  # What `choose_read_strategy` picks.
+
+            for strategy, block_size in cases:
+                throughput = benchmark(filename, strategy, block_size, repeat, cold)
+                strategy_description = strategy.value if strategy else "auto"
+                block_size_description = str(block_size) if block_size else "-"
+                print(f"{size:>12} {strategy_description:>10} {block_size_description:>12} {throughput:>10.1f}")
+
+            os.remove(filename)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark `sha_hash` read strategies on synthetic files.")
+    parser.add_argument("--sizes", "-s", nargs="+", default=["4K", "64K", "1M", "64M", "512M"], help="File sizes to test. Accepts K/M/G suffixes. (default: %(default)s)")
+    parser.add_argument("--block_sizes", "-b", nargs="+", default=["64K", "256K", "1M", "4M"], help="`readinto` block sizes to test. (default: %(default)s)")
+    parser.add_argument("--repeat", "-r", type=int, default=3, help="Runs per case; the best one is reported. (default: %(default)s)")
+    parser.add_argument("--cold", "-c", action="store_true", help="Try to evict files from the page cache before each run.")
+    parser.add_argument("--work_dir", "-d", type=str, default=None, help="Where to create synthetic files. Use a dir on the file system you want to measure. Default: System temp dir")
+    args = parser.parse_args()
+
+    main(
+        [_parse_size(s) for s in args.sizes],
+        [_parse_size(s) for s in args.block_sizes],
+        args.repeat,
+        args.cold,
+        args.work_dir,
+    )
@@ -1,6 +1,8 @@
 import argparse
 import os
 
+import rename_planner
+
 
 def maybe_get_new_filename(
     filename: str, prefix: str, suffix: str, strip_whitespaces: bool
@@ -13,21 +15,21 @@ def maybe_get_new_filename(
         will_rename = True
 
     if suffix and root.endswith(suffix):
-        root = root[: len(suffix)]
+        root = root[: -len(suffix)]
         will_rename = True
 
-    if strip_whitespaces and ((root[0] == " ") or (root[-1] == " ")):
+    if strip_whitespaces and root and ((root[0] == " ") or (root[-1] == " ")):
         root = root.strip()
         will_rename = True
 
-    if will_rename:
+    if will_rename and root:  # Don't strip names to just the extension.
         return True, f"{root}{ext}"
     else:
         return False, None
 
 
 def main(
-    dir_name: str, prefix: str, suffix: str, strip_whitespaces: bool, assume_yes: bool
+    dir_name: str, prefix: str, suffix: str, strip_whitespaces: bool, assume_yes: bool, recursive: bool = False, workers: int | None = None
 ):
     # Verify arguments.
     if not os.path.isdir(dir_name):
@@ -36,34 +38,24 @@ def main(
     if (not prefix) and (not suffix) and (not strip_whitespaces):
         raise ValueError(f"No prefix or suffix given.")
 
-    # Get filenames.
-    old_filenames = os.listdir(dir_name)
-    old_filenames.sort()
+    # Get new filenames (of files and dirs).
+    def get_new_name(entry: os.DirEntry) -> str | None:
+        return maybe_get_new_filename(entry.name, prefix, suffix, strip_whitespaces)[1]
 
-    # Get new filenames.
-    old_and_new_filenames = []
-    for filename in old_filenames:
-        will_rename, new_filename = maybe_get_new_filename(
-            filename, prefix, suffix, strip_whitespaces
-        )
-        if will_rename:
-            old_and_new_filenames.append((filename, new_filename))
+    # Plan: Reject collisions (checked against the listings), and order renames so that chains and swaps don't overwrite files.
+    plans = rename_planner.plan_tree(dir_name, get_new_name, recursive, workers)
 
     # Show preview.
     if not assume_yes:
-        for old_filename, new_filename in old_and_new_filenames:
-            print(f"{old_filename} -> {new_filename}")
+        rename_planner.print_tree_plans(dir_name, plans)
 
         consent = input("Convert? (y/n) ")
         if consent.lower() != "y":
             print("Conversion aborted.")
             exit(2)
 
-    # Rename.
-    for old_filename, new_filename in old_and_new_filenames:
-        old_filename = os.path.join(dir_name, old_filename)
-        new_filename = os.path.join(dir_name, new_filename)
-        os.rename(old_filename, new_filename)
+    # Rename. Dirs are renamed before their contents.
+    rename_planner.execute_tree_plans(dir_name, plans, workers)
 
 
 if __name__ == "__main__":
@@ -78,8 +70,10 @@ if __name__ == "__main__":
     parser.add_argument("--suffix", "-s", type=str, default=None)
     parser.add_argument("--strip_whitespaces", "-w", action="store_true")
     parser.add_argument("--assume_yes", "-y", action="store_true")
+    parser.add_argument("--recursive", "-r", action="store_true", help="Also rename entries in sub-directories.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Dirs listed and renamed concurrently. (default: %(default)s)")
     args = parser.parse_args()
 
     main(
-        args.dir_name, args.prefix, args.suffix, args.strip_whitespaces, args.assume_yes
+        args.dir_name, args.prefix, args.suffix, args.strip_whitespaces, args.assume_yes, args.recursive, args.workers
     )
@@ -0,0 +1,42 @@
+import os
+import unittest
+import tempfile
+
+import binary_manifest
+
+
+class BinaryManifestTestCase (unittest.TestCase):
+    def test_write_and_lookup(self):
+        rows = [
+            ("root/", 6, None),
+            ("root/a", 1, "00" * 32),
+            ("root/b", 2, "ab" * 32),
+            ("root/x/", 3, None),
+            ("root/x/c", 3, "cd" * 32),
+            ("root/x/y/", 0, None),
+            ("root/z/", 0, None),
+        ]
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            filename = os.path.join(dir_name, "manifest.bin")
+            with binary_manifest.BinaryManifestWriter(filename, ["size", "sha256"], index_interval=2) as writer:
+                offsets = [writer.add_row(f, None if f.endswith("/") else size, digest) for f, size, digest in rows]
+                for offset, (f, size, _) in zip(offsets, rows):
+                    if f.endswith("/"):
+                        writer.patch_size(offset, size)
+
+            expected = [{"filename": f, "size": size, "sha256": digest} for f, size, digest in rows]
+
+            with binary_manifest.BinaryManifestReader(filename) as reader:
+                self.assertEqual(list(reader), expected)
+
+                for d in expected:
+                    with self.subTest(filename=d["filename"]):
+                        self.assertEqual(reader.lookup(d["filename"]), d)
+
+                self.assertIsNone(reader.lookup("root/x/d"))
+                self.assertIsNone(reader.lookup("other/a"))
+
+
+if __name__ == '__main__':
+    unittest.main()
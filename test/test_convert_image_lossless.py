@@ -1,11 +1,20 @@
+import json
 import os
+import shutil
+import stat
 import unittest
+import unittest.mock
 import tempfile
+import threading
 import typing
 
 from PIL import Image, ImageChops  # Channel Operations
 
+import conversion_cache
+import conversion_metrics
 import convert_image_lossless
+import image_encoders
+import memory_admission
 
 
 class ConvertImageLosslessTestCase (unittest.TestCase):
@@ -42,6 +51,169 @@ class ConvertImageLosslessTestCase (unittest.TestCase):
                     convert_image_lossless.convert_image_to_webp(src_filename, dest_filename)
                     self._assert_image_equal(src_filename, dest_filename)
 
+    def test_convert_image_worker_cache(self):
+        src_filename, dest_filename = next(iter(self._generate_src_and_dest_images(".webp")))
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            cache_dir = os.path.join(dir_name, "cache")
+            first_dest_filename = os.path.join(dir_name, "first_" + dest_filename)
+            second_dest_filename = os.path.join(dir_name, "second_" + dest_filename)
+
+            result = convert_image_lossless.convert_image_worker(src_filename, first_dest_filename, False, convert_image_lossless.ConversionOptions(cache_dir=cache_dir))
+            self.assertEqual(result.result, convert_image_lossless.ConversionResult.CONVERTED.value)
+
+            result = convert_image_lossless.convert_image_worker(src_filename, second_dest_filename, False, convert_image_lossless.ConversionOptions(cache_dir=cache_dir))
+            self.assertEqual(result.result, convert_image_lossless.ConversionResult.CACHE_HIT.value)
+            self._assert_image_equal(src_filename, second_dest_filename)
+
+            for filename in (first_dest_filename, second_dest_filename):
+                self.assertEqual(stat.S_IMODE(os.stat(filename).st_mode), convert_image_lossless.OUTPUT_FILE_MODE)  # Not the temp file's 0600.
+
+    def test_convert_image_smallest_of_encoders(self):
+        for dest_ext, encoder_names in ((".webp", ("webp", "webp_fast")), (".tiff", ("tiff_deflate", "tiff_lzw"))):
+            for src_filename, dest_filename in self._generate_src_and_dest_images(dest_ext):
+                with tempfile.TemporaryDirectory() as dir_name:
+                    dest_filename = os.path.join(dir_name, dest_filename)
+                    options = convert_image_lossless.ConversionOptions(encoder_names=encoder_names, candidate_threads=2)
+
+                    with self.subTest(src_filename=src_filename, dest_filename=dest_filename):
+                        timings = convert_image_lossless.convert_image(src_filename, dest_filename, options)
+                        self.assertIn(timings.encoder_name, encoder_names)
+                        self._assert_image_equal(src_filename, dest_filename)
+
+        with self.assertRaises(ValueError):
+            image_encoders.get_encoders(".bmp")
+
+    def test_convert_image_worker_verify(self):
+        src_filename, dest_filename = next(iter(self._generate_src_and_dest_images(".webp")))
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            dest_filename = os.path.join(dir_name, dest_filename)
+            result = convert_image_lossless.convert_image_worker(src_filename, dest_filename, False, convert_image_lossless.ConversionOptions(verify=True))
+
+            self.assertEqual(result.result, convert_image_lossless.ConversionResult.CONVERTED.value)
+            self.assertEqual(os.listdir(dir_name), [os.path.basename(dest_filename)])  # No temp file left.
+
+    def test_convert_image_worker_verify_bad_cache_object(self):
+        src_filename, dest_filename = next(iter(self._generate_src_and_dest_images(".webp")))
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            options = convert_image_lossless.ConversionOptions(cache_dir=os.path.join(dir_name, "cache"), verify=True)
+            convert_image_lossless.convert_image_worker(src_filename, os.path.join(dir_name, "first_" + dest_filename), False, options)
+
+            # Corrupt the cached object.
+            cache = conversion_cache.get_cache(options.cache_dir)
+            cache_key = conversion_cache.get_cache_key(src_filename, options.get_cache_parameters(".webp"))
+            Image.new("RGB", (4, 4)).save(cache._get_object_filename(cache_key), format="WEBP", lossless=True)
+
+            # The bad object is replaced with a fresh encode.
+            for expected_result in (convert_image_lossless.ConversionResult.CONVERTED, convert_image_lossless.ConversionResult.CACHE_HIT):
+                second_dest_filename = os.path.join(dir_name, f"{expected_result.value}_" + dest_filename)
+                result = convert_image_lossless.convert_image_worker(src_filename, second_dest_filename, False, options)
+                self.assertEqual(result.result, expected_result.value)
+                self._assert_image_equal(src_filename, second_dest_filename)
+
+    def test_main_journal(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            src_dir = os.path.join(dir_name, "src")
+            dest_dir = os.path.join(dir_name, "dest")
+            journal_filename = os.path.join(dir_name, "journal.jsonl")
+            shutil.copytree(os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_images"), src_dir)
+
+            # An interrupted run: 1 image done, and a line cut off.
+            done_src_filename = os.path.join(src_dir, "1.png")
+            with open(journal_filename, "w") as f:
+                f.write(json.dumps({"src_filename": done_src_filename, "dest_filename": os.path.join(dest_dir, "1.webp"), "result": "converted"}) + "\n")
+                f.write('{"src_filename": "')
+
+            convert_image_lossless.main(src_dir, dest_dir, ["png"], "webp", True, False, 0, journal_filename=journal_filename)
+
+            self.assertNotIn("1.webp", os.listdir(dest_dir))
+            self.assertIn("2.webp", os.listdir(dest_dir))
+
+            with open(journal_filename) as f:
+                entry = json.loads(f.readlines()[-1])
+            self.assertEqual(entry["src_filename"], os.path.join(src_dir, "2.png"))
+
+    def test_metrics_report_skipped(self):
+        report = conversion_metrics.MetricsReport(skipped_results=[convert_image_lossless.ConversionResult.SKIPPED.value])
+        report.add(conversion_metrics.ImageMetrics("1.png", "1.webp", convert_image_lossless.ConversionResult.CONVERTED.value, 0, total_seconds=2.0, input_bytes=10))
+        for i in range(3):
+            report.add(conversion_metrics.ImageMetrics(f"{i}.png", f"{i}.webp", convert_image_lossless.ConversionResult.SKIPPED.value, 0))
+
+        self.assertEqual(report.latencies, [2.0])  # Skipped images don't pull percentiles to 0.
+        self.assertEqual(report.skipped_count, 3)
+        self.assertTrue(report.get_summary(1.0).startswith("1 images (1 converted) in 1.00s: 1.00 images/s"))
+        self.assertTrue(report.get_summary(1.0).endswith("3 skipped."))
+
+    def test_main_worker_error(self):
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as dir_name:  # Pool threads aren't joined on errors, and may still write outputs.
+            src_dir = os.path.join(dir_name, "src")
+            os.mkdir(src_dir)
+            with open(os.path.join(src_dir, "000.png"), "wb") as f:
+                f.write(b"Not an image")
+            for i in range(1, 4 * convert_image_lossless.MAX_PENDING_IMAGES_PER_PROCESS):
+                Image.new("RGB", (16, 16), (i, 0, 0)).save(os.path.join(src_dir, f"{i:03}.png"))
+
+            # Run in a thread, so that a hang fails the test instead of blocking the suite.
+            errors = []
+
+            def run():
+                try:
+                    convert_image_lossless.main(src_dir, os.path.join(dir_name, "dest"), ["png"], "webp", True, False, 1, executor=convert_image_lossless.Executor.THREAD)
+                except Exception as e:
+                    errors.append(e)
+
+            thread = threading.Thread(target=run, daemon=True)
+            thread.start()
+            thread.join(60)
+
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(len(errors), 1)
+            self.assertIsInstance(errors[0], Image.UnidentifiedImageError)
+
+    def test_main_memory_budget(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            src_dir = os.path.join(dir_name, "src")
+            os.mkdir(src_dir)
+            Image.new("RGB", (16, 16)).save(os.path.join(src_dir, "small.png"))
+            Image.new("RGB", (200, 200)).save(os.path.join(src_dir, "big.png"))
+            memory_budget = memory_admission.estimate_conversion_memory(os.path.join(src_dir, "small.png")) * 2
+
+            for executor in convert_image_lossless.Executor:
+                dest_dir = os.path.join(dir_name, executor.value)
+                with self.subTest(executor=executor), unittest.mock.patch.object(Image, "MAX_IMAGE_PIXELS", Image.MAX_IMAGE_PIXELS):  # `main` raises it.
+                    report = convert_image_lossless.main(src_dir, dest_dir, ["png"], "webp", True, False, 2, memory_budget=memory_budget, executor=executor)
+
+                    # `big.png` is over the whole budget, and runs alone.
+                    self.assertEqual(report.counts, {convert_image_lossless.ConversionResult.CONVERTED.value: 2})
+                    self.assertEqual(sorted(os.listdir(dest_dir)), ["big.webp", "small.webp"])
+
+    def test_main_dedupe_index(self):
+        src_filename = next(iter(self._generate_src_and_dest_images(".webp")))[0]
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            src_dir = os.path.join(dir_name, "src")
+            dest_dir = os.path.join(dir_name, "dest")
+            os.mkdir(src_dir)
+
+            # Same pixels, different files.
+            with Image.open(src_filename) as image:
+                image.save(os.path.join(src_dir, "a.png"), compress_level=1)
+                image.save(os.path.join(src_dir, "b.png"), compress_level=9)
+
+            dedupe_index_filename = os.path.join(dir_name, "dedupe.sqlite3")
+            journal_filename = os.path.join(dir_name, "journal.jsonl")
+            report = convert_image_lossless.main(src_dir, dest_dir, ["png"], "webp", True, False, 0, journal_filename=journal_filename, dedupe_index_filename=dedupe_index_filename)
+
+            self.assertEqual(report.counts, {convert_image_lossless.ConversionResult.CONVERTED.value: 1, convert_image_lossless.ConversionResult.DEDUPLICATED.value: 1})
+            self.assertTrue(os.path.samefile(os.path.join(dest_dir, "a.webp"), os.path.join(dest_dir, "b.webp")))
+            self._assert_image_equal(src_filename, os.path.join(dest_dir, "b.webp"))
+
+            # Resuming doesn't probe deduplicated images again.
+            report = convert_image_lossless.main(src_dir, dest_dir, ["png"], "webp", True, False, 0, journal_filename=journal_filename, dedupe_index_filename=dedupe_index_filename)
+            self.assertEqual(report.counts, {})
+
 
 if __name__ == '__main__':
     unittest.main()
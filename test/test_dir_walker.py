@@ -0,0 +1,38 @@
+import os
+import unittest
+import tempfile
+
+import dir_walker
+
+
+class DirWalkerTestCase (unittest.TestCase):
+    def test_walk_matches_os_walk(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            for filename in ("b/2", "a/1", "a/c/3", "z", "y"):
+                filename = os.path.join(dir_name, filename)
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+                open(filename, "w").close()
+            os.makedirs(os.path.join(dir_name, "empty"))
+            os.symlink(os.path.join(dir_name, "a"), os.path.join(dir_name, "link"))
+
+            expected = []
+            for root_path, dir_names, filenames in os.walk(dir_name):
+                dir_names.sort()
+                expected.append((root_path, dir_names.copy(), sorted(filenames)))
+
+            actual = [
+                (root_path, [e.name for e in dir_entries], [e.name for e in file_entries])
+                for root_path, dir_entries, file_entries in dir_walker.walk(dir_name)
+            ]
+            self.assertEqual(actual, expected)
+
+            self.assertEqual([e.name for e in dir_walker.scan_files(dir_name)], ["y", "z"])
+
+    def test_get_walk_order_key(self):
+        # `list_file_attributes_in_dir.py` order.
+        filenames = ["", "b", "z", "a/", "a/c", "a/b/", "a/b/d", "aa/", "b/"]
+        self.assertEqual(sorted(filenames, key=dir_walker.get_walk_order_key), filenames)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+from PIL import Image, PngImagePlugin
+
+import exif_compare
+import exif_fast_path
+
+
+FIELDS = ["FileName", "ImageWidth", "ImageHeight", "Make", "Model", "Software", "Orientation", "ModifyDate", "DateTimeOriginal", "LensModel"]
+
+
+def _generate_corpus(dir_name: str) -> list[str]:
+    """
+    Images with EXIF in every fast path format, plus ones the fast path must leave to `exiftool`.
+    """
+    filenames = []
+    for i, (make, orientation) in enumerate([("Canon", 1), ("NIKON CORPORATION", 6), (" padded ", 3), ("1.5", 9)]):
+        image = Image.new("RGB", (30 + i, 20))
+        exif = image.getexif()
+        exif[0x010F] = make
+        exif[0x0110] = f"Model {i}"
+        exif[0x0112] = orientation
+        exif[0x0132] = "2020:01:02 03:04:05"
+        exif.get_ifd(0x8769)[0x9003] = "2019:01:02 03:04:05"
+
+        for extension in ("jpg", "png", "webp", "tiff"):
+            filename = os.path.join(dir_name, f"{i}.{extension}")
+            image.save(filename, exif=exif)
+            filenames.append(filename)
+
+    filename = os.path.join(dir_name, "text.png")
+    image.save(filename, exif=exif, pnginfo=_get_png_info("Software", "Text chunk"))
+    filenames.append(filename)
+
+    filename = os.path.join(dir_name, "not_an_image.txt")
+    with open(filename, "w") as f:
+        f.write("text")
+    filenames.append(filename)
+
+    return filenames
+
+
+def _get_png_info(key: str, value: str):
+    info = PngImagePlugin.PngInfo()
+    info.add_text(key, value)
+    return info
+
+
+class ExifFastPathTestCase (unittest.TestCase):
+    def test_read_metadata(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            filenames = _generate_corpus(dir_name)
+
+            metadata, unresolved = exif_fast_path.read_metadata(filenames[0], FIELDS)
+            self.assertEqual(unresolved, ["LensModel"])
+            self.assertEqual(metadata["Make"], "Canon")
+            self.assertEqual(metadata["Orientation"], "Horizontal (normal)")
+            self.assertEqual(metadata["ImageWidth"], 30)
+            self.assertEqual(metadata["DateTimeOriginal"], "2019:01:02 03:04:05")
+
+            # Values `exiftool` may print differently.
+            self.assertEqual(exif_fast_path.read_metadata(os.path.join(dir_name, "2.jpg"), ["Make"])[1], ["Make"])
+            self.assertEqual(exif_fast_path.read_metadata(os.path.join(dir_name, "3.jpg"), ["Make", "Orientation"])[1], ["Make", "Orientation"])
+
+            # Other metadata containers, and unsupported files.
+            self.assertEqual(exif_fast_path.read_metadata(os.path.join(dir_name, "text.png"), ["Make"])[1], ["Make"])
+            self.assertEqual(exif_fast_path.read_metadata(os.path.join(dir_name, "not_an_image.txt"), ["Make"])[1], ["Make"])
+
+            # Files Pillow fails on are left to `exiftool` too.
+            filename = os.path.join(dir_name, "bad_exif.png")
+            Image.new("RGB", (8, 8)).save(filename, exif=b"XX*\x00\x08\x00\x00\x00")  # Invalid byte order: `SyntaxError`.
+            self.assertEqual(exif_fast_path.read_metadata(filename, ["Make"])[1], ["Make"])
+
+            with unittest.mock.patch.object(Image, "MAX_IMAGE_PIXELS", 10):  # `DecompressionBombError`.
+                self.assertEqual(exif_fast_path.read_metadata(filenames[0], ["Make"])[1], ["Make"])
+
+
+class FieldAggregatorTestCase (unittest.TestCase):
+    def test_add(self):
+        aggregator = exif_compare.FieldAggregator("Make", sample_size=2, max_values=2)
+        for i, make in enumerate(["Canon", "Canon", "Canon", None, "Sony", "Nikon"]):
+            metadata = {exif_compare.EXIFTOOL_FILENAME_KEY: f"dir{i % 2}/{i}.jpg"}
+            if make:
+                metadata["Make"] = make
+            aggregator.add(metadata, "dir" if (i < 5) else "other_dir")
+
+        values = aggregator.groups["dir"]
+        self.assertEqual(list(values), ["Canon", exif_compare.METADATA_ABSENT_KEY, exif_compare.OTHER_VALUES_KEY])
+        self.assertEqual(values["Canon"].count, 3)
+        self.assertEqual(values["Canon"].sample, ["dir0/0.jpg", "dir1/1.jpg"])
+        self.assertEqual(values[exif_compare.OTHER_VALUES_KEY].sample, ["dir0/4.jpg"])
+        self.assertEqual(list(aggregator.groups["other_dir"]), ["Nikon"])
+
+
+@unittest.skipUnless(shutil.which("exiftool"), "`exiftool` not installed")
+class ExiftoolPoolTestCase (unittest.TestCase):
+    def test_pool_matches_run_exiftool(self):
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            filenames = []
+            for i, name in enumerate(["1.png", "2.png"] * 3):
+                filename = os.path.join(dir_name, f"{i}_{name}")
+                shutil.copy(os.path.join(script_dir, "test_images", name), filename)
+                filenames.append(filename)
+
+            with exif_compare.ExiftoolPool(2) as pool:
+                pool_metadata = list(pool.get_metadata(filenames, chunk_size=2))
+
+            self.assertEqual([d[exif_compare.EXIFTOOL_FILENAME_KEY] for d in pool_metadata], filenames)
+            for filename, d in zip(filenames, pool_metadata):
+                expected = exif_compare.run_exiftool(filename)
+                for key in ("FileSize", "ImageWidth", "ImageHeight"):
+                    self.assertEqual(d.get(key), expected.get(key))
+
+    def test_special_relative_filenames(self):
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        cwd = os.getcwd()
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            filenames = ["#1.png", "-2.png", "3.png"]
+            for filename in filenames:
+                shutil.copy(os.path.join(script_dir, "test_images", "1.png"), os.path.join(dir_name, filename))
+
+            os.chdir(dir_name)
+            try:
+                with exif_compare.ExiftoolPool(1) as pool:
+                    metadata = list(pool.get_metadata(filenames))
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual([d[exif_compare.EXIFTOOL_FILENAME_KEY] for d in metadata], filenames)
+
+    def test_fast_path_matches_exiftool(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            filenames = _generate_corpus(dir_name)
+
+            with exif_compare.ExiftoolPool(2) as pool:
+                exiftool_metadata = exif_compare.get_metadata(filenames, FIELDS, pool, fast_path=False)
+                fast_path_metadata = exif_compare.get_metadata(filenames, FIELDS, pool, fast_path=True)
+
+            for expected, d in zip(exiftool_metadata, fast_path_metadata):
+                with self.subTest(filename=expected[exif_compare.EXIFTOOL_FILENAME_KEY]):
+                    self.assertEqual({k: d.get(k) for k in FIELDS}, {k: expected.get(k) for k in FIELDS})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import sqlite3
+import unittest
+import tempfile
+
+import file_hash_cache
+
+
+class FileHashCacheTestCase (unittest.TestCase):
+    def test_record_and_prune(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            cache_filename = os.path.join(dir_name, "cache.sqlite3")
+            key = (1, 2, 3, 4)
+
+            with file_hash_cache.FileHashCache(cache_filename) as cache:
+                cache.record(key, "sha256", "abc", hit=False)
+                cache.record((1, 3, 3, 4), "sha256", "def", hit=False)
+
+            self.assertEqual(file_hash_cache.lookup(cache_filename, key, "sha256"), "abc")
+            self.assertIsNone(file_hash_cache.lookup(cache_filename, (1, 2, 3, 5), "sha256"))
+
+            with file_hash_cache.FileHashCache(cache_filename) as cache:
+                cache.record(key, "sha256", "abc", hit=True)
+                self.assertEqual(cache.prune(), 1)
+                self.assertEqual((cache.hits, cache.misses, cache.pruned), (1, 0, 1))
+                self.assertIsNone(cache.get((1, 3, 3, 4), "sha256"))
+                self.assertEqual(cache.get(key, "sha256"), "abc")
+
+    def test_periodic_commit(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            cache_filename = os.path.join(dir_name, "cache.sqlite3")
+
+            cache = file_hash_cache.FileHashCache(cache_filename)
+            for i in range(file_hash_cache.COMMIT_INTERVAL_RECORDS):
+                cache.record((1, i, 3, 4), "sha256", str(i), hit=False)
+
+            # Committed before `close`, so a crash at this point keeps them.
+            reader = sqlite3.connect(cache_filename)
+            self.assertEqual(reader.execute("SELECT COUNT(*) FROM file_hashes").fetchone()[0], file_hash_cache.COMMIT_INTERVAL_RECORDS)
+            reader.close()
+            cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from PIL import Image
+
+import image_pixels
+
+
+class ImagePixelsTestCase (unittest.TestCase):
+    def test_images_equal(self):
+        image = Image.new("RGB", (40, 600), (10, 20, 30))
+        self.assertTrue(image_pixels.images_equal(image, image.copy()))
+        self.assertTrue(image_pixels.images_equal(image, image.convert("RGBA")))
+        self.assertTrue(image_pixels.images_equal(image.convert("P", palette=Image.Palette.ADAPTIVE), image))
+
+        different = image.copy()
+        different.putpixel((39, 599), (10, 20, 31))  # In the last strip.
+        self.assertFalse(image_pixels.images_equal(image, different))
+        self.assertFalse(image_pixels.images_equal(image, image.crop((0, 0, 40, 599))))
+        self.assertFalse(image_pixels.images_equal(image, image.convert("CMYK")))
+
+    def test_images_equal_transparent_color(self):
+        a = Image.new("RGBA", (4, 4), (255, 0, 0, 0))
+        b = Image.new("RGBA", (4, 4), (0, 0, 0, 0))
+        self.assertTrue(image_pixels.images_equal(a, b))
+        self.assertFalse(image_pixels.images_equal(a, b, ignore_transparent_color=False))
+
+        b.putpixel((0, 0), (0, 0, 0, 1))
+        self.assertFalse(image_pixels.images_equal(a, b))
+
+
+if __name__ == '__main__':
+    unittest.main()
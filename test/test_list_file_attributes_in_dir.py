@@ -0,0 +1,121 @@
+import csv
+import os
+import unittest
+import tempfile
+
+import duplicate_finder
+import list_file_attributes_in_dir
+from list_file_attributes_in_dir import AttributeKeys
+
+
+class ListFileAttributesInDirTestCase (unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+        self.tree_dir = os.path.join(self.temp_dir.name, "tree")
+        file_sizes = {
+            "1": 10,
+            "a/2": 20,
+            "a/b/3": 30,
+            "a/b/c/4": 40,
+            "a/bb/5": 50,
+            "d/6": 60,
+        }
+        os.makedirs(os.path.join(self.tree_dir, "empty"))
+        for filename, size in file_sizes.items():
+            filename = os.path.join(self.tree_dir, filename)
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(filename, "wb") as f:
+                f.write(os.urandom(size))
+
+    def _read_sizes(self, csv_filename: str) -> dict:
+        with open(csv_filename) as f:
+            rows = list(csv.DictReader(f))
+
+        prefix_length = len(self.tree_dir) + 1
+        return {row[AttributeKeys.FILENAME][prefix_length:]: int(row[AttributeKeys.SIZE]) for row in rows}
+
+    def test_main(self):
+        for executor in list_file_attributes_in_dir.Executor:
+            csv_filename = os.path.join(self.temp_dir.name, f"{executor.value}.csv")
+
+            with self.subTest(executor=executor):
+                list_file_attributes_in_dir.main(
+                    self.tree_dir,
+                    [AttributeKeys.SIZE, AttributeKeys.SHA_256_HASH],
+                    csv_filename,
+                    2,
+                    list_file_attributes_in_dir.PathFormat.UNMODIFIED,
+                    cache_filename=None,
+                    executor=executor,
+                )
+
+                sizes = self._read_sizes(csv_filename)
+                self.assertEqual(list(sizes.keys()), [
+                    "", "1",
+                    "a/", "a/2",
+                    "a/b/", "a/b/3",
+                    "a/b/c/", "a/b/c/4",
+                    "a/bb/", "a/bb/5",
+                    "d/", "d/6",
+                    "empty/",
+                ])
+                self.assertEqual(sizes[""], 210)
+                self.assertEqual(sizes["a/"], 140)
+                self.assertEqual(sizes["a/b/"], 70)
+                self.assertEqual(sizes["a/b/c/"], 40)
+                self.assertEqual(sizes["a/bb/"], 50)
+                self.assertEqual(sizes["d/"], 60)
+                self.assertEqual(sizes["empty/"], 0)
+
+    def test_broken_symlink(self):
+        link_filename = os.path.join(self.tree_dir, "a", "broken_link")
+        os.symlink(os.path.join(self.tree_dir, "missing"), link_filename)
+        csv_filename = os.path.join(self.temp_dir.name, "broken_link.csv")
+
+        list_file_attributes_in_dir.main(
+            self.tree_dir,
+            [AttributeKeys.SIZE, AttributeKeys.SHA_256_HASH],
+            csv_filename,
+            2,
+            list_file_attributes_in_dir.PathFormat.UNMODIFIED,
+            cache_filename=None,
+        )
+
+        with open(csv_filename) as f:
+            rows = {row[AttributeKeys.FILENAME]: row for row in csv.DictReader(f)}
+        self.assertEqual(rows[link_filename][AttributeKeys.SIZE], "")  # Listed with its filename only.
+        self.assertEqual(rows[os.path.join(self.tree_dir, "a") + os.sep][AttributeKeys.SIZE], "140")
+
+    def test_find_duplicates(self):
+        big_content = os.urandom(duplicate_finder.PARTIAL_HASH_SIZE * 3)
+        same_ends = bytearray(big_content)
+        same_ends[duplicate_finder.PARTIAL_HASH_SIZE + 1] ^= 0xff  # Same partial hash, different full hash.
+        contents = {
+            "big_1": big_content,
+            "a/big_2": big_content,
+            "same_ends": bytes(same_ends),
+            "small_1": b"abc",
+            "d/small_2": b"abc",
+            "small_3": b"abd",
+        }
+        for filename, content in contents.items():
+            with open(os.path.join(self.tree_dir, filename), "wb") as f:
+                f.write(content)
+        os.link(os.path.join(self.tree_dir, "big_1"), os.path.join(self.tree_dir, "big_1_hard_link"))
+
+        stats = duplicate_finder.DuplicateStats()
+        groups = duplicate_finder.find_duplicates(self.tree_dir, stats=stats)
+
+        prefix_length = len(self.tree_dir) + 1
+        self.assertEqual(
+            [[f[prefix_length:] for f in g.filenames] for g in groups],
+            [["a/big_2", "big_1"], ["d/small_2", "small_1"]],
+        )
+        self.assertEqual(groups[0].wasted_bytes, len(big_content))
+        self.assertEqual(stats.partial_candidate_count, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import csv
+import os
+import unittest
+import tempfile
+
+import manifest_diff
+from manifest_diff import ChangeType
+
+
+class ManifestDiffTestCase (unittest.TestCase):
+    @staticmethod
+    def _write_manifest(filename: str, rows: list):
+        with open(filename, "w") as f:
+            writer = csv.writer(f)
+            writer.writerow(["filename", "size", "sha256"])
+            writer.writerows(rows)
+
+    def test_diff_manifests(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            old_filename = os.path.join(dir_name, "old.csv")
+            new_filename = os.path.join(dir_name, "new.csv")
+            self._write_manifest(old_filename, [
+                ("old/", 6, ""),
+                ("old/modified", 1, "h2"),
+                ("old/removed", 1, "h3"),
+                ("old/same", 1, "h1"),
+                ("old/a/", 3, ""),
+                ("old/a/moved", 3, "h4"),
+            ])
+            self._write_manifest(new_filename, [
+                ("new/", 6, ""),
+                ("new/added", 1, "h5"),
+                ("new/modified", 2, "h6"),
+                ("new/same", 1, "h1"),
+                ("new/b/", 3, ""),
+                ("new/b/moved", 3, "h4"),
+            ])
+
+            changes = {(c.change_type, c.filename, c.old_filename) for c in manifest_diff.diff_manifests(old_filename, new_filename)}
+            self.assertEqual(changes, {
+                (ChangeType.ADDED, "added", None),
+                (ChangeType.MODIFIED, "modified", None),
+                (ChangeType.REMOVED, "removed", None),
+                (ChangeType.MOVED, "b/moved", "a/moved"),
+            })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import threading
+import unittest
+import unittest.mock
+
+from PIL import Image
+
+import memory_admission
+
+
+class MemoryAdmissionTestCase (unittest.TestCase):
+    def test_estimate_conversion_memory(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            filename = os.path.join(dir_name, "1.png")
+            Image.new("RGB", (300, 200)).save(filename)
+
+            self.assertEqual(memory_admission.estimate_conversion_memory(filename), 300 * 200 * (4 + memory_admission.ENCODER_BYTES_PER_PIXEL))
+            self.assertEqual(memory_admission.estimate_conversion_memory(filename, 2), 300 * 200 * (3 * 4 + 2 * memory_admission.ENCODER_BYTES_PER_PIXEL))  # Source and 2 copies.
+            self.assertEqual(memory_admission.estimate_conversion_memory(os.path.join(dir_name, "missing.png")), 0)
+
+    def test_max_image_pixels(self):
+        budget = 1000 * (1 + memory_admission.ENCODER_BYTES_PER_PIXEL)  # 1000 "L" pixels.
+        self.assertEqual(memory_admission.get_max_image_pixels(budget), 500)
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            filename = os.path.join(dir_name, "1.png")
+            Image.new("L", (40, 30)).save(filename)
+
+            with unittest.mock.patch.object(Image, "MAX_IMAGE_PIXELS", memory_admission.get_max_image_pixels(budget)):
+                self.assertGreater(memory_admission.estimate_conversion_memory(filename), budget)  # Refused by Pillow, but still over the budget.
+
+    def test_oversized_job_runs_alone(self):
+        admission = memory_admission.MemoryAdmission(100)
+        admission.acquire(60)
+
+        admitted = threading.Event()
+
+        def acquire_oversized():
+            admission.acquire(150)
+            admitted.set()
+
+        thread = threading.Thread(target=acquire_oversized)
+        thread.start()
+        self.assertFalse(admitted.wait(0.1))  # Waits for the running job.
+
+        admission.release(60)
+        self.assertTrue(admitted.wait(5))
+        thread.join()
+        self.assertEqual(admission.in_use, 150)
+        self.assertFalse(admission._fits(1))  # Nothing else runs next to it.
+
+        admission.release(150)
+        self.assertTrue(admission._fits(100))
+
+    def test_abort(self):
+        admission = memory_admission.MemoryAdmission(100)
+        admission.acquire(60)
+
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(admission.acquire(50)))
+        thread.start()
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())  # Waits for the running job.
+
+        admission.abort()
+        thread.join(5)
+        self.assertEqual(acquired, [False])
+        self.assertEqual(admission.in_use, 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import unittest
+import tempfile
+
+import metadata_cache
+
+
+class MetadataCacheTestCase (unittest.TestCase):
+    def test_get_put_and_invalidate(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            filename = os.path.join(dir_name, "1.jpg")
+            key = (1, 2, 3)
+
+            with metadata_cache.MetadataCache(os.path.join(dir_name, "cache.sqlite3")) as cache:
+                self.assertEqual(cache.get(filename, key, ["Make"]), ({"SourceFile": filename}, ["Make"]))
+
+                cache.put(filename, key, {"SourceFile": filename, "Make": "Canon", "ISO": 100}, ["Make", "ISO", "LensModel"])
+                self.assertEqual(cache.get(filename, key, ["Make", "LensModel", "Model"]), ({"SourceFile": filename, "Make": "Canon"}, ["Model"]))
+
+                # All fields.
+                cache.put(filename, key, {"SourceFile": filename, "Make": "Canon", "Model": "R5"})
+                self.assertTrue(cache.is_warm(filename, key))
+                self.assertEqual(cache.get(filename, key, ["Model", "Artist"]), ({"SourceFile": filename, "Model": "R5"}, []))
+
+                # Changed file.
+                self.assertEqual(cache.get(filename, (1, 2, 4), ["Model"]), ({"SourceFile": filename}, ["Model"]))
+                self.assertEqual(cache.invalidated, 1)
+                self.assertEqual(cache.get(filename, key, ["Model"])[1], ["Model"])
+
+    def test_evict_and_prune(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            existing_filename = os.path.join(dir_name, "existing.jpg")
+            open(existing_filename, "w").close()
+
+            with metadata_cache.MetadataCache(os.path.join(dir_name, "cache.sqlite3")) as cache:
+                for i in range(3):
+                    cache.put(os.path.join(dir_name, f"{i}.jpg"), (i, i, i), {"Make": "x" * 100}, ["Make"])
+                cache.put(existing_filename, (9, 9, 9), {"Make": "x" * 100}, ["Make"])
+
+                self.assertEqual(cache.evict(250), 2)  # Least recently used first.
+                self.assertEqual(cache.get(os.path.join(dir_name, "0.jpg"), (0, 0, 0), ["Make"])[1], ["Make"])
+                self.assertEqual(cache.get(os.path.join(dir_name, "2.jpg"), (2, 2, 2), ["Make"])[1], [])
+
+                self.assertEqual(cache.prune_missing(), 1)
+                self.assertTrue(cache.get(existing_filename, (9, 9, 9), ["Make"])[0]["Make"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+import dir_walker
+import rename_planner
+import strip_file_prefix_suffix
+
+
+class RenamePlannerTestCase (unittest.TestCase):
+    @staticmethod
+    def _apply(names: set, steps) -> set:
+        names = set(names)
+        for old, new in steps:
+            assert new not in names, f"`{old}` -> `{new}` overwrites a file"
+            names.remove(old)
+            names.add(new)
+        return names
+
+    def test_conflicts(self):
+        existing_names = {"a", "b", "c", "d", "taken", "x"}
+        renames = [("a", "taken"), ("b", "a"), ("c", "same"), ("d", "same"), ("x", "x2")]
+        plan = rename_planner.plan_renames(renames, existing_names)
+
+        self.assertEqual(plan.renames, [("x", "x2")])
+        self.assertEqual(plan.existing_target_conflicts, [("a", "taken"), ("b", "a")])  # `a` stays, so `b` can't take its name.
+        self.assertEqual(plan.duplicate_target_conflicts, [("c", "same"), ("d", "same")])
+
+    def test_chains_and_cycles(self):
+        existing_names = {"a", "b", "c", "x", "y", "z", f"{rename_planner.TEMP_NAME_PREFIX}0_x"}
+        renames = [("a", "b"), ("b", "c"), ("c", "d"), ("x", "y"), ("y", "z"), ("z", "x")]
+        plan = rename_planner.plan_renames(renames, existing_names)
+
+        self.assertEqual(plan.renames, renames)
+        self.assertEqual(plan.cycle_count, 1)
+        self.assertEqual(self._apply(existing_names, plan.steps), {"b", "c", "d", "x", "y", "z", f"{rename_planner.TEMP_NAME_PREFIX}0_x"})
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            for name in ("x", "y"):
+                with open(os.path.join(dir_name, name), "w") as f:
+                    f.write(name)
+
+            rename_planner.execute_plan(dir_name, rename_planner.plan_renames([("x", "y"), ("y", "x")], {"x", "y"}))
+
+            with open(os.path.join(dir_name, "x")) as f:
+                self.assertEqual(f.read(), "y")
+            self.assertEqual(sorted(os.listdir(dir_name)), ["x", "y"])
+
+    def test_strip_file_prefix_suffix(self):
+        self.assertEqual(strip_file_prefix_suffix.maybe_get_new_filename("pre_name_suf.txt", "pre_", "_suf", False), (True, "name.txt"))
+        self.assertEqual(strip_file_prefix_suffix.maybe_get_new_filename("pre_.txt", "pre_", None, False), (False, None))
+
+    def test_recursive_with_renamed_dirs(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            os.makedirs(os.path.join(dir_name, "pre_a", "pre_b"))
+            os.mkdir(os.path.join(dir_name, "c"))
+            for filename in ("pre_1", "pre_a/pre_2", "pre_a/pre_b/pre_3", "pre_a/pre_b/3", "c/pre_4"):
+                with open(os.path.join(dir_name, filename), "w") as f:
+                    f.write(filename)
+
+            strip_file_prefix_suffix.main(dir_name, "pre_", None, False, True, recursive=True, workers=4)
+
+            found = []
+            for root_path, _, file_entries in dir_walker.walk(dir_name):
+                found += [os.path.relpath(entry.path, dir_name) for entry in file_entries]
+            self.assertEqual(sorted(found), ["1", "a/2", "a/b/3", "a/b/pre_3", "c/4"])  # `pre_3` is kept: `3` exists.
+
+
+if __name__ == '__main__':
+    unittest.main()
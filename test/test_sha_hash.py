@@ -0,0 +1,71 @@
+import hashlib
+import os
+import struct
+import unittest
+import unittest.mock
+import tempfile
+
+import sha_hash
+
+
+class ShaHashTestCase (unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def _write_file(self, size: int) -> str:
+        filename = os.path.join(self.temp_dir.name, f"{size}.bin")
+        with open(filename, "wb") as f:
+            f.write(os.urandom(size))
+        return filename
+
+    def test_get_sha_hashes_of_file(self):
+        algorithms = [sha_hash.HashAlgorithm.SHA1, sha_hash.HashAlgorithm.SHA256, sha_hash.HashAlgorithm.SHA512]
+
+        for size in (0, 1, 65536, 65536 * 3 + 7):
+            filename = self._write_file(size)
+            with open(filename, "rb") as f:
+                content = f.read()
+
+            with self.subTest(size=size):
+                digests = sha_hash.get_sha_hashes_of_file(filename, algorithms)
+                self.assertEqual(digests[sha_hash.HashAlgorithm.SHA1], hashlib.sha1(content).hexdigest())
+                self.assertEqual(digests[sha_hash.HashAlgorithm.SHA256], hashlib.sha256(content).hexdigest())
+                self.assertEqual(digests[sha_hash.HashAlgorithm.SHA512], hashlib.sha512(content).hexdigest())
+
+    def test_read_strategies_agree(self):
+        algorithms = [sha_hash.HashAlgorithm.SHA256]
+
+        for size in (0, 100, 1024 * 1024 + 3):
+            filename = self._write_file(size)
+            expected = sha_hash.get_sha_hashes_of_file(filename, algorithms)
+
+            for strategy in (None, *sha_hash.ReadStrategy):
+                with self.subTest(size=size, strategy=strategy):
+                    self.assertEqual(sha_hash.get_sha_hashes_of_file_adaptive(filename, algorithms, strategy=strategy, block_size=4096 if strategy else None), expected)
+
+    def test_get_tree_hash_of_file(self):
+        chunk_size = 1024
+        filename = self._write_file(chunk_size * 2 + 5)  # 3 chunks.
+        with open(filename, "rb") as f:
+            content = f.read()
+
+        leaves = [hashlib.sha256(b"\x00" + content[i:i + chunk_size]).digest() for i in range(0, len(content), chunk_size)]
+        root = hashlib.sha256(b"\x01" + hashlib.sha256(b"\x01" + leaves[0] + leaves[1]).digest() + leaves[2]).digest()
+        expected = hashlib.sha256(b"\x02" + struct.pack(">QQ", chunk_size, len(content)) + root).hexdigest()
+
+        for threads in (1, 4):
+            with self.subTest(threads=threads):
+                self.assertEqual(sha_hash.get_tree_hash_of_file(filename, sha_hash.HashAlgorithm.SHA256, chunk_size, threads), expected)
+
+        # Chunks bigger than a single read.
+        with unittest.mock.patch.object(sha_hash, "_MAX_READ_SIZE", 100):
+            self.assertEqual(sha_hash.get_tree_hash_of_file(filename, sha_hash.HashAlgorithm.SHA256, chunk_size, 4), expected)
+
+        empty_filename = self._write_file(0)
+        expected = hashlib.blake2b(b"\x02" + struct.pack(">QQ", chunk_size, 0) + hashlib.blake2b(b"\x00").digest()).hexdigest()
+        self.assertEqual(sha_hash.get_tree_hash_of_file(empty_filename, sha_hash.HashAlgorithm.BLAKE2B, chunk_size), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from PIL import Image
+
+import webp_effort
+from webp_effort import EffortBudget, ProbeResult
+
+
+class WebpEffortTestCase (unittest.TestCase):
+    PROBE_RESULTS = [
+        ProbeResult(0, 0.1, 1000),
+        ProbeResult(2, 0.2, 900),
+        ProbeResult(4, 0.5, 895),
+        ProbeResult(6, 3.0, 800),
+    ]
+
+    def test_choose_method(self):
+        self.assertEqual(webp_effort.choose_method(self.PROBE_RESULTS, EffortBudget(None, 0.01)), 6)
+        self.assertEqual(webp_effort.choose_method(self.PROBE_RESULTS, EffortBudget(1.0, 0.01)), 2)
+        self.assertEqual(webp_effort.choose_method(self.PROBE_RESULTS, EffortBudget(None, 0.25)), 0)
+
+    def test_choose_method_for_image(self):
+        image = Image.effect_noise((webp_effort.PROBE_SIDE_LENGTH + 1, 8), 64)
+        method, decision = webp_effort.choose_method_for_image(image, {"lossless": True, "method": 6}, EffortBudget(None, 0.0))
+        self.assertIn(method, webp_effort.METHOD_CANDIDATES)
+        self.assertEqual(len(decision["probes"]), len(webp_effort.METHOD_CANDIDATES))
+
+
+if __name__ == '__main__':
+    unittest.main()
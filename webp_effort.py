@@ -0,0 +1,112 @@
+"""
+Pick the lossless WebP `method` (encoder effort, 0-6) per image from a time/size budget.
+
+A center crop of the image (the "probe") is encoded with each candidate method.
+Time per megapixel is extrapolated from the probe, so the cost of probing stays small for big images.
+"""
+
+import io
+import json
+import os
+import time
+import typing
+
+from PIL import Image
+
+
+METHOD_CANDIDATES: typing.Final = (0, 2, 4, 6)
+PROBE_SIDE_LENGTH = 512
+
+
+class EffortBudget(typing.NamedTuple):
+    max_seconds_per_megapixel: float | None  # `None`: No time limit.
+    min_size_gain: float  # A higher method must be at least this much smaller (e.g. 0.01 = 1%) than the chosen lower one.
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+class ProbeResult(typing.NamedTuple):
+    method: int
+    seconds_per_megapixel: float
+    size: int
+
+
+def _get_probe(image: Image.Image) -> Image.Image:
+    """
+    Center crop instead of a downsampled copy, because downsampling changes the texture the encoder sees.
+    """
+    width, height = image.size
+    probe_width = min(width, PROBE_SIDE_LENGTH)
+    probe_height = min(height, PROBE_SIDE_LENGTH)
+    left = (width - probe_width) // 2
+    top = (height - probe_height) // 2
+    return image.crop((left, top, left + probe_width, top + probe_height))
+
+
+def probe_methods(image: Image.Image, save_parameters: typing.Dict[str, typing.Any]) -> typing.List[ProbeResult]:
+    probe = _get_probe(image)
+    probe.load()
+    megapixels = max(probe.width * probe.height / 1e6, 1e-6)
+
+    results = []
+    for method in METHOD_CANDIDATES:
+        buffer = io.BytesIO()
+        start_time = time.perf_counter()
+        probe.save(buffer, format="WEBP", **{**save_parameters, "method": method})
+        seconds = time.perf_counter() - start_time
+        results.append(ProbeResult(method, seconds / megapixels, buffer.tell()))
+
+    return results
+
+
+def choose_method(probe_results: typing.List[ProbeResult], budget: EffortBudget) -> int:
+    """
+    Start from the cheapest method. Move to a higher method only if it fits the time budget and saves at least `min_size_gain`.
+    """
+    chosen = probe_results[0]
+    for result in probe_results[1:]:
+        if (budget.max_seconds_per_megapixel is not None) and (result.seconds_per_megapixel > budget.max_seconds_per_megapixel):
+            break
+
+        size_gain = 1 - result.size / chosen.size if chosen.size else 0
+        if size_gain >= budget.min_size_gain:
+            chosen = result
+
+    return chosen.method
+
+
+def choose_method_for_image(image: Image.Image, save_parameters: typing.Dict[str, typing.Any], budget: EffortBudget) -> typing.Tuple[int, dict]:
+    """
+    :return: The chosen method, and a record of the decision (for `append_decision`).
+    """
+    if (image.width <= PROBE_SIDE_LENGTH) and (image.height <= PROBE_SIDE_LENGTH):
+        # Probing would cost more than just encoding such a small image with the requested method.
+        probe_results = []
+        method = save_parameters["method"]
+    else:
+        probe_results = probe_methods(image, save_parameters)
+        method = choose_method(probe_results, budget)
+
+    decision = {
+        "width": image.width,
+        "height": image.height,
+        "mode": image.mode,
+        "budget": budget.to_dict(),
+        "probes": [r._asdict() for r in probe_results],
+        "method": method,
+    }
+    return method, decision
+
+
+def append_decision(log_filename: str, decision: dict):
+    """
+    Append 1 JSON line. Lines are written with a single `write` in append mode, so concurrent workers don't interleave them.
+    """
+    line = (json.dumps(decision, sort_keys=True) + "\n").encode("utf-8")
+
+    fd = os.open(log_filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)